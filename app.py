@@ -1,14 +1,25 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, Response
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory, Response, stream_with_context
 from email_unsubscriber import EmailUnsubscriber
 from secure_email_client import SecureEmailClient
 from oauth_authentication import OAuthHandler
 from email_categorizer import EmailCategorizer
 from subscription_analytics import SubscriptionAnalytics
 from email_scan_scheduler import EmailScanScheduler
+from scan_result_store import ScanResultStore
+from scan_job_store import ScanJobStore
+from scan_job_manager import ScanJobManager
+from scan_data_store import ScanDataStore
+from response_cache import ResponseCache
+from unsubscribe_executor import UnsubscribeExecutor
+from http_session_pool import get_shared_pool
+from unsubscribe_store import UnsubscribeStore
+from unsubscribe_job_manager import UnsubscribeJobManager
+from subscription_index import DEFAULT_ORDER, encode_cursor, decode_cursor
 import os
 import json
 import logging
 import threading
+import zlib
 from datetime import datetime, timedelta
 import csv
 from io import StringIO
@@ -23,12 +34,23 @@ app = Flask(__name__, static_folder="static")
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))  # For session management
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+# Seconds a scan may run before returning partial results (unset = unbounded)
+app.config['SCAN_TIME_BUDGET'] = float(os.environ['SCAN_TIME_BUDGET']) if os.environ.get('SCAN_TIME_BUDGET') else None
 
 # Initialize components
 oauth_handler = OAuthHandler(app)
 email_categorizer = EmailCategorizer()
 subscription_analytics = SubscriptionAnalytics()
-email_scheduler = EmailScanScheduler(app)
+scan_result_store = ScanResultStore()
+scan_data_store = ScanDataStore(ttl=30 * 60)
+response_cache = ResponseCache()
+unsubscribe_executor = UnsubscribeExecutor(circuit_breaker=get_shared_pool().circuit_breaker)
+unsubscribe_store = UnsubscribeStore()
+unsubscribe_job_manager = UnsubscribeJobManager(unsubscribe_store)
+scan_job_store = ScanJobStore()
+scan_job_manager = ScanJobManager(process_fn=lambda items, account: process_subscription_data(items, account),
+                                  store=scan_job_store)
+email_scheduler = EmailScanScheduler(app, scan_result_store)
 
 # Start the email scheduler
 email_scheduler.start()
@@ -94,7 +116,7 @@ def scan_emails():
             session['password'] = password
             
             # Create secure email client
-            client = SecureEmailClient(email_address, provider)
+            client = SecureEmailClient(email_address, provider, result_store=scan_result_store)
             client.set_password(password)
             
             # If user selects "Custom Provider", use their custom IMAP settings
@@ -108,6 +130,12 @@ def scan_emails():
                 session['custom_server'] = data['custom_server']
                 session['custom_port'] = data['custom_port']
                 client.set_custom_imap(data['custom_server'], int(data['custom_port']))
+                
+                # Optional SMTP settings, used to unsubscribe from mailto: links
+                if data.get('custom_smtp_server'):
+                    session['custom_smtp_server'] = data['custom_smtp_server']
+                    session['custom_smtp_port'] = data.get('custom_smtp_port') or 587
+                    client.set_custom_smtp(data['custom_smtp_server'], int(session['custom_smtp_port']))
         
             # Authenticate and scan
             if not client.authenticate():
@@ -122,30 +150,37 @@ def scan_emails():
                     'status': 'error',
                     'message': 'Number of emails must be greater than 0'
                 }), 400
-                
-            # Find unsubscribe links
-            unsubscribe_data = client.find_unsubscribe_links(num_emails=num_emails)
-            
-            # Process the data for the dashboard
-            processed_data = process_subscription_data(unsubscribe_data)
-            
-            # Store in session for quick access
-            session['last_scan_data'] = processed_data
-            session['last_scan_time'] = datetime.now().isoformat()
             
-            # Track total found
-            session['total_found'] = len(processed_data)
+            # Let the dashboard stream the scan from /api/scan_stream instead of blocking here
+            if data.get('stream'):
+                session.pop('scan_data_id', None)
+                return jsonify({
+                    'status': 'success',
+                    'redirect': f'/dashboard?stream=1&num_emails={num_emails}',
+                    'streamUrl': f'/api/scan_stream?num_emails={num_emails}'
+                })
+                
+            # Bound the scan so it returns partial results before the proxy times out
+            time_budget = data.get('time_budget', app.config['SCAN_TIME_BUDGET'])
+            time_budget = float(time_budget) if time_budget else None
+            resume_token = data.get('resume_token')
+                
+            # Scan in the background; the dashboard polls /api/scan_jobs/<job_id>
+            job_id, created = scan_job_manager.submit(email_address, client, num_emails=num_emails,
+                                                      time_budget=time_budget, resume_token=resume_token)
+            session.pop('scan_data_id', None)
+            session['scan_job_id'] = job_id
             if 'total_unsubscribed' not in session:
                 session['total_unsubscribed'] = 0
             
-            # Return subscription data and redirect to dashboard
             return jsonify({
                 'status': 'success',
-                'data': processed_data,
+                'job_id': job_id,
+                'deduplicated': not created,
+                'statusUrl': f'/api/scan_jobs/{job_id}',
                 'redirect': '/dashboard',
-                'totalUnsubscribed': session.get('total_unsubscribed', 0),
-                'timeSaved': calculate_time_saved(len(processed_data))
-            })
+                'totalUnsubscribed': session.get('total_unsubscribed', 0)
+            }), 202
     except ValueError as e:
         return jsonify({
             'status': 'error',
@@ -156,6 +191,11 @@ def scan_emails():
             'status': 'error',
             'message': f'Connection error: {str(e)}'
         }), 503
+    except RuntimeError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503
     except Exception as e:
         logger.error(f"Scan error: {str(e)}")
         return jsonify({
@@ -203,7 +243,7 @@ def scan_with_oauth():
         email_address = session['email']
         
         # Create secure email client with OAuth
-        client = SecureEmailClient(email_address, provider, oauth_handler)
+        client = SecureEmailClient(email_address, provider, oauth_handler, result_store=scan_result_store)
         client.use_oauth()
         
         # Authenticate
@@ -213,18 +253,11 @@ def scan_with_oauth():
         # Default to 100 emails for OAuth
         num_emails = 100
             
-        # Find unsubscribe links
-        unsubscribe_data = client.find_unsubscribe_links(num_emails=num_emails)
-        
-        # Process the data for the dashboard
-        processed_data = process_subscription_data(unsubscribe_data)
-        
-        # Store in session for quick access
-        session['last_scan_data'] = processed_data
-        session['last_scan_time'] = datetime.now().isoformat()
-        
-        # Track total found
-        session['total_found'] = len(processed_data)
+        # Scan in the background; the dashboard picks the job up while it runs
+        job_id, _ = scan_job_manager.submit(email_address, client, num_emails=num_emails,
+                                            time_budget=app.config['SCAN_TIME_BUDGET'])
+        session.pop('scan_data_id', None)
+        session['scan_job_id'] = job_id
         if 'total_unsubscribed' not in session:
             session['total_unsubscribed'] = 0
         
@@ -234,24 +267,33 @@ def scan_with_oauth():
         logger.error(f"OAuth scan error: {str(e)}")
         return redirect(f"/?error={str(e)}")
 
-def process_subscription_data(unsubscribe_data):
-    """Process subscription data for the dashboard"""
+def process_subscription_data(unsubscribe_data, account=None):
+    """Process subscription data for the dashboard, marking targets the account already unsubscribed from"""
     processed_data = []
+    outcomes = [None] * len(unsubscribe_data)
+    if account:
+        outcomes = unsubscribe_store.get_outcomes(account, [(item.get('unsubscribe_link', ''), item.get('list_id'))
+                                                            for item in unsubscribe_data])
     
-    for item in unsubscribe_data:
-        # Extract basic info
-        email_data = {
-            'subject': item.get('subject', ''),
-            'sender': item.get('sender', 'Unknown Sender'),
-            'content': item.get('body_preview', '')
-        }
-        
-        # Get category using enhanced categorizer if not already categorized
-        if 'category' not in item or not item['category']:
-            category, confidence = email_categorizer.categorize(email_data)
+    # Categorize every item that is not categorized yet in one batch
+    uncategorized = [item for item in unsubscribe_data if not item.get('category')]
+    predictions, model_version = email_categorizer.categorize_batch([{
+        'subject': item.get('subject', ''),
+        'sender': item.get('sender', 'Unknown Sender'),
+        'content': item.get('body_preview', '')
+    } for item in uncategorized])
+    predicted = {id(item): (category, confidence)
+                 for item, (_, category, confidence) in zip(uncategorized, predictions)}
+    
+    for item, outcome in zip(unsubscribe_data, outcomes):
+        # Use the batch prediction if the item was not already categorized
+        if id(item) in predicted:
+            category, confidence = predicted[id(item)]
+            category_model_version = model_version
         else:
             category = item.get('category', 'Unknown')
             confidence = {}
+            category_model_version = item.get('category_model_version')
         
         # Create processed item
         processed_item = {
@@ -261,13 +303,193 @@ def process_subscription_data(unsubscribe_data):
             'last_received': item.get('last_received', 'N/A'),
             'unsubscribe_link': item.get('unsubscribe_link', ''),
             'method': item.get('method', 'unknown'),
+            'one_click': bool(item.get('one_click')),
+            'list_id': item.get('list_id'),
+            'unsubscribed': bool(outcome and outcome['status'] == 'succeeded'),
+            'unsubscribed_at': outcome['updated_at'] if outcome and outcome['status'] == 'succeeded' else None,
             'confidence': confidence,
+            'category_model_version': category_model_version,
             'email_id': item.get('email_id', str(hash(item.get('sender', '') + item.get('unsubscribe_link', ''))))
         }
         processed_data.append(processed_item)
     
     return processed_data
 
+def create_client_from_session(result_store=None):
+    """
+    Create a SecureEmailClient for the logged in user
+    
+    Args:
+        result_store: ScanResultStore to pass to the client
+        
+    Returns:
+        SecureEmailClient: Unauthenticated client, or None if no credentials are stored
+    """
+    if session.get('oauth_authenticated'):
+        client = SecureEmailClient(session['email'], session.get('oauth_provider', 'gmail'), oauth_handler,
+                                   result_store=result_store)
+        client.use_oauth()
+        return client
+    
+    if 'password' not in session:
+        return None
+    
+    client = SecureEmailClient(session['email'], session.get('provider', 'gmail'), result_store=result_store)
+    client.set_password(session['password'])
+    
+    # Add custom IMAP settings if needed
+    if session.get('provider') == 'custom' and session.get('custom_server'):
+        client.set_custom_imap(
+            session.get('custom_server'), 
+            int(session.get('custom_port', 993))
+        )
+    if session.get('provider') == 'custom' and session.get('custom_smtp_server'):
+        client.set_custom_smtp(session.get('custom_smtp_server'), int(session.get('custom_smtp_port', 587)))
+    return client
+
+def save_scan_to_session(processed_data, data_id=None):
+    """Store the results of a finished scan server-side and point the session at them"""
+    session['scan_data_id'] = scan_data_store.put(session['email'], processed_data, data_id)
+    session['last_scan_time'] = datetime.now().isoformat()
+    subscription_analytics.clear_cache(session['email'])
+    
+    # Track total found
+    session['total_found'] = len(processed_data)
+    if 'total_unsubscribed' not in session:
+        session['total_unsubscribed'] = 0
+
+def get_stored_scan():
+    """
+    Get the logged in user's stored scan results
+    
+    Returns:
+        dict: Entry with 'data' and 'stored_at', or None if there are no current results
+    """
+    data_id = session.get('scan_data_id')
+    if not data_id or 'email' not in session:
+        return None
+    return scan_data_store.get(session['email'], data_id)
+
+def get_subscription_index():
+    """Get the SubscriptionIndex over the logged in user's stored scan results, or None"""
+    data_id = session.get('scan_data_id')
+    if not data_id or 'email' not in session:
+        return None
+    return scan_data_store.get_index(session['email'], data_id)
+
+def header_mailto_links():
+    """
+    Get the mailto: unsubscribe links of the user's stored scan that came from a List-Unsubscribe header.
+    Only these are sent without asking: a mailto: link found in a message body is written by the sender
+    and would send whatever email they chose from the user's account
+    
+    Returns:
+        set: mailto: links
+    """
+    index = get_subscription_index()
+    if not index:
+        return set()
+    return {sub['unsubscribe_link'] for sub in index.subscriptions
+            if sub.get('method') == 'header' and (sub.get('unsubscribe_link') or '').startswith('mailto:')}
+
+def query_subscription_page(index, args):
+    """
+    Get one page of subscriptions for the pagination query parameters
+    
+    Args:
+        index: SubscriptionIndex over the user's stored results
+        args: Request arguments (cursor, page_size, sort, order, category, method, q)
+        
+    Returns:
+        dict: Page of subscriptions with pagination metadata
+        
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    data_id = session['scan_data_id']
+    page_size = int(args.get('page_size', 50))
+    if not 1 <= page_size <= 500:
+        raise ValueError('page_size must be between 1 and 500')
+    offset = decode_cursor(args['cursor'], data_id) if args.get('cursor') else 0
+    sort = args.get('sort', 'date')
+    order = args.get('order') or DEFAULT_ORDER.get(sort)
+    
+    rows, total = index.page(offset, page_size, sort=sort, order=order,
+                             category=args.get('category'), method=args.get('method'), text=args.get('q'))
+    next_offset = offset + len(rows)
+    
+    return {
+        'subscriptions': rows,
+        'page': {
+            'total': total,
+            'page_size': page_size,
+            'next_cursor': encode_cursor(data_id, next_offset) if next_offset < total else None,
+            'sort': sort,
+            'order': order
+        }
+    }
+
+def subscription_data_etag(version):
+    """
+    Build the ETag of a /api/subscription_data response
+    
+    The stored results version covers the subscriptions and analytics; the unsubscribe
+    counter and query string are included since they also change the response.
+    """
+    return f"{version}-{session.get('total_unsubscribed', 0)}-{zlib.crc32(request.query_string):08x}"
+
+def cached_json_response(cache_key, build_payload, etag=None):
+    """
+    Build a JSON response from the response cache, compressed as the client accepts
+    
+    Args:
+        cache_key: Key that changes whenever the payload would (includes the results version)
+        build_payload: Function returning the payload on a cache miss
+        etag: ETag to send with the response
+        
+    Returns:
+        Response: JSON response
+    """
+    body = response_cache.get(cache_key, build_payload)
+    encoding = request.accept_encodings.best_match(body.encodings, default='identity')
+    
+    response = app.response_class(body.encoded(encoding), mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def credit_unsubscribe_jobs():
+    """Add the unsubscribes of this session's finished bulk unsubscribe jobs to its total"""
+    job_ids = session.get('unsubscribe_job_ids')
+    if not job_ids:
+        return
+    
+    still_running = []
+    for job_id in job_ids:
+        job = unsubscribe_job_manager.get_job(job_id)
+        if job and job['status'] in ('queued', 'running'):
+            still_running.append(job_id)
+        elif job:
+            session['total_unsubscribed'] = session.get('total_unsubscribed', 0) + job['progress']['succeeded']
+    session['unsubscribe_job_ids'] = still_running
+
+def pending_scan_response(job_id):
+    """Response telling the dashboard to poll a running background scan"""
+    return jsonify({
+        'status': 'pending',
+        'job_id': job_id,
+        'statusUrl': f'/api/scan_jobs/{job_id}',
+        'totalUnsubscribed': session.get('total_unsubscribed', 0)
+    }), 202
+
+def format_sse(event, data):
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # Helper function to estimate time saved based on number of subscriptions
 def calculate_time_saved(num_subscriptions):
     """
@@ -321,6 +543,25 @@ def unsubscribe():
         if not link:
             return jsonify({'status': 'error', 'message': 'No unsubscribe link provided'}), 400
         
+        # An unsubscribe email not announced in a List-Unsubscribe header needs the user's confirmation
+        send_mailto = link.startswith('mailto:') and (bool(data.get('confirm_mailto')) or link in header_mailto_links())
+        if link.startswith('mailto:') and not send_mailto:
+            recipient = link[len('mailto:'):].split('?')[0]
+            return jsonify({
+                'status': 'confirm',
+                'confirm_required': True,
+                'message': f'Unsubscribing from {sender} sends an email from your account to {recipient}. Send it?'
+            })
+        
+        # Do not request a target the account already unsubscribed from
+        outcome = unsubscribe_store.get_outcomes(session['email'], [(link, data.get('list_id'))])[0]
+        if outcome and outcome['status'] == 'succeeded':
+            return jsonify({
+                'status': 'success',
+                'already_unsubscribed': True,
+                'message': f'Already unsubscribed from {sender}'
+            })
+        
         # Create client based on authentication method
         if session.get('oauth_authenticated'):
             client = SecureEmailClient(session['email'], session.get('oauth_provider', 'gmail'), oauth_handler)
@@ -338,6 +579,8 @@ def unsubscribe():
                     session.get('custom_server'), 
                     int(session.get('custom_port', 993))
                 )
+            if session.get('provider') == 'custom' and session.get('custom_smtp_server'):
+                client.set_custom_smtp(session.get('custom_smtp_server'), int(session.get('custom_smtp_port', 587)))
         
         # Authenticate client
         if not client.authenticate():
@@ -347,7 +590,11 @@ def unsubscribe():
             }), 401
         
         # Perform unsubscribe
-        success = client.unsubscribe(link)
+        result = client.unsubscribe_detailed(link, one_click=bool(data.get('one_click')), send_mailto=send_mailto)
+        success = result['success']
+        if not result.get('circuit_open'):
+            unsubscribe_store.record_outcome(session['email'], link, data.get('list_id'), success,
+                                             result.get('status_code'), result.get('error'))
         
         # Update counts if successful
         if success:
@@ -389,53 +636,86 @@ def get_subscription_data():
         return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
     
     try:
-        # Check if we have cached data
-        if 'last_scan_data' in session and 'last_scan_time' in session:
-            # Check if the cache is recent (less than 30 minutes old)
-            last_scan_time = datetime.fromisoformat(session['last_scan_time'])
-            cache_age = (datetime.now() - last_scan_time).total_seconds() / 60
+        # Count the unsubscribes of finished bulk unsubscribe jobs
+        credit_unsubscribe_jobs()
+        
+        # Pick up a background scan started by this session
+        job_id = session.get('scan_job_id')
+        job = scan_job_manager.get_job(job_id) if job_id else None
+        if job and job['status'] == 'complete':
+            save_scan_to_session(job['results'])
+            session.pop('scan_job_id', None)
+        elif job and job['status'] == 'failed':
+            session.pop('scan_job_id', None)
+            return jsonify({
+                'status': 'error',
+                'message': f"Scan failed: {job['error']}"
+            }), 500
+        elif job:
+            return pending_scan_response(job_id)
+        
+        # Check if we have stored data (it expires after 30 minutes)
+        data_id = session.get('scan_data_id')
+        version = scan_data_store.get_version(session['email'], data_id) if data_id else None
+        etag = subscription_data_etag(version) if version else None
+        if etag and request.if_none_match.contains(etag):
+            # Nothing changed since the client's last poll
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        index = get_subscription_index()
+        if index:
+            logger.info(f"Using cached subscription data for {session['email']}")
             
-            if cache_age < 30:
-                # Use cached data
-                scan_data = session['last_scan_data']
-                logger.info(f"Using cached subscription data for {session['email']}")
+            def build_subscription_response():
+                scan_data = index.subscriptions
                 
-                # Generate analytics
-                analytics = subscription_analytics.analyze_subscriptions(scan_data, session['email'])
+                # Only send what changed when the client says which version it has
+                since = request.args.get('since', type=int)
+                changes = None
+                if since:
+                    changes = scan_data_store.get_changes(session['email'], data_id, since)
                 
-                return jsonify({
+                response = {
                     'status': 'success',
+                    'mode': 'full',
+                    'version': version,
                     'subscriptions': scan_data,
                     'stats': {
                         'total_found': len(scan_data),
-                        'categories': {item['category']: len([s for s in scan_data if s['category'] == item['category']]) 
-                                     for item in scan_data if 'category' in item}
+                        'categories': index.category_counts
                     },
-                    'analytics': analytics,
                     'totalUnsubscribed': session.get('total_unsubscribed', 0),
                     'timeSaved': calculate_time_saved(len(scan_data)),
                     'cached': True,
-                    'cache_age': round(cache_age)
-                })
-        
-        # No cache or cache expired, perform a new scan
-        # Create client based on authentication method
-        if session.get('oauth_authenticated'):
-            client = SecureEmailClient(session['email'], session.get('oauth_provider', 'gmail'), oauth_handler)
-            client.use_oauth()
-        else:
-            if 'password' not in session:
-                return jsonify({'status': 'error', 'message': 'No password stored'}), 401
-            
-            client = SecureEmailClient(session['email'], session.get('provider', 'gmail'))
-            client.set_password(session['password'])
+                    'last_scan_time': session.get('last_scan_time')
+                }
+                
+                # The analytics only change with the results, so a delta carries them only when
+                # the version moved on; the dashboard keeps the ones it has otherwise
+                if changes is None or changes['version'] != since:
+                    response['analytics'] = subscription_analytics.analyze_subscriptions(scan_data, session['email'])
+                
+                if changes is not None:
+                    del response['subscriptions']
+                    response.update(changes, mode='delta', since=since)
+                elif 'page_size' in request.args or 'cursor' in request.args:
+                    # Only send the first page when the dashboard asks for pagination
+                    response.update(query_subscription_page(index, request.args))
+                return response
             
-            # Add custom IMAP settings if needed
-            if session.get('provider') == 'custom' and session.get('custom_server'):
-                client.set_custom_imap(
-                    session.get('custom_server'), 
-                    int(session.get('custom_port', 993))
-                )
+            if not etag:
+                return jsonify(build_subscription_response())
+            return cached_json_response(('subscription_data', session['email'].lower(), etag,
+                                         request.query_string),
+                                        build_subscription_response, etag)
+        
+        # No cache or cache expired, start a background scan (or join the running one)
+        client = create_client_from_session(scan_result_store)
+        if not client:
+            return jsonify({'status': 'error', 'message': 'No password stored'}), 401
         
         # Authenticate client
         if not client.authenticate():
@@ -444,39 +724,187 @@ def get_subscription_data():
                 'message': 'Authentication failed'
             }), 401
         
-        # Find unsubscribe links
-        unsubscribe_data = client.find_unsubscribe_links()
+        job_id, _ = scan_job_manager.submit(session['email'], client,
+                                            time_budget=app.config['SCAN_TIME_BUDGET'])
+        session['scan_job_id'] = job_id
         
-        # Process the data
-        processed_data = process_subscription_data(unsubscribe_data)
+        return pending_scan_response(job_id)
+    except Exception as e:
+        logger.error(f"Error getting subscription data: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+@app.route('/api/subscriptions', methods=['GET'])
+def get_subscriptions_page():
+    """API endpoint to page through, sort and filter the stored subscriptions"""
+    if 'email' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    index = get_subscription_index()
+    if not index:
+        return jsonify({
+            'status': 'error',
+            'message': 'No scan data available'
+        }), 404
+    
+    try:
+        page = query_subscription_page(index, request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return jsonify(dict(page, status='success', categories=index.category_counts, methods=index.method_counts))
+
+@app.route('/api/scan_jobs', methods=['POST'])
+def submit_scan_job():
+    """API endpoint to start a background scan for the logged in user"""
+    if 'email' not in session or (not session.get('oauth_authenticated') and 'password' not in session):
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        num_emails = int(data.get('num_emails', 50))
+        if num_emails <= 0:
+            return jsonify({'status': 'error', 'message': 'Number of emails must be greater than 0'}), 400
+        time_budget = data.get('time_budget', app.config['SCAN_TIME_BUDGET'])
+        time_budget = float(time_budget) if time_budget else None
         
-        # Update session cache
-        session['last_scan_data'] = processed_data
-        session['last_scan_time'] = datetime.now().isoformat()
+        client = create_client_from_session(scan_result_store)
+        if not client:
+            return jsonify({'status': 'error', 'message': 'No password stored'}), 401
         
-        # Generate analytics
-        analytics = subscription_analytics.analyze_subscriptions(processed_data, session['email'])
+        if not client.authenticate():
+            return jsonify({
+                'status': 'error',
+                'message': 'Authentication failed'
+            }), 401
+        
+        job_id, created = scan_job_manager.submit(session['email'], client, num_emails=num_emails,
+                                                  time_budget=time_budget,
+                                                  resume_token=data.get('resume_token'))
+        session['scan_job_id'] = job_id
         
         return jsonify({
             'status': 'success',
-            'subscriptions': processed_data,
-            'stats': {
-                'total_found': len(processed_data),
-                'categories': {item['category']: len([s for s in processed_data if s['category'] == item['category']]) 
-                             for item in processed_data if 'category' in item}
-            },
-            'analytics': analytics,
-            'totalUnsubscribed': session.get('total_unsubscribed', 0),
-            'timeSaved': calculate_time_saved(len(processed_data)),
-            'cached': False
-        })
+            'job_id': job_id,
+            'deduplicated': not created,
+            'statusUrl': f'/api/scan_jobs/{job_id}'
+        }), 202
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid input: {str(e)}'}), 400
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
     except Exception as e:
-        logger.error(f"Error getting subscription data: {str(e)}")
+        logger.error(f"Scan job error: {str(e)}")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 400
 
+@app.route('/api/scan_jobs/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    """API endpoint to poll the progress and results of a background scan"""
+    if 'email' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        job = scan_job_manager.get_job(job_id, offset)
+        if not job or job['account'] != session['email'].lower():
+            return jsonify({'status': 'error', 'message': 'Scan job not found'}), 404
+        
+        if job['status'] == 'complete' and session.get('scan_job_id') == job_id:
+            # Publish the finished scan to the session so the dashboard APIs can use it
+            save_scan_to_session(scan_job_manager.get_job(job_id)['results'])
+            session.pop('scan_job_id', None)
+        
+        return jsonify({
+            'status': 'success',
+            'job': job,
+            'timeSaved': calculate_time_saved(job['progress']['found'])
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid input: {str(e)}'}), 400
+
+@app.route('/api/scan_stream', methods=['GET'])
+def scan_stream():
+    """Stream scan progress and subscriptions as Server-Sent Events"""
+    if 'email' not in session or (not session.get('oauth_authenticated') and 'password' not in session):
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    try:
+        num_emails = int(request.args.get('num_emails', 50))
+        if num_emails <= 0:
+            return jsonify({'status': 'error', 'message': 'Number of emails must be greater than 0'}), 400
+        time_budget = request.args.get('time_budget', app.config['SCAN_TIME_BUDGET'])
+        time_budget = float(time_budget) if time_budget else None
+        resume_token = request.args.get('resume_token')
+        
+        client = create_client_from_session(scan_result_store)
+        if not client:
+            return jsonify({'status': 'error', 'message': 'No password stored'}), 401
+        
+        # Authenticate before streaming so failures still get a proper status code
+        if not client.authenticate():
+            return jsonify({
+                'status': 'error',
+                'message': 'Authentication failed'
+            }), 401
+        
+        # Run the scan as a background job, shared with any scan of this mailbox already running,
+        # and stream its progress; /api/subscription_data stores the results once it is complete
+        job_id, _ = scan_job_manager.submit(session['email'], client, num_emails=num_emails,
+                                            time_budget=time_budget, resume_token=resume_token)
+        session['scan_job_id'] = job_id
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid input: {str(e)}'}), 400
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    
+    def generate():
+        sent = 0
+        version = -1
+        while True:
+            job = scan_job_manager.get_job(job_id, sent)
+            if job is None:
+                yield format_sse('error', {'message': 'Scan job is no longer available'})
+                return
+            if job['version'] == version:
+                # No change within the wait timeout, keep the connection open
+                yield ": keep-alive\n\n"
+            else:
+                version = job['version']
+                for row in job['results']:
+                    yield format_sse('subscription', row)
+                sent += len(job['results'])
+                yield format_sse('progress', job['progress'])
+            
+            if job['status'] == 'failed':
+                yield format_sse('error', {'message': job['error']})
+                return
+            if job['status'] == 'complete':
+                found = job['progress']['found']
+                yield format_sse('done', {
+                    'complete': job['complete'],
+                    'continuationToken': job['continuation_token'],
+                    'processed': job['progress']['processed'],
+                    'total': job['progress']['total'],
+                    'found': found,
+                    'timeSaved': calculate_time_saved(found)
+                })
+                return
+            scan_job_manager.wait_for_change(job_id, version)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+        }
+    )
+
 @app.route('/api/bulk_unsubscribe', methods=['POST'])
 def bulk_unsubscribe():
     """API endpoint for bulk unsubscribing"""
@@ -492,13 +920,15 @@ def bulk_unsubscribe():
     try:
         # Create client based on authentication method
         if session.get('oauth_authenticated'):
-            client = SecureEmailClient(session['email'], session.get('oauth_provider', 'gmail'), oauth_handler)
+            client = SecureEmailClient(session['email'], session.get('oauth_provider', 'gmail'), oauth_handler,
+                                       unsubscribe_executor=unsubscribe_executor)
             client.use_oauth()
         else:
             if 'password' not in session:
                 return jsonify({'status': 'error', 'message': 'No password stored'}), 401
             
-            client = SecureEmailClient(session['email'], session.get('provider', 'gmail'))
+            client = SecureEmailClient(session['email'], session.get('provider', 'gmail'),
+                                       unsubscribe_executor=unsubscribe_executor)
             client.set_password(session['password'])
             
             # Add custom IMAP settings if needed
@@ -507,6 +937,8 @@ def bulk_unsubscribe():
                     session.get('custom_server'), 
                     int(session.get('custom_port', 993))
                 )
+            if session.get('provider') == 'custom' and session.get('custom_smtp_server'):
+                client.set_custom_smtp(session.get('custom_smtp_server'), int(session.get('custom_smtp_port', 587)))
         
         # Authenticate client
         if not client.authenticate():
@@ -515,53 +947,29 @@ def bulk_unsubscribe():
                 'message': 'Authentication failed'
             }), 401
         
-        results = []
-        succeeded = 0
-        failed = 0
-        
-        # Process links in batches to avoid overwhelming the server
-        batch_size = 5
-        for i in range(0, len(links), batch_size):
-            batch = links[i:i+batch_size]
-            for link_info in batch:
-                try:
-                    success = client.unsubscribe(link_info['link'])
-                    if success:
-                        succeeded += 1
-                    else:
-                        failed += 1
-                        
-                    results.append({
-                        'sender': link_info['sender'],
-                        'success': success,
-                        'error': None if success else 'Failed to process unsubscribe request'
-                    })
-                except Exception as e:
-                    failed += 1
-                    results.append({
-                        'sender': link_info['sender'],
-                        'success': False,
-                        'error': str(e)
-                    })
-                    
-                # Brief pause between requests
-                import time
-                time.sleep(1)
-        
-        # Update session count
-        if 'total_unsubscribed' not in session:
-            session['total_unsubscribed'] = 0
-        session['total_unsubscribed'] += succeeded
+        # Links are processed in the background; progress is polled or streamed. Unsubscribe emails
+        # are only sent for List-Unsubscribe links, others need confirming one at a time
+        mailto_links = header_mailto_links()
+        job_id = unsubscribe_job_manager.submit(session['email'], client, [{
+            'link': link_info['link'],
+            'sender': link_info.get('sender'),
+            'email_id': link_info.get('email_id'),
+            'one_click': bool(link_info.get('one_click')),
+            'send_mailto': link_info['link'] in mailto_links,
+            'list_id': link_info.get('list_id')
+        } for link_info in links])
+        session['unsubscribe_job_ids'] = session.get('unsubscribe_job_ids', []) + [job_id]
         
         return jsonify({
-            'status': 'success',
-            'results': results,
-            'summary': {
-                'total': len(links),
-                'succeeded': succeeded,
-                'failed': failed
-            }
-        })
+            'status': 'pending',
+            'job_id': job_id,
+            'total': len(links),
+            'statusUrl': url_for('get_unsubscribe_job', job_id=job_id),
+            'streamUrl': url_for('unsubscribe_job_stream', job_id=job_id),
+            'cancelUrl': url_for('cancel_unsubscribe_job', job_id=job_id)
+        }), 202
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
     except Exception as e:
         logger.error(f"Bulk unsubscribe error: {str(e)}")
         return jsonify({
@@ -569,6 +977,89 @@ def bulk_unsubscribe():
             'message': str(e)
         }), 400
 
+def get_own_unsubscribe_job(job_id):
+    """Get a bulk unsubscribe job if it belongs to the logged in user, or None"""
+    job = unsubscribe_job_manager.get_job(job_id)
+    if not job or job['account'] != session['email'].lower():
+        return None
+    return job
+
+@app.route('/api/unsubscribe_jobs/<job_id>', methods=['GET'])
+def get_unsubscribe_job(job_id):
+    """API endpoint to poll the progress and per-link status of a bulk unsubscribe job"""
+    if 'email' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    job = get_own_unsubscribe_job(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Unsubscribe job not found'}), 404
+    
+    credit_unsubscribe_jobs()
+    job.pop('completed', None)
+    job.pop('version', None)
+    
+    return jsonify({
+        'status': 'success',
+        'job': job,
+        'totalUnsubscribed': session.get('total_unsubscribed', 0)
+    })
+
+@app.route('/api/unsubscribe_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_unsubscribe_job(job_id):
+    """API endpoint to cancel a bulk unsubscribe job"""
+    if 'email' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    if not get_own_unsubscribe_job(job_id):
+        return jsonify({'status': 'error', 'message': 'Unsubscribe job not found'}), 404
+    
+    if not unsubscribe_job_manager.cancel(job_id):
+        return jsonify({'status': 'error', 'message': 'Unsubscribe job is not running'}), 409
+    
+    return jsonify({'status': 'success', 'message': 'Cancelling unsubscribe job'})
+
+@app.route('/api/unsubscribe_jobs/<job_id>/stream', methods=['GET'])
+def unsubscribe_job_stream(job_id):
+    """Stream the progress of a bulk unsubscribe job as Server-Sent Events"""
+    if 'email' not in session:
+        return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
+    
+    if not get_own_unsubscribe_job(job_id):
+        return jsonify({'status': 'error', 'message': 'Unsubscribe job not found'}), 404
+    
+    def generate():
+        sent = 0
+        version = -1
+        while True:
+            job = unsubscribe_job_manager.get_job(job_id)
+            if job is None:
+                # Pruned from memory and the store while the stream was open
+                yield format_sse('error', {'message': 'Unsubscribe job is no longer available'})
+                return
+            if job['version'] == version:
+                # No change within the wait timeout, keep the connection open
+                yield ": keep-alive\n\n"
+            version = job['version']
+            
+            for position in job['completed'][sent:]:
+                yield format_sse('link', job['links'][position])
+            sent = len(job['completed'])
+            yield format_sse('progress', job['progress'])
+            
+            if job['status'] not in ('queued', 'running'):
+                yield format_sse('done', {'status': job['status'], 'error': job['error'], **job['progress']})
+                return
+            unsubscribe_job_manager.wait_for_change(job_id, version)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+        }
+    )
+
 @app.route('/api/schedule_scan', methods=['POST'])
 def schedule_scan():
     """API endpoint to schedule automated scans"""
@@ -683,22 +1174,33 @@ def get_analytics():
     
     try:
         # We need subscription data to generate analytics
-        if 'last_scan_data' not in session:
+        data_id = session.get('scan_data_id')
+        version = scan_data_store.get_version(session['email'], data_id) if data_id else None
+        if not version:
             return jsonify({
                 'status': 'error',
                 'message': 'No scan data available. Please scan your inbox first.'
             }), 404
         
-        subscription_data = session['last_scan_data']
         email = session['email']
+        etag = f"analytics-{version}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
-        # Generate analytics
-        analytics = subscription_analytics.analyze_subscriptions(subscription_data, email)
+        def build_analytics_response():
+            index = scan_data_store.get_index(email, data_id)
+            if not index:
+                raise ValueError('No scan data available. Please scan your inbox first.')
+            
+            # Generate analytics
+            return {
+                'status': 'success',
+                'analytics': subscription_analytics.analyze_subscriptions(index.subscriptions, email)
+            }
         
-        return jsonify({
-            'status': 'success',
-            'analytics': analytics
-        })
+        return cached_json_response(('analytics', email.lower(), version), build_analytics_response, etag)
     except Exception as e:
         logger.error(f"Analytics error: {str(e)}")
         return jsonify({
@@ -725,13 +1227,14 @@ def category_feedback():
             }), 400
         
         # Find the email in the scan data
-        if 'last_scan_data' not in session:
+        stored_scan = get_stored_scan()
+        if not stored_scan:
             return jsonify({
                 'status': 'error',
                 'message': 'No scan data available'
             }), 404
         
-        scan_data = session['last_scan_data']
+        scan_data = stored_scan['data']
         target_email = None
         
         for email in scan_data:
@@ -745,17 +1248,21 @@ def category_feedback():
                 'message': 'Email not found in scan data'
             }), 404
         
-        # Update the model with this feedback
+        # Queue this feedback for the categorizer's background trainer
         success = email_categorizer.update_with_feedback(target_email, correct_category)
         
         if success:
             # Update the category in the scan data
             target_email['category'] = correct_category
-            session['last_scan_data'] = scan_data
+            target_email['category_model_version'] = None  # Set by the user, not by a model
+            session['scan_data_id'] = scan_data_store.put(session['email'], scan_data)
+            subscription_analytics.clear_cache(session['email'])
             
             return jsonify({
                 'status': 'success',
-                'message': f'Updated category from {original_category} to {correct_category}'
+                'message': f'Updated category from {original_category} to {correct_category}',
+                'queued': True,
+                'model_version': email_categorizer.model_version
             })
         else:
             return jsonify({
@@ -777,7 +1284,11 @@ def logout():
         if session.get('oauth_authenticated') and 'oauth_provider' in session:
             oauth_handler.revoke_access(session['oauth_provider'])
         
-        # Clear the session
+        # Clear the stored results and the session
+        if 'email' in session:
+            account = session['email'].lower()
+            scan_data_store.delete(account)
+            response_cache.invalidate(lambda key: key[1] == account)
         session.clear()
         
         return jsonify({
@@ -799,7 +1310,8 @@ def export_csv():
         return jsonify({'status': 'error', 'message': 'Not logged in'}), 401
     
     try:
-        if 'last_scan_data' not in session:
+        stored_scan = get_stored_scan()
+        if not stored_scan:
             return jsonify({
                 'status': 'error',
                 'message': 'No scan data available'
@@ -811,7 +1323,7 @@ def export_csv():
         writer = csv.DictWriter(csv_output, fieldnames=fieldnames)
         
         writer.writeheader()
-        for item in session['last_scan_data']:
+        for item in stored_scan['data']:
             writer.writerow({
                 'sender': item.get('sender', 'Unknown'),
                 'category': item.get('category', 'Unknown'),
@@ -842,6 +1354,9 @@ def debug_dashboard():
     # Log session info
     logger.info(f"Session contains keys: {list(session.keys())}")
     
+    stored_scan = get_stored_scan()
+    scan_data = stored_scan['data'] if stored_scan else None
+    
     # Create debug response
     debug_info = {
         'session': {
@@ -850,27 +1365,31 @@ def debug_dashboard():
             'has_password': 'password' in session,
             'provider': session.get('provider', 'Not set'),
             'oauth_authenticated': session.get('oauth_authenticated', False),
-            'has_scan_data': 'last_scan_data' in session,
+            'has_scan_data': stored_scan is not None,
             'scan_time': session.get('last_scan_time', 'Not set'),
             'total_found': session.get('total_found', 0),
             'total_unsubscribed': session.get('total_unsubscribed', 0)
         },
         'dashboard_rendering': {
             'can_render': 'email' in session and ('oauth_authenticated' in session or 'password' in session),
-            'data_available': 'last_scan_data' in session and session.get('last_scan_data') is not None
-        }
+            'data_available': scan_data is not None
+        },
+        'scan_data_store': scan_data_store.get_stats(),
+        'response_cache': response_cache.get_stats(),
+        'http_pool': get_shared_pool().get_stats(),
+        'categorizer': email_categorizer.get_stats()
     }
     
-    # Check if we have last_scan_data and it's valid
-    if 'last_scan_data' in session and session['last_scan_data']:
-        data_sample = session['last_scan_data'][:2] if len(session['last_scan_data']) > 2 else session['last_scan_data']
+    # Check if we have scan data and it's valid
+    if scan_data:
+        data_sample = scan_data[:2] if len(scan_data) > 2 else scan_data
         debug_info['data_sample'] = data_sample
-        debug_info['data_count'] = len(session['last_scan_data'])
+        debug_info['data_count'] = len(scan_data)
     
     # Try to analyze the data and catch any errors
-    if 'last_scan_data' in session and session['last_scan_data']:
+    if scan_data:
         try:
-            analytics = subscription_analytics.analyze_subscriptions(session['last_scan_data'], session.get('email'))
+            analytics = subscription_analytics.analyze_subscriptions(scan_data, session.get('email'))
             debug_info['analytics'] = {
                 'success': True,
                 'categories': analytics.get('categories', {}),
@@ -0,0 +1,132 @@
+"""
+Benchmark category feedback: update latency and how much the model remembers afterwards.
+
+Compares the online model (hashing vectorizer + MultinomialNB.partial_fit), applying
+each correction on its own and in the trainer's micro-batches (latency per correction),
+with refitting the pipeline on the single corrected email, and with retraining from
+scratch on the keyword data plus all feedback so far.
+
+Usage:
+    python benchmark_categorizer.py [num_feedback] [num_eval]
+"""
+import sys
+import time
+import random
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+from email_categorizer import EmailCategorizer, FEEDBACK_BATCH_SIZE
+
+TEMPLATES = [
+    "Your {a} and {b} digest for this week",
+    "New {a} offers: {b} inside",
+    "{a} reminder - {b} details",
+    "Don't miss today's {a} {b} picks"
+]
+
+# Subjects without category keywords, so only the sender tells the category
+NEUTRAL_SUBJECTS = ["Your monthly digest", "A note from the team", "This week at a glance", "Hello again"]
+
+
+def build_held_out(categorizer, count, seed):
+    """Build emails with two keywords of their labelled category, to measure what the model knows"""
+    rng = random.Random(seed)
+    emails = []
+    labels = []
+    for _ in range(count):
+        category = rng.choice(categorizer.categories)
+        a, b = rng.sample(categorizer.category_keywords[category], 2)
+        emails.append({'subject': rng.choice(TEMPLATES).format(a=a, b=b)})
+        labels.append(category)
+    return emails, labels
+
+
+def build_feedback(categorizer, count, seed):
+    """Build emails only recognisable by their sender, as users correct them"""
+    rng = random.Random(seed)
+    emails = []
+    labels = []
+    for i in range(count):
+        emails.append({
+            'subject': rng.choice(NEUTRAL_SUBJECTS),
+            'sender': f"Brand{i} <hello@brand{i}.example>"
+        })
+        labels.append(rng.choice(categorizer.categories))
+    return emails, labels
+
+
+def accuracy(categorizer, emails, labels):
+    """Share of emails the categorizer puts in their labelled category"""
+    results = categorizer.bulk_categorize(emails)
+    return sum(1 for (_, category, _), label in zip(results, labels) if category == label) / len(labels)
+
+
+def report(label, latencies, retained, corrected):
+    """Print latency and accuracy figures for one strategy"""
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<28} {mean * 1000:9.2f} ms {p95 * 1000:9.2f} ms {retained:9.1%} {corrected:10.1%}")
+
+
+def main():
+    num_feedback = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    num_eval = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    categorizer = EmailCategorizer()
+    eval_emails, eval_labels = build_held_out(categorizer, num_eval, seed=1)
+    feedback_emails, feedback_labels = build_feedback(categorizer, num_feedback, seed=2)
+    texts = [categorizer._extract_features(email) for email in feedback_emails]
+    X, y = categorizer._keyword_samples()
+
+    print(f"{num_feedback} feedback updates, {num_eval} held-out emails; before feedback "
+          f"{accuracy(categorizer, eval_emails, eval_labels):.1%} held-out and "
+          f"{accuracy(categorizer, feedback_emails, feedback_labels):.1%} of the corrected emails right")
+    print()
+    print(f"{'strategy':<28} {'mean':>12} {'p95':>12} {'retained':>9} {'corrected':>10}")
+
+    # Online updates, one model version per correction
+    latencies = []
+    for text, label in zip(texts, feedback_labels):
+        start = time.perf_counter()
+        categorizer._apply_feedback([(text, label)])
+        latencies.append(time.perf_counter() - start)
+    report("partial_fit, each", latencies,
+           accuracy(categorizer, eval_emails, eval_labels), accuracy(categorizer, feedback_emails, feedback_labels))
+
+    # Online updates in micro-batches, as the background trainer applies queued feedback
+    batched = EmailCategorizer()
+    latencies = []
+    for offset in range(0, len(texts), FEEDBACK_BATCH_SIZE):
+        batch = list(zip(texts, feedback_labels))[offset:offset + FEEDBACK_BATCH_SIZE]
+        start = time.perf_counter()
+        batched._apply_feedback(batch)
+        latencies.extend([(time.perf_counter() - start) / len(batch)] * len(batch))
+    report(f"partial_fit, batches of {FEEDBACK_BATCH_SIZE}", latencies,
+           accuracy(batched, eval_emails, eval_labels), accuracy(batched, feedback_emails, feedback_labels))
+
+    # Refit on the one corrected email, the previous behaviour
+    refit = EmailCategorizer()
+    latencies = []
+    for text, label in zip(texts, feedback_labels):
+        start = time.perf_counter()
+        refit.model = Pipeline([('vectorizer', CountVectorizer(ngram_range=(1, 2))), ('classifier', MultinomialNB())])
+        refit.model.fit([text], [label])
+        latencies.append(time.perf_counter() - start)
+    report("fit on one sample", latencies,
+           accuracy(refit, eval_emails, eval_labels), accuracy(refit, feedback_emails, feedback_labels))
+
+    # Retrain from scratch on everything, correct but grows with the feedback history
+    retrain = EmailCategorizer()
+    latencies = []
+    for count in range(1, len(texts) + 1):
+        start = time.perf_counter()
+        retrain.model = Pipeline([('vectorizer', CountVectorizer(ngram_range=(1, 2))), ('classifier', MultinomialNB())])
+        retrain.model.fit(X + texts[:count], y + feedback_labels[:count])
+        latencies.append(time.perf_counter() - start)
+    report("full retrain", latencies,
+           accuracy(retrain, eval_emails, eval_labels), accuracy(retrain, feedback_emails, feedback_labels))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark keyword categorization: one pass of the shared KeywordMatcher versus
+the previous per-keyword scans.
+
+The email categorizer's fallback used to run one \\b-delimited regular expression
+search per keyword, and EmailUnsubscriber._determine_category one substring test per
+keyword and field. Both are timed against the matcher on the same generated emails,
+and their results are compared.
+
+Usage:
+    python benchmark_keywords.py [num_emails] [rounds]
+"""
+import re
+import sys
+import time
+import random
+from email.message import Message
+from email_categorizer import EmailCategorizer
+from email_unsubscriber import EmailUnsubscriber, CATEGORY_KEYWORDS
+
+FILLER = ("thanks for being with us here is what happened this week see the details below "
+          "and let us know what you think reply to this email with any questions").split()
+
+
+def build_emails(categorizer, count, seed):
+    """Build emails whose subject and content mix category keywords with filler words"""
+    rng = random.Random(seed)
+    keywords = [keyword for words in categorizer.category_keywords.values() for keyword in words]
+    emails = []
+    for i in range(count):
+        words = rng.choices(FILLER, k=rng.randint(60, 150)) + rng.sample(keywords, rng.randint(0, 6))
+        rng.shuffle(words)
+        subject = ' '.join(rng.sample(FILLER, 3) + rng.sample(keywords, rng.randint(0, 2))).capitalize()
+        emails.append({
+            'subject': subject,
+            'sender': f"Sender{i % 300} <news@{rng.choice(['mail', 'shopify', 'updates', 'team'])}{i % 300}.example>",
+            'content': ' '.join(words)
+        })
+    return emails
+
+
+def scan_each_keyword(categorizer, text):
+    """Previous fallback scoring: one regular expression search per keyword"""
+    text = text.lower()
+    scores = dict.fromkeys(categorizer.category_keywords, 0)
+    for category, keywords in categorizer.category_keywords.items():
+        for keyword in keywords:
+            scores[category] += len(re.findall(r'\b' + re.escape(keyword) + r'\b', text))
+    return scores
+
+
+def test_each_keyword(message):
+    """Previous header categorization: substring tests per category, keyword and field"""
+    from_header = message.get('From', '').lower()
+    subject = message.get('Subject', '').lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in from_header or keyword in subject for keyword in keywords):
+            return category
+    return 'Promotions'
+
+
+def timed(label, fn, items, rounds):
+    """Apply fn to every item for the given number of rounds, print the throughput and return the results"""
+    results = [fn(item) for item in items]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            fn(item)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms {len(items) / elapsed:12,.0f} emails/s")
+    return results
+
+
+def main():
+    num_emails = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    categorizer = EmailCategorizer()
+    emails = build_emails(categorizer, num_emails, seed=1)
+    texts = [categorizer._extract_features(email) for email in emails]
+    messages = []
+    for email in emails:
+        message = Message()
+        message['From'] = email['sender']
+        message['Subject'] = email['subject']
+        messages.append(message)
+    unsubscriber = EmailUnsubscriber.__new__(EmailUnsubscriber)
+
+    keywords = sum(len(words) for words in categorizer.category_keywords.values())
+    print(f"{num_emails} emails of about {sum(map(len, texts)) // num_emails} characters, {rounds} rounds")
+    print()
+
+    print(f"Fallback scores ({keywords} keywords, {len(categorizer.category_keywords)} categories)")
+    before = timed("one search per keyword", lambda text: scan_each_keyword(categorizer, text), texts, rounds)
+    after = timed("KeywordMatcher.scores", categorizer.keyword_matcher.scores, texts, rounds)
+    print(f"{'same scores':<40} {sum(a == b for a, b in zip(before, after))}/{num_emails}")
+    timed("_keyword_categorize", categorizer._keyword_categorize, texts, rounds)
+    print()
+
+    print(f"Header categories ({sum(len(words) for words in CATEGORY_KEYWORDS.values())} keywords)")
+    before = timed("substring test per keyword", test_each_keyword, messages, rounds)
+    after = timed("_determine_category", unsubscriber._determine_category, messages, rounds)
+    print(f"{'same category':<40} {sum(a == b for a, b in zip(before, after))}/{num_emails}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark serialization and compression of a large /api/subscription_data payload.
+
+Usage:
+    python benchmark_responses.py [num_subscriptions] [rounds]
+"""
+import sys
+import json
+import gzip
+import time
+import random
+from datetime import datetime, timedelta
+from flask import Flask
+from response_cache import ResponseCache, dumps, ORJSON_AVAILABLE, BROTLI_AVAILABLE
+
+CATEGORIES = ['Shopping', 'News', 'Social', 'Finance', 'Travel', 'Entertainment', 'Technology', 'Other']
+
+
+def build_payload(num_subscriptions):
+    """Build a dashboard payload shaped like the /api/subscription_data response"""
+    random.seed(42)
+    now = datetime.now()
+    subscriptions = []
+    for i in range(num_subscriptions):
+        domain = f"sender{i % 400}.example.com"
+        subscriptions.append({
+            'sender': f"Sender {i % 400} Newsletter",
+            'email': f"news@{domain}",
+            'unsubscribe_link': f"https://{domain}/unsubscribe?u={i:06d}&list=weekly-digest&token={random.getrandbits(64):016x}",
+            'method': random.choice(['header', 'body']),
+            'provider': 'gmail',
+            'category': random.choice(CATEGORIES),
+            'last_received': (now - timedelta(days=random.randint(0, 90))).strftime('%Y-%m-%d %H:%M:%S'),
+            'email_id': str(1000 + i),
+            'confidence': round(random.random(), 3)
+        })
+
+    categories = {}
+    for sub in subscriptions:
+        categories[sub['category']] = categories.get(sub['category'], 0) + 1
+
+    return {
+        'status': 'success',
+        'mode': 'full',
+        'version': 1,
+        'subscriptions': subscriptions,
+        'stats': {'total_found': len(subscriptions), 'categories': categories},
+        'analytics': {'categories': categories, 'total_subscriptions': len(subscriptions)},
+        'totalUnsubscribed': 0,
+        'timeSaved': {'minutes': len(subscriptions) * 2},
+        'cached': True,
+        'last_scan_time': now.isoformat()
+    }
+
+
+def timed(label, fn, rounds):
+    """Run fn the given number of times and print the mean time per call"""
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{label:<36} {elapsed * 1000:8.2f} ms")
+    return result
+
+
+def main():
+    num_subscriptions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    payload = build_payload(num_subscriptions)
+    app = Flask(__name__)
+
+    print(f"Payload: {num_subscriptions} subscriptions, {rounds} rounds "
+          f"(orjson {'on' if ORJSON_AVAILABLE else 'off'}, brotli {'on' if BROTLI_AVAILABLE else 'off'})")
+    print()
+
+    with app.app_context():
+        body = timed("jsonify", lambda: app.json.response(payload).get_data(), rounds)
+    timed("json.dumps (compact)", lambda: json.dumps(payload, separators=(',', ':')).encode('utf-8'), rounds)
+    data = timed("response_cache.dumps", lambda: dumps(payload), rounds)
+    gzipped = timed("gzip level 6", lambda: gzip.compress(data, compresslevel=6), rounds)
+    if BROTLI_AVAILABLE:
+        import brotli
+        brotlied = timed("brotli quality 5", lambda: brotli.compress(data, quality=5), rounds)
+
+    cache = ResponseCache()
+    cache.get('payload', lambda: payload).encoded('gzip')
+    timed("cached hit (gzip)", lambda: cache.get('payload', lambda: payload).encoded('gzip'), rounds * 100)
+
+    print()
+    print(f"{'jsonify body':<36} {len(body):8d} bytes")
+    print(f"{'compact body':<36} {len(data):8d} bytes")
+    print(f"{'gzip body':<36} {len(gzipped):8d} bytes")
+    if BROTLI_AVAILABLE:
+        print(f"{'brotli body':<36} {len(brotlied):8d} bytes")
+
+
+if __name__ == '__main__':
+    main()
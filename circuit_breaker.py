@@ -0,0 +1,138 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+# Setup logging
+breaker_logger = logging.getLogger('HostCircuitBreaker')
+
+# Breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class HostCircuitBreaker:
+    """
+    Circuit breaker per destination host.
+    After `failure_threshold` consecutive failed requests (connection errors, timeouts, 5xx)
+    a host is tripped and requests to it fail immediately. Failures of requests that were
+    already in flight when it tripped do not extend the open period. Once the open period has
+    passed a single probe request is let through: success closes the breaker, failure
+    opens it again for twice as long (with jitter), up to `max_reset_timeout`.
+    """
+    def __init__(self, failure_threshold=None, reset_timeout=None, max_reset_timeout=600, max_hosts=1000):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that trip a host
+            reset_timeout: Seconds a tripped host stays open the first time
+            max_reset_timeout: Upper bound for the open period after repeated trips
+            max_hosts: Maximum number of hosts to track
+        """
+        self.failure_threshold = failure_threshold or int(os.environ.get('CIRCUIT_FAILURES', 3))
+        self.reset_timeout = reset_timeout or float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+        self.max_reset_timeout = max_reset_timeout
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()  # host -> state dictionary, only for hosts with recent failures
+        self.lock = threading.Lock()
+        self.fast_failures = 0
+
+    def allow(self, host):
+        """
+        Check whether a request to the host may be sent, claiming the probe of a half-open host
+
+        Args:
+            host: Destination host
+
+        Returns:
+            bool: True if the request may be sent
+        """
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is None or entry['state'] == CLOSED:
+                return True
+            if entry['state'] == OPEN and time.monotonic() >= entry['open_until']:
+                entry['state'] = HALF_OPEN
+                breaker_logger.info(f"Probing {host} after {entry['trips']} trips")
+                return True
+            self.fast_failures += 1
+            return False
+
+    def is_open(self, host):
+        """
+        Check whether requests to the host would currently fail fast, without claiming a probe
+
+        Args:
+            host: Destination host
+
+        Returns:
+            bool: True if the host is tripped
+        """
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is None or entry['state'] == CLOSED:
+                return False
+            return entry['state'] == HALF_OPEN or time.monotonic() < entry['open_until']
+
+    def record_success(self, host):
+        """Record a successful request, closing the host's breaker"""
+        with self.lock:
+            entry = self.hosts.pop(host, None)
+        if entry and entry['state'] != CLOSED:
+            breaker_logger.info(f"Circuit for {host} closed")
+
+    def record_failure(self, host):
+        """Record a failed request, tripping a closed host once it fails too often and reopening a probed one"""
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is None:
+                entry = self.hosts[host] = {'state': CLOSED, 'failures': 0, 'trips': 0, 'open_until': 0.0}
+                self._prune()
+            self.hosts.move_to_end(host)
+            if entry['state'] == OPEN:
+                # Sent before the host tripped; the open period it got then stands
+                return
+
+            entry['failures'] += 1
+            if entry['state'] == HALF_OPEN or entry['failures'] >= self.failure_threshold:
+                entry['trips'] += 1
+                timeout = min(self.max_reset_timeout, self.reset_timeout * 2 ** (entry['trips'] - 1))
+                timeout *= random.uniform(0.8, 1.2)  # Spread the probes of hosts tripped together
+                entry['state'] = OPEN
+                entry['open_until'] = time.monotonic() + timeout
+                breaker_logger.warning(f"Circuit for {host} opened for {timeout:.0f}s "
+                                       f"after {entry['failures']} failures")
+
+    def release(self, host):
+        """Give back a claimed probe when the request failed for reasons unrelated to the host"""
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry and entry['state'] == HALF_OPEN:
+                entry['state'] = OPEN
+
+    def get_stats(self):
+        """
+        Get circuit breaker statistics
+
+        Returns:
+            dict: Hosts tracked, hosts currently tripped and requests failed fast
+        """
+        with self.lock:
+            now = time.monotonic()
+            tripped = [host for host, entry in self.hosts.items()
+                       if entry['state'] == HALF_OPEN or (entry['state'] == OPEN and now < entry['open_until'])]
+            return {
+                'hosts_tracked': len(self.hosts),
+                'open_hosts': tripped[:20],
+                'open_count': len(tripped),
+                'fast_failures': self.fast_failures
+            }
+
+    def _prune(self):
+        """Drop the least recently failing hosts beyond max_hosts (caller holds the lock)"""
+        while len(self.hosts) > self.max_hosts:
+            self.hosts.popitem(last=False)
@@ -0,0 +1,156 @@
+import os
+import time
+import socket
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+# Setup logging
+dns_logger = logging.getLogger('DnsCache')
+
+
+def system_resolver(host):
+    """Resolve a host name with the operating system resolver"""
+    return socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+
+
+class DnsCache:
+    """
+    Cache of resolved host addresses with a time to live.
+    Concurrent lookups of the same host share one resolver call, failed lookups are
+    cached briefly so a dead domain is not resolved again for every link, and
+    prefetch() resolves all hosts of a batch in parallel before requests start.
+    """
+    def __init__(self, ttl=None, negative_ttl=30, max_hosts=1000, resolver=None, max_workers=16):
+        """
+        Initialize the DNS cache
+
+        Args:
+            ttl: Seconds to keep a resolved address
+            negative_ttl: Seconds to remember that a host could not be resolved
+            max_hosts: Maximum number of hosts to keep
+            resolver: Function taking a host name and returning socket.getaddrinfo results;
+                      defaults to the operating system resolver
+            max_workers: Number of hosts resolved at the same time by prefetch
+        """
+        self.ttl = ttl or float(os.environ.get('DNS_CACHE_TTL', 300))
+        self.negative_ttl = negative_ttl
+        self.max_hosts = max_hosts
+        self.resolver = resolver or system_resolver
+        self.max_workers = max_workers
+        self.entries = OrderedDict()  # host -> (expires at, addresses or None, error or None)
+        self.pending = {}  # host -> Future of an in-flight lookup
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host):
+        """
+        Get the addresses of a host, from the cache if still fresh
+
+        Args:
+            host: Host name
+
+        Returns:
+            list: socket.getaddrinfo style tuples (family, type, proto, canonname, sockaddr)
+
+        Raises:
+            socket.gaierror: If the host cannot be resolved
+        """
+        host = host.lower()
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                self.entries.move_to_end(host)
+                if entry[2]:
+                    raise socket.gaierror(*entry[2].args)
+                return entry[1]
+
+            future = self.pending.get(host)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self.pending[host] = Future()
+
+        if owner:
+            self._lookup(host, future)
+        return future.result()
+
+    def _lookup(self, host, future):
+        """Call the resolver for a host and publish the outcome to waiting threads"""
+        try:
+            addresses = list(self.resolver(host))
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NONAME, f"No addresses for {host}")
+        except Exception as e:
+            error = e if isinstance(e, socket.gaierror) else socket.gaierror(socket.EAI_FAIL, str(e))
+            self._store(host, (time.monotonic() + self.negative_ttl, None, error))
+            future.set_exception(error)
+        else:
+            self._store(host, (time.monotonic() + self.ttl, addresses, None))
+            future.set_result(addresses)
+
+    def _store(self, host, entry):
+        """Save a lookup outcome and drop the oldest hosts beyond max_hosts"""
+        with self.lock:
+            self.entries[host] = entry
+            self.entries.move_to_end(host)
+            self.pending.pop(host, None)
+            while len(self.entries) > self.max_hosts:
+                self.entries.popitem(last=False)
+
+    def prefetch(self, hosts, timeout=5):
+        """
+        Resolve hosts concurrently so later requests find them in the cache
+
+        Args:
+            hosts: Iterable of host names
+            timeout: Maximum number of seconds to wait for the lookups
+
+        Returns:
+            int: Number of hosts that needed a lookup
+        """
+        now = time.monotonic()
+        with self.lock:
+            missing = sorted({host.lower() for host in hosts if host} -
+                             {host for host, entry in self.entries.items() if entry[0] > now})
+        if not missing:
+            return 0
+
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing)),
+                                      thread_name_prefix='dns-prefetch')
+        futures = [executor.submit(self._prefetch_one, host) for host in missing]
+        # Stragglers keep resolving in the background; requests to them just wait on the same lookup
+        wait(futures, timeout=timeout)
+        executor.shutdown(wait=False)
+        dns_logger.info(f"Pre-resolved {len(missing)} hosts in {time.monotonic() - start:.2f}s")
+        return len(missing)
+
+    def _prefetch_one(self, host):
+        """Resolve one host for prefetch, failures are cached and ignored"""
+        try:
+            self.resolve(host)
+        except OSError:
+            pass
+
+    def invalidate(self, host):
+        """Forget a host's addresses, e.g. after none of them accepted a connection"""
+        with self.lock:
+            self.entries.pop(host.lower(), None)
+
+    def get_stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            dict: Cached hosts, cache hits and resolver lookups
+        """
+        with self.lock:
+            return {
+                'hosts': len(self.entries),
+                'hits': self.hits,
+                'lookups': self.misses
+            }
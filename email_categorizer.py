@@ -1,34 +1,57 @@
 import logging
-import re
 import pickle
 import os
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-from collections import defaultdict
+import copy
+import time
+import queue
+import threading
+import importlib.util
+from keyword_matcher import KeywordMatcher
 
 # Setup logging
 categorizer_logger = logging.getLogger('EmailCategorizer')
 
 try:
-    import pandas as pd
-    import numpy as np
-    from sklearn.feature_extraction.text import CountVectorizer
-    from sklearn.naive_bayes import MultinomialNB
+    from naive_bayes_model import NaiveBayesModel
     ML_AVAILABLE = True
 except ImportError:
     ML_AVAILABLE = False
 
+# scikit-learn is only imported to train a model; serving a built model needs NumPy alone
+SKLEARN_AVAILABLE = ML_AVAILABLE and importlib.util.find_spec('sklearn') is not None
+
+# Size of the hashed feature space. Hashing needs no fitted vocabulary, so words first
+# seen in feedback get weights too; changing it invalidates saved models
+HASH_FEATURES = 2 ** 16
+
+# Feedback is applied in micro-batches of up to this many corrections, collected for up to this many seconds
+FEEDBACK_BATCH_SIZE = int(os.environ.get('CATEGORIZER_BATCH_SIZE', 64))
+FEEDBACK_BATCH_DELAY = float(os.environ.get('CATEGORIZER_BATCH_DELAY', 0.5))
+FEEDBACK_QUEUE_SIZE = 10000
+
+# Model directory written by save_model (see build_categorizer.py and NaiveBayesModel)
+DEFAULT_MODEL_PATH = 'categorizer_model'
+
 class EmailCategorizer:
     """
     Enhanced email categorizer using machine learning to identify subscription types.
+    The model learns online: training and feedback add their word counts to the
+    Naive Bayes classifier with partial_fit, so a correction costs one small update
+    and never discards what the model already knows.
+    Feedback is queued and applied by a background trainer in micro-batches. Each
+    update is made to a copy of the model, which then replaces the active model in a
+    single assignment, so categorization never waits for training.
+    The model is loaded on first use from the artifact built by build_categorizer.py,
+    and only trained from the category keywords if there is no usable artifact.
+    Categorizing with a built model needs NumPy only; scikit-learn is imported once
+    the categorizer has to train.
     """
     def __init__(self, model_path=None):
         """
         Initialize the email categorizer
         
         Args:
-            model_path: Path to a pre-trained model file (optional)
+            model_path: Path to a model directory (defaults to CATEGORIZER_MODEL or categorizer_model)
         """
         self.ml_available = ML_AVAILABLE
         self.categories = [
@@ -99,41 +122,162 @@ class EmailCategorizer:
                 'web', 'cloud', 'data', 'download', 'upgrade'
             ]
         }
-        
-        # Initialize the ML model
-        self.model = None
-        self.load_model(model_path)
+        self.keyword_matcher = KeywordMatcher(self.category_keywords)
+        
+        # Initialize the ML model; the active model and its version are replaced together
+        self.active = (None, 0)
+        # Serializes model updates, categorization never takes it; taken after load_lock, never before it
+        self.update_lock = threading.Lock()
+        self.feedback_queue = queue.Queue(maxsize=FEEDBACK_QUEUE_SIZE)
+        self.trainer_lock = threading.Lock()
+        self.trainer_thread = None
+        self.feedback_stats = {'applied': 0, 'failed': 0, 'batches': 0, 'last_batch_size': 0, 'last_batch_seconds': 0.0}
+        
+        # The model is loaded lazily, so creating the categorizer costs nothing at startup
+        self.model_path = model_path or os.environ.get('CATEGORIZER_MODEL', DEFAULT_MODEL_PATH)
+        self.load_lock = threading.Lock()
+        self.load_stats = {'model_source': None, 'artifact_version': None, 'load_seconds': None}
+    
+    @property
+    def model(self):
+        """The model categorization currently uses, loaded on first use"""
+        if self.active[0] is None:
+            self._ensure_model()
+        return self.active[0]
+    
+    @model.setter
+    def model(self, model):
+        # One assignment, so readers see either the previous or the new model with its version
+        self.active = (model, self.active[1] + 1)
+    
+    @property
+    def model_version(self):
+        """Version of the active model, increased every time a model is installed"""
+        return self.active[1]
+    
+    def _ensure_model(self):
+        """Load the model if no model is active yet"""
+        if self.ml_available and self.active[0] is None:
+            with self.load_lock:
+                if self.active[0] is None:
+                    self._load(self.model_path)
     
     def load_model(self, model_path=None):
         """
-        Load a pre-trained ML model if available, otherwise create a new one
+        Load a pre-built model artifact if available, otherwise train a new model
         
         Args:
-            model_path: Path to the model file
+            model_path: Path to the model file, defaults to the categorizer's model path
+            
+        Returns:
+            bool: True if the model was loaded from the file
         """
+        with self.load_lock:
+            return self._load(model_path or self.model_path)
+    
+    def _load(self, model_path):
+        """Load or train a model and make it active (caller holds load_lock)"""
+        start = time.monotonic()
         if model_path and os.path.exists(model_path):
             try:
-                with open(model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                categorizer_logger.info(f"Loaded model from {model_path}")
+                model, version = self._read_artifact(model_path)
+                self._install(model, 'artifact', version, start)
+                categorizer_logger.info(f"Loaded model {version} from {model_path} "
+                                        f"in {self.load_stats['load_seconds'] * 1000:.0f}ms")
                 return True
             except Exception as e:
                 categorizer_logger.error(f"Error loading model: {str(e)}")
         
-        # If no model or loading failed, create a new one
-        self.model = Pipeline([
-            ('vectorizer', CountVectorizer(ngram_range=(1, 2))),
+        # If no model or loading failed, train a new one
+        if not SKLEARN_AVAILABLE:
+            categorizer_logger.warning(f"No usable model at {model_path} and scikit-learn is not available "
+                                       f"to train one, using keyword-based categorization only")
+            self.ml_available = False
+            return False
+        self._install(self._train_with_keywords(), 'keywords', None, start)
+        categorizer_logger.info(f"No usable model at {model_path}, trained from keywords in "
+                                f"{self.load_stats['load_seconds'] * 1000:.0f}ms; "
+                                f"run build_categorizer.py to skip this")
+        return False
+    
+    def _read_artifact(self, model_path):
+        """
+        Map a model directory written by save_model, or read a pickled model file from before
+        
+        Returns:
+            tuple: The model and the artifact version (None for a bare pipeline)
+            
+        Raises:
+            ValueError: If the artifact does not fit this categorizer
+        """
+        if os.path.isdir(model_path):
+            model = NaiveBayesModel.load(model_path)
+            if model.meta['n_features'] != HASH_FEATURES or sorted(model.meta['classes']) != sorted(self.categories):
+                raise ValueError(f"Model {model.version} was built for different features or categories")
+            return model, model.version
+        
+        import sklearn
+        
+        with open(model_path, 'rb') as f:
+            artifact = pickle.load(f)
+        if not isinstance(artifact, dict):
+            return artifact, None
+        
+        if artifact.get('format') != 1:
+            raise ValueError(f"Unsupported model format {artifact.get('format')}")
+        if artifact['hash_features'] != HASH_FEATURES or sorted(artifact['categories']) != sorted(self.categories):
+            raise ValueError(f"Model {artifact['version']} was built for different features or categories")
+        if artifact['sklearn_version'] != sklearn.__version__:
+            categorizer_logger.warning(f"Model {artifact['version']} was built with scikit-learn "
+                                       f"{artifact['sklearn_version']}, running {sklearn.__version__}")
+        return artifact['model'], artifact['version']
+    
+    def _install(self, model, source, artifact_version, start):
+        """Make a loaded or newly trained model active and remember where it came from"""
+        with self.update_lock:
+            self.model = model
+        self.load_stats = {
+            'model_source': source,
+            'artifact_version': artifact_version,
+            'load_seconds': round(time.monotonic() - start, 3)
+        }
+    
+    def build_model(self):
+        """Train a new model from the category keywords and make it active"""
+        start = time.monotonic()
+        self._install(self._train_with_keywords(), 'keywords', None, start)
+    
+    def _train_with_keywords(self):
+        """
+        Train a new model with category keywords as training data
+        
+        Returns:
+            Pipeline: The trained model
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+        
+        model = Pipeline([
+            # Raw term counts as MultinomialNB expects: no sign flipping, no normalization
+            ('vectorizer', HashingVectorizer(ngram_range=(1, 2), n_features=HASH_FEATURES,
+                                             alternate_sign=False, norm=None)),
             ('classifier', MultinomialNB())
         ])
+        X, y = self._keyword_samples()
         
-        # Train with our keyword sets as a starting point
-        self._train_with_keywords()
-        
-        return False
+        # Train the model
+        model = self._fitted_copy(model, X, y)
+        categorizer_logger.info("Trained model with keyword data")
+        return model
     
-    def _train_with_keywords(self):
-        """Initialize the model with category keywords as training data"""
-        # Create synthetic training data using keywords
+    def _keyword_samples(self):
+        """
+        Create synthetic training data using keywords
+        
+        Returns:
+            tuple: List of sample texts and list of their categories
+        """
         X = []
         y = []
         
@@ -154,13 +298,42 @@ class EmailCategorizer:
                 X.append(f"Latest {keyword} news and updates")
                 y.append(category)
         
-        # Train the model
-        self.model.fit(X, y)
-        categorizer_logger.info("Trained model with keyword data")
+        return X, y
+    
+    def _fitted_copy(self, model, texts, labels):
+        """
+        Add examples to a copy of a model without forgetting earlier ones; the model
+        itself is left untouched, so it can keep serving while the copy is trained
+        
+        Args:
+            model: Model to start from
+            texts: List of texts from _extract_features
+            labels: List of corresponding categories
+            
+        Returns:
+            Pipeline: The updated copy
+        """
+        from sklearn.pipeline import Pipeline
+        
+        if isinstance(model, NaiveBayesModel):
+            # The mapped arrays are read-only; training continues on a pipeline with its own counts
+            model = model.to_pipeline()
+        name, classifier = model.steps[-1]
+        classifier = copy.deepcopy(classifier)
+        
+        # The hashing vectorizer is stateless (models saved before it keep their fitted
+        # vocabulary), so only the classifier's counts change and the vectorizer is shared
+        features = model[:-1].transform(texts)
+        if hasattr(classifier, 'classes_'):
+            classifier.partial_fit(features, labels)
+        else:
+            classifier.partial_fit(features, labels, classes=self.categories)
+        return Pipeline(model.steps[:-1] + [(name, classifier)])
     
     def save_model(self, model_path):
         """
-        Save the current model to a file
+        Save the current model as a new version of a model directory, without pickling
+        Workers starting meanwhile load either the old or the new version
         
         Args:
             model_path: Path to save the model to
@@ -168,14 +341,15 @@ class EmailCategorizer:
         Returns:
             bool: True if successful
         """
-        if not self.model:
+        model = self.model
+        if not model:
             categorizer_logger.error("No model to save")
             return False
         
         try:
-            with open(model_path, 'wb') as f:
-                pickle.dump(self.model, f)
-            categorizer_logger.info(f"Saved model to {model_path}")
+            if isinstance(model, NaiveBayesModel):
+                model = model.to_pipeline()
+            NaiveBayesModel.save(model_path, model)
             return True
         except Exception as e:
             categorizer_logger.error(f"Error saving model: {str(e)}")
@@ -192,37 +366,48 @@ class EmailCategorizer:
             str: The most likely category
             dict: Confidence scores for each category
         """
-        # Check if we have scikit-learn available
-        if not hasattr(self, 'ml_available'):
-            try:
-                import sklearn
-                self.ml_available = True
-            except ImportError:
-                self.ml_available = False
-                categorizer_logger.warning("scikit-learn is not available, using keyword-based categorization only")
-        
         # Extract features from email
         text = self._extract_features(email_data)
         
+        results, _ = self._categorize_texts([text])
+        return results[0]
+    
+    def _categorize_texts(self, texts):
+        """
+        Categorize a batch of extracted feature texts
+        The batch is vectorised once and the model is asked for probabilities once;
+        the predicted category is the most probable class, as MultinomialNB.predict would return
+        
+        Args:
+            texts: List of texts from _extract_features
+            
+        Returns:
+            list: (category, confidence) tuples in the order of the texts
+            int: Version of the model used, or None if keyword matching was used
+        """
+        # Nothing to categorize, so there is no reason to load the model
+        if not texts:
+            return [], None
+
+        # Read the active model once, a model swapped in meanwhile is used by the next batch
+        self._ensure_model()
+        model, version = self.active
+
         # If ML is available and we have a trained model, use it
-        if self.ml_available and self.model:
+        if self.ml_available and model:
             try:
-                # Get prediction and probabilities
-                category = self.model.predict([text])[0]
-                probabilities = self.model.predict_proba([text])[0]
+                probabilities = model.predict_proba(texts)
+                best = probabilities.argmax(axis=1).tolist()
+                classes = [str(cat) for cat in model.classes_]
                 
                 # Map probabilities to categories
-                confidence = {}
-                for i, prob in enumerate(probabilities):
-                    cat = self.model.classes_[i]
-                    confidence[cat] = float(prob)
-                
-                return category, confidence
+                return [(classes[index], dict(zip(classes, row)))
+                        for index, row in zip(best, probabilities.tolist())], version
             except Exception as e:
                 categorizer_logger.error(f"Error predicting category: {str(e)}")
         
         # Fallback to keyword matching
-        return self._keyword_categorize(text)
+        return [self._keyword_categorize(text) for text in texts], None
     
     def _extract_features(self, email_data):
         """
@@ -266,15 +451,8 @@ class EmailCategorizer:
             str: Best matching category
             dict: Scores for each category
         """
-        text = text.lower()
-        scores = defaultdict(int)
-        
-        # Score each category based on keyword matches
-        for category, keywords in self.category_keywords.items():
-            for keyword in keywords:
-                # Count occurrences of the keyword
-                count = len(re.findall(r'\b' + re.escape(keyword) + r'\b', text))
-                scores[category] += count
+        # Score each category based on keyword matches, all keywords in one pass
+        scores = self.keyword_matcher.scores(text)
         
         # If no matches, default to 'Promotions'
         if not scores or max(scores.values()) == 0:
@@ -291,7 +469,7 @@ class EmailCategorizer:
     
     def bulk_categorize(self, emails):
         """
-        Categorize a list of emails
+        Categorize a list of emails in one batch
         
         Args:
             emails: List of email data dictionaries
@@ -299,14 +477,25 @@ class EmailCategorizer:
         Returns:
             list: List of (email, category, confidence) tuples
         """
-        results = []
-        
-        for email in emails:
-            category, confidence = self.categorize(email)
-            results.append((email, category, confidence))
-        
+        results, _ = self.categorize_batch(emails)
         return results
     
+    def categorize_batch(self, emails):
+        """
+        Categorize a list of emails in one batch, reporting the model version used
+        
+        Args:
+            emails: List of email data dictionaries
+            
+        Returns:
+            list: List of (email, category, confidence) tuples
+            int: Version of the model used, or None if keyword matching was used
+        """
+        texts = [self._extract_features(email) for email in emails]
+        results, version = self._categorize_texts(texts)
+        return [(email, category, confidence)
+                for email, (category, confidence) in zip(emails, results)], version
+    
     def train(self, emails, categories):
         """
         Train the model with new examples
@@ -327,8 +516,10 @@ class EmailCategorizer:
         y = categories
         
         try:
-            # Train the model with new data
-            self.model.fit(X, y)
+            # Add the new data to what the model already knows
+            self._ensure_model()
+            with self.update_lock:
+                self.model = self._fitted_copy(self.model, X, y)
             categorizer_logger.info(f"Trained model with {len(emails)} new examples")
             return True
         except Exception as e:
@@ -337,23 +528,103 @@ class EmailCategorizer:
     
     def update_with_feedback(self, email_data, correct_category):
         """
-        Update the model with user feedback
+        Queue user feedback for the background trainer, which adds it to the model
+        in the next micro-batch
         
         Args:
             email_data: Email data that was mis-categorized
             correct_category: The correct category as indicated by user
             
         Returns:
-            bool: True if update was successful
+            bool: True if the feedback was queued
         """
+        if correct_category not in self.categories:
+            categorizer_logger.error(f"Unknown category for feedback: {correct_category}")
+            return False
+        if not SKLEARN_AVAILABLE:
+            categorizer_logger.error("scikit-learn is not available, feedback cannot be learned")
+            return False
+        
         # Extract features
         text = self._extract_features(email_data)
         
         try:
-            # Update the model with this single example
-            self.model.fit([text], [correct_category])
-            categorizer_logger.info(f"Updated model with feedback for category {correct_category}")
-            return True
+            self.feedback_queue.put_nowait((text, correct_category))
+        except queue.Full:
+            categorizer_logger.error("Feedback queue is full, dropping feedback")
+            return False
+        
+        self._start_trainer()
+        categorizer_logger.info(f"Queued feedback for category {correct_category}")
+        return True
+    
+    def _start_trainer(self):
+        """Start the background trainer thread if it is not running yet"""
+        with self.trainer_lock:
+            if self.trainer_thread is None:
+                self.trainer_thread = threading.Thread(target=self._run_trainer, name='categorizer-trainer')
+                self.trainer_thread.daemon = True
+                self.trainer_thread.start()
+    
+    def _run_trainer(self):
+        """Main loop of the trainer thread: collect a micro-batch of feedback and apply it"""
+        while True:
+            batch = [self.feedback_queue.get()]
+            deadline = time.monotonic() + FEEDBACK_BATCH_DELAY
+            while len(batch) < FEEDBACK_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.feedback_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._apply_feedback(batch)
+            finally:
+                for _ in batch:
+                    self.feedback_queue.task_done()
+    
+    def _apply_feedback(self, batch):
+        """
+        Add a micro-batch of feedback to the model
+        
+        Args:
+            batch: List of (text, category) tuples
+        """
+        start = time.monotonic()
+        try:
+            self._ensure_model()
+            with self.update_lock:
+                self.model = self._fitted_copy(self.model, [text for text, _ in batch],
+                                               [category for _, category in batch])
+                version = self.model_version
         except Exception as e:
+            self.feedback_stats['failed'] += len(batch)
             categorizer_logger.error(f"Error updating model with feedback: {str(e)}")
-            return False
\ No newline at end of file
+            return
+        
+        elapsed = time.monotonic() - start
+        self.feedback_stats['applied'] += len(batch)
+        self.feedback_stats['batches'] += 1
+        self.feedback_stats['last_batch_size'] = len(batch)
+        self.feedback_stats['last_batch_seconds'] = round(elapsed, 3)
+        categorizer_logger.info(f"Updated model to version {version} with {len(batch)} feedback examples "
+                                f"in {elapsed * 1000:.0f}ms")
+    
+    def flush(self):
+        """Wait until all queued feedback has been added to the active model"""
+        self.feedback_queue.join()
+    
+    def get_stats(self):
+        """
+        Get model and feedback statistics
+        
+        Returns:
+            dict: Active model version, where it was loaded from and how long that took,
+                  queued feedback and trainer counters
+        """
+        return dict(self.feedback_stats, **self.load_stats,
+                    model_version=self.model_version,
+                    pending_feedback=self.feedback_queue.qsize())
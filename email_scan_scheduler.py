@@ -15,8 +15,9 @@ class EmailScanScheduler:
     Class to manage scheduled email scanning tasks.
     Allows users to set up automatic scans at regular intervals.
     """
-    def __init__(self, app):
+    def __init__(self, app, result_store=None):
         self.app = app
+        self.result_store = result_store  # Shared with request threads, see ScanResultStore
         self.scheduled_jobs = {}  # Dictionary to store jobs by user email
         self.lock = threading.Lock()
         self.scheduler_thread = None
@@ -67,7 +68,7 @@ class EmailScanScheduler:
                 with self.app.app_context():
                     from email_unsubscriber import EmailUnsubscriber
                     try:
-                        unsubscriber = EmailUnsubscriber(email, password)
+                        unsubscriber = EmailUnsubscriber(email, password, result_store=self.result_store)
                         
                         # Set custom IMAP if needed
                         if provider == "custom":
@@ -1,28 +1,74 @@
 import imaplib
+import smtplib
 import email
 import re
 import time
 import logging
-from typing import List, Dict, Optional, Tuple
-from urllib.parse import urlparse
+from typing import List, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlparse, urljoin
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
+from unsubscribe_executor import UnsubscribeExecutor, link_host
+from http_session_pool import get_shared_pool, CircuitOpenError
+from mailto_sender import MailtoSender
+from keyword_matcher import KeywordMatcher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('EmailUnsubscriber')
 
+# Number of fetched emails between cache and checkpoint updates
+CHECKPOINT_INTERVAL = 10
+
+# Number of emails between progress events from iter_unsubscribe_links
+PROGRESS_INTERVAL = 10
+
+# Number of UIDs looked up in the result store at a time
+LOOKUP_BATCH_SIZE = 200
+
+# Body of an RFC 8058 one-click unsubscribe request
+ONE_CLICK_BODY = 'List-Unsubscribe=One-Click'
+
+# Limits for following an unsubscribe link: redirect hops, and body bytes read per page
+MAX_REDIRECTS = 5
+RESPONSE_PREFIX_BYTES = 16 * 1024
+
+# Categories recognised from sender and subject words, the first listed category found wins
+CATEGORY_KEYWORDS = {
+    'Shopping': ['shop', 'store', 'discount', 'sale', 'order', 'purchase', 'buy'],
+    'Social': ['friend', 'connect', 'network', 'social', 'follow', 'like', 'share'],
+    'Finance': ['bank', 'finance', 'credit', 'payment', 'account', 'statement', 'invest'],
+    'Travel': ['travel', 'flight', 'trip', 'vacation', 'hotel', 'booking'],
+    'Forums': ['forum', 'community', 'discussion', 'member', 'group'],
+    'Updates': ['update', 'alert', 'notification', 'confirm', 'verify', 'security']
+}
+# Keywords match anywhere in a word, so 'shop' also finds shopify.com
+CATEGORY_MATCHER = KeywordMatcher(CATEGORY_KEYWORDS, whole_words=False)
+
+# mailto: links send an email from the user's account with the recipient, subject and body the
+# sender chose; only links the caller vouches for (List-Unsubscribe header, or confirmed by the
+# user) are sent, never links scraped from a message body on their own
+MAILTO_NOT_ALLOWED = 'Unsubscribe emails are only sent for List-Unsubscribe links or after confirmation'
+
 class EmailUnsubscriber:
-    def __init__(self, email_address: str, app_password: str, cache_file: str = None):
+    def __init__(self, email_address: str, app_password: str, cache_file: str = None, result_store=None,
+                 unsubscribe_executor=None, http_pool=None):
         self.email_address = email_address
         self.app_password = app_password
         self.email_provider = None
         self.custom_imap_server = None
         self.custom_imap_port = None
+        self.custom_smtp_server = None
+        self.custom_smtp_port = None
         self.cache_file = cache_file
         self.processed_emails = self._load_cache() if cache_file else set()
+        self.result_store = result_store
+        self.unsubscribe_executor = unsubscribe_executor  # Shared UnsubscribeExecutor for bulk runs
+        self.http_pool = http_pool or get_shared_pool()  # Keep-alive connections shared by all requests
+        self.continuation_token = None  # Set when a scan stops early on its time budget
+        self.scan_complete = False
 
     def create_cache_key(self, email_address, num_emails):
         """Create a unique cache key for this email and scan parameters"""
@@ -125,92 +171,320 @@ class EmailUnsubscriber:
         except Exception as e:
             raise ConnectionError(f"Unexpected error connecting to email server: {str(e)}")
 
-    def find_unsubscribe_links(self, num_emails: int = 50, folder: str = "INBOX") -> List[Dict]:
+    def connect_to_smtp(self) -> smtplib.SMTP:
+        """
+        Establishes connection to email provider's SMTP server, used to send
+        unsubscribe requests for mailto: links
+        
+        Returns:
+        SMTP: Connected and authenticated SMTP object
+        
+        Raises:
+        ConnectionError: If connection or authentication fails
+        ValueError: If email provider is not supported
+        """
+        domain = self.email_address.split('@')[-1].lower()
+        
+        # Port 465 uses implicit TLS, other ports are upgraded with STARTTLS
+        if domain == 'gmail.com':
+            server, port = "smtp.gmail.com", 465
+        elif domain in ['outlook.com', 'hotmail.com', 'live.com', 'msn.com']:
+            server, port = "smtp.office365.com", 587
+        elif domain == 'yahoo.com':
+            server, port = "smtp.mail.yahoo.com", 465
+        elif domain in ['aol.com', 'aim.com']:
+            server, port = "smtp.aol.com", 465
+        elif domain in ['icloud.com', 'me.com', 'mac.com']:
+            server, port = "smtp.mail.me.com", 587
+        elif domain == 'protonmail.com':
+            server, port = "smtp.protonmail.ch", 587
+        elif domain == 'zoho.com':
+            server, port = "smtp.zoho.com", 465
+        elif self.custom_smtp_server and self.custom_smtp_port:
+            server, port = self.custom_smtp_server, self.custom_smtp_port
+        else:
+            raise ValueError(
+                f"Unsupported email provider: {domain}. "
+                "Please configure custom SMTP settings to unsubscribe via email."
+            )
+        
+        try:
+            smtp = self.open_smtp(server, port)
+            if smtp.has_extn('auth'):
+                smtp.login(self.email_address, self.app_password)
+            return smtp
+        except smtplib.SMTPAuthenticationError:
+            raise ConnectionError("SMTP login failed. Check that your app password allows sending mail.")
+        except (smtplib.SMTPException, OSError) as e:
+            raise ConnectionError(f"Failed to connect to SMTP server: {str(e)}")
+    
+    def open_smtp(self, server: str, port: int) -> smtplib.SMTP:
+        """
+        Open an encrypted SMTP connection
+        Credentials are never sent in the clear: a server that offers AUTH without TLS is refused,
+        a server offering neither (such as a local relay) is used unauthenticated
+        """
+        if port == 465:
+            return smtplib.SMTP_SSL(server, port, timeout=30)
+        
+        smtp = smtplib.SMTP(server, port, timeout=30)
+        try:
+            smtp.ehlo()
+            if smtp.has_extn('starttls'):
+                smtp.starttls()
+                smtp.ehlo()
+            elif smtp.has_extn('auth'):
+                raise ConnectionError(f"SMTP server {server} offers no TLS, refusing to send credentials")
+            return smtp
+        except Exception:
+            smtp.close()
+            raise
+
+    def find_unsubscribe_links(self, num_emails: int = 50, folder: str = "INBOX",
+                               time_budget: float = None, resume_token: str = None) -> List[Dict]:
         """Find unsubscribe links in emails
 
         Args:
             num_emails: Number of recent emails to process
             folder: Email folder to search in
+            time_budget: Maximum number of seconds to spend fetching emails. When the
+                budget runs out the partial results are returned and
+                self.continuation_token can be passed back as resume_token.
+            resume_token: Continuation token of an interrupted scan to resume
 
         Returns:
             List of dictionaries containing unsubscribe information
         """
+        return [event['data'] for event in self.iter_unsubscribe_links(num_emails, folder, time_budget, resume_token)
+                if event['type'] == 'result']
+
+    def iter_unsubscribe_links(self, num_emails: int = 50, folder: str = "INBOX",
+                               time_budget: float = None, resume_token: str = None) -> Iterator[Dict]:
+        """Find unsubscribe links in emails, yielding results as they are found
+
+        Takes the same arguments as find_unsubscribe_links. Each yielded event is a
+        dictionary with a 'type' key:
+            result: 'data' holds one unsubscribe information dictionary
+            progress: emitted every PROGRESS_INTERVAL emails with running counts
+            done: emitted last, with 'complete' and 'continuation_token'
+
+        Yields:
+            Dictionaries describing scan events
+        """
+        deadline = time.monotonic() + time_budget if time_budget else None
+        self.continuation_token = None
+        self.scan_complete = False
+
+        checkpoint = None
+        if resume_token:
+            if not self.result_store:
+                raise ValueError("Resuming a scan requires a result store")
+            checkpoint = self.result_store.get_checkpoint(resume_token)
+            if not checkpoint or checkpoint['account'] != self.email_address.lower():
+                raise ValueError(f"Unknown scan checkpoint: {resume_token}")
+            folder = checkpoint['folder']
+
         # Establish connection to email provider
         mail = self.connect_to_email()
         mail.select(folder)
+        _, uidvalidity = mail.response('UIDVALIDITY')
+        uidvalidity = uidvalidity[0].decode('utf-8') if uidvalidity and uidvalidity[0] else None
 
-        # Get total number of emails in folder
-        status, data = mail.search(None, 'ALL')
-        all_emails = data[0].split()
-        total_emails = len(all_emails)
-        
-        # Process only the newest num_emails
-        emails_to_process = min(num_emails, total_emails)
-        message_numbers = all_emails[-emails_to_process:]
+        if checkpoint and checkpoint['uidvalidity'] != uidvalidity:
+            # The server reassigned the folder's UIDs, the checkpoint's UIDs name other emails now
+            logger.info(f"UIDVALIDITY of {folder} changed since checkpoint {resume_token}, starting a new scan")
+            checkpoint = None
+
+        if checkpoint:
+            # Resume with the same set of emails the interrupted scan was working on
+            message_uids = checkpoint['uids']
+        else:
+            # Get UIDs of all emails in folder (UIDs stay stable between sessions)
+            status, data = mail.uid('search', None, 'ALL')
+            all_emails = data[0].split()
+            total_emails = len(all_emails)
+
+            # Process only the newest num_emails
+            emails_to_process = min(num_emails, total_emails)
+            message_uids = [uid.decode('utf-8') for uid in all_emails[-emails_to_process:]] if emails_to_process else []
+
+        scan_id = None
+        if self.result_store:
+            if uidvalidity:
+                self.result_store.check_uidvalidity(self.email_address, folder, uidvalidity)
+            if checkpoint:
+                scan_id = checkpoint['scan_id']
+            else:
+                scan_id = self.result_store.create_checkpoint(self.email_address, folder, message_uids, uidvalidity)
+
+        # Emails up to the checkpoint cursor were handled by the interrupted scan
+        resume_index = 0
+        if checkpoint and checkpoint['last_uid'] in message_uids:
+            resume_index = message_uids.index(checkpoint['last_uid']) + 1
         
-        # Initialize the unsubscribe_data list
-        unsubscribe_data = []
+        pending_results = []
         processed_count = 0
         skipped_count = 0
+        found_count = 0
+        # The cursor only moves past emails that were handled, so a resumed scan retries failed fetches
+        last_uid = checkpoint['last_uid'] if checkpoint else None
+        fetch_failed = False
+        out_of_time = False
+        complete = False
 
-        # Process the message numbers
-        for num in message_numbers:
+        try:
+            # Look up previously processed emails one batch at a time to keep memory bounded
+            for batch_start in range(0, len(message_uids), LOOKUP_BATCH_SIZE):
+                batch_uids = message_uids[batch_start:batch_start + LOOKUP_BATCH_SIZE]
+                cached_results = {}
+                if self.result_store:
+                    cached_results = self.result_store.get_results(self.email_address, folder, batch_uids)
+
+                for index, email_id in enumerate(batch_uids, batch_start):
+                    # Stop fetching once the time budget is used up
+                    if (deadline and email_id not in cached_results and index >= resume_index
+                            and time.monotonic() >= deadline):
+                        out_of_time = True
+                        break
+
+                    result = None
+                    try:
+                        if email_id in cached_results:
+                            # Serve previously processed emails from the result store
+                            result = cached_results[email_id]
+                            skipped_count += 1
+                        elif index < resume_index or (not self.result_store and email_id in self.processed_emails):
+                            # Without a result store we can only skip already processed emails
+                            skipped_count += 1
+                        else:
+                            # Fetch the email by UID
+                            _, msg_data = mail.uid('fetch', email_id, '(RFC822)')
+                            message = email.message_from_bytes(msg_data[0][1])
+
+                            result = self._extract_unsubscribe_info(message, email_id)
+                            pending_results.append((email_id, result))
+
+                            # Mark as processed
+                            self.processed_emails.add(email_id)
+                            processed_count += 1
+
+                            # Update cache and checkpoint periodically
+                            if processed_count % CHECKPOINT_INTERVAL == 0:
+                                self._save_cache()
+                                self._save_results(folder, pending_results)
+                                self._save_checkpoint(scan_id, email_id if not fetch_failed else last_uid)
+                                pending_results = []
+                    except Exception as e:
+                        logger.error(f"Error processing email {email_id}: {str(e)}")
+                        fetch_failed = True
+                    if not fetch_failed:
+                        last_uid = email_id
+
+                    if result:
+                        found_count += 1
+                        yield {'type': 'result', 'data': result}
+
+                    if (index + 1) % PROGRESS_INTERVAL == 0:
+                        yield {
+                            'type': 'progress',
+                            'processed': index + 1,
+                            'total': len(message_uids),
+                            'fetched': processed_count,
+                            'cached': skipped_count,
+                            'found': found_count
+                        }
+
+                if out_of_time:
+                    break
+            complete = not out_of_time
+        finally:
+            # Persist progress even if the consumer stops iterating early
+            self._save_cache()
+            self._save_results(folder, pending_results)
+            self._save_checkpoint(scan_id, last_uid, status='complete' if complete else 'running')
             try:
-                # Skip if already processed
-                email_id = num.decode('utf-8')
-                if email_id in self.processed_emails:
-                    skipped_count += 1
-                    continue
-                    
-                # Fetch the email by ID
-                _, msg_data = mail.fetch(num, '(RFC822)')
-                message = email.message_from_bytes(msg_data[0][1])
-
-                # Get sender info
-                from_header = message['From']
-                sender_name = self._extract_sender_name(from_header)
-                received_date = self._extract_date(message)
-
-                # Check for header unsubscribe first
-                header_unsubscribe = message.get('List-Unsubscribe')
-                if header_unsubscribe:
-                    unsubscribe_link = self._extract_url_from_header(header_unsubscribe)
-                    method = 'header'
-                else:
-                    # Fall back to body unsubscribe
-                    unsubscribe_link = self._find_body_unsubscribe(message)
-                    method = 'body'
-
-                if unsubscribe_link:
-                    unsubscribe_data.append({
-                        'sender': sender_name or from_header,
-                        'email': from_header if '@' in from_header else None,
-                        'unsubscribe_link': unsubscribe_link,
-                        'method': method,
-                        'provider': self.email_provider,
-                        'category': self._determine_category(message),
-                        'last_received': received_date,
-                        'email_id': email_id
-                    })
-                
-                # Mark as processed
-                self.processed_emails.add(email_id)
-                processed_count += 1
-                
-                # Update cache periodically
-                if processed_count % 10 == 0:
-                    self._save_cache()
-            except Exception as e:
-                logger.error(f"Error processing email {num}: {str(e)}")
-                continue
-
-        # Final cache update
-        self._save_cache()
-        
-        logger.info(f"Processed {processed_count} emails, skipped {skipped_count} previously processed emails")
-        logger.info(f"Found {len(unsubscribe_data)} unsubscribe links")
+                mail.logout()
+            except Exception:
+                pass
+
+        if out_of_time:
+            self.continuation_token = scan_id
+            logger.info(f"Time budget exhausted after {processed_count} emails, "
+                        f"{len(message_uids) - index} emails left (continuation token {scan_id})")
+        self.scan_complete = complete
         
-        return unsubscribe_data
+        logger.info(f"Processed {processed_count} emails, served {skipped_count} previously processed emails from cache")
+        logger.info(f"Found {found_count} unsubscribe links")
+
+        yield {
+            'type': 'done',
+            'complete': complete,
+            'continuation_token': self.continuation_token,
+            'processed': processed_count + skipped_count,
+            'total': len(message_uids),
+            'found': found_count
+        }
+
+    def _extract_unsubscribe_info(self, message, email_id: str) -> Optional[Dict]:
+        """Extract unsubscribe information from a single email
+
+        Args:
+            message: Parsed email message
+            email_id: IMAP UID of the message
+
+        Returns:
+            Dictionary with unsubscribe information, or None if no link was found
+        """
+        # Get sender info
+        from_header = message['From'] or ''
+        sender_name = self._extract_sender_name(from_header)
+        received_date = self._extract_date(message)
+
+        # Check for header unsubscribe first
+        header_unsubscribe = message.get('List-Unsubscribe')
+        one_click = False
+        if header_unsubscribe:
+            unsubscribe_link = self._extract_url_from_header(header_unsubscribe)
+            method = 'header'
+            # RFC 8058: the sender accepts a single POST to an HTTPS List-Unsubscribe URL
+            one_click = bool(unsubscribe_link and unsubscribe_link.startswith('https://')
+                             and ONE_CLICK_BODY.lower() in str(message.get('List-Unsubscribe-Post') or '').lower())
+        else:
+            # Fall back to body unsubscribe
+            unsubscribe_link = self._find_body_unsubscribe(message)
+            method = 'body'
+
+        if not unsubscribe_link:
+            return None
+
+        # RFC 2919 List-Id, e.g. "Weekly Deals <deals.example.com>", identifies the list across emails
+        list_id = None
+        list_id_match = re.search(r'<([^<>\s]+)>', str(message.get('List-Id') or ''))
+        if list_id_match:
+            list_id = list_id_match.group(1).lower()
+
+        return {
+            'sender': sender_name or from_header,
+            'email': from_header if '@' in from_header else None,
+            'unsubscribe_link': unsubscribe_link,
+            'method': method,
+            'provider': self.email_provider,
+            'category': self._determine_category(message),
+            'last_received': received_date,
+            'one_click': one_click,
+            'list_id': list_id,
+            'email_id': email_id
+        }
+
+    def _save_results(self, folder: str, results: List[Tuple[str, Optional[Dict]]]):
+        """Persist processed message results to the result store"""
+        if self.result_store and results:
+            self.result_store.save_results(self.email_address, folder, results)
+
+    def _save_checkpoint(self, scan_id: Optional[str], last_uid: Optional[str], status: str = 'running'):
+        """Persist the scan cursor so an interrupted scan can be resumed"""
+        if self.result_store and scan_id:
+            self.result_store.update_checkpoint(scan_id, last_uid, status)
 
     def _extract_date(self, message) -> str:
         """Extract and format the date from email"""
@@ -262,38 +536,9 @@ class EmailUnsubscriber:
                     return category_match.group(1)
         
         # Try to determine category from common senders or keywords
-        from_header = message.get('From', '').lower()
-        subject = message.get('Subject', '').lower()
-        
-        # Check for shopping/retail
-        retail_keywords = ['shop', 'store', 'discount', 'sale', 'order', 'purchase', 'buy']
-        if any(keyword in from_header or keyword in subject for keyword in retail_keywords):
-            return 'Shopping'
-            
-        # Check for social
-        social_keywords = ['friend', 'connect', 'network', 'social', 'follow', 'like', 'share']
-        if any(keyword in from_header or keyword in subject for keyword in social_keywords):
-            return 'Social'
-            
-        # Check for finance
-        finance_keywords = ['bank', 'finance', 'credit', 'payment', 'account', 'statement', 'invest']
-        if any(keyword in from_header or keyword in subject for keyword in finance_keywords):
-            return 'Finance'
-            
-        # Check for travel
-        travel_keywords = ['travel', 'flight', 'trip', 'vacation', 'hotel', 'booking']
-        if any(keyword in from_header or keyword in subject for keyword in travel_keywords):
-            return 'Travel'
-            
-        # Check for forums/communities
-        forum_keywords = ['forum', 'community', 'discussion', 'member', 'group']
-        if any(keyword in from_header or keyword in subject for keyword in forum_keywords):
-            return 'Forums'
-            
-        # Check for updates/notifications
-        update_keywords = ['update', 'alert', 'notification', 'confirm', 'verify', 'security']
-        if any(keyword in from_header or keyword in subject for keyword in update_keywords):
-            return 'Updates'
+        category = CATEGORY_MATCHER.first_match(message.get('From', ''), message.get('Subject', ''))
+        if category:
+            return category
         
         # Default to Promotions if we can't determine
         return 'Promotions'
@@ -394,6 +639,11 @@ class EmailUnsubscriber:
         self.custom_imap_server = server
         self.custom_imap_port = port
 
+    def set_custom_smtp(self, server: str, port: int):
+        """Set custom SMTP server for unsupported providers"""
+        self.custom_smtp_server = server
+        self.custom_smtp_port = port
+
     def _find_body_unsubscribe(self, message) -> str:
         """Find unsubscribe link in email body"""
         if message.is_multipart():
@@ -465,58 +715,215 @@ class EmailUnsubscriber:
             
         return None
 
-    def unsubscribe(self, link: str) -> bool:
+    def unsubscribe(self, link: str, one_click: bool = False, send_mailto: bool = False) -> bool:
         """
         Attempt to unsubscribe using the provided link
+        If the sender supports RFC 8058 one-click unsubscribe, a single POST is tried first
+        mailto: links are only sent with send_mailto, see unsubscribe_detailed
         Returns True if successful, False otherwise
         """
+        return self.unsubscribe_detailed(link, one_click, send_mailto)['success']
+    
+    def unsubscribe_detailed(self, link: str, one_click: bool = False, send_mailto: bool = False) -> Dict:
+        """
+        Attempt to unsubscribe using the provided link
+        Responses are streamed: only the status line and a capped prefix of each page are read
+        A mailto: link is only sent with send_mailto, when it came from a List-Unsubscribe header
+        or the user confirmed it, since it sends an email the sender wrote from the user's account
+        Returns a dictionary with success, error, status_code, redirects and bytes_received
+        """
+        outcome = {'success': False, 'error': None, 'status_code': None, 'redirects': 0, 'bytes_received': 0}
         if not link:
-            return False
+            outcome['error'] = 'No unsubscribe link'
+            return outcome
             
         if link.startswith('mailto:'):
-            logger.info(f"Manual unsubscribe required via email: {link}")
-            return False
+            if not send_mailto:
+                outcome.update(error=MAILTO_NOT_ALLOWED, method='mailto')
+                return outcome
+            result = self.send_mailto_unsubscribes([link])[0]
+            outcome.update(success=result['success'], error=result['error'], method='mailto',
+                           recipients=result['recipients'])
+            return outcome
             
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
             # First check if the URL is valid
             parsed_url = urlparse(link)
             if not all([parsed_url.scheme, parsed_url.netloc]):
                 logger.error(f"Invalid URL: {link}")
-                return False
-                
-            # Add rate limiting to avoid overwhelming servers
-            time.sleep(1)
+                outcome['error'] = 'Invalid URL'
+                return outcome
             
-            # Make the request
-            response = requests.get(link, headers=headers, timeout=10, allow_redirects=True)
+            if one_click and parsed_url.scheme == 'https' and self._one_click_unsubscribe(link):
+                outcome.update(success=True, method='one_click')
+                return outcome
+            
+            # Follow redirects ourselves so the number of hops and bytes read stay bounded
+            url = link
+            while True:
+                response = self.http_pool.get(url, allow_redirects=False, stream=True)
+                outcome['status_code'] = response.status_code
+                outcome['bytes_received'] += self._read_response_prefix(response)
+                
+                location = response.headers.get('Location')
+                if not response.is_redirect or not location:
+                    break
+                if outcome['redirects'] >= MAX_REDIRECTS:
+                    logger.error(f"Too many redirects when accessing {link}")
+                    outcome['error'] = 'Too many redirects'
+                    return outcome
+                url = urljoin(url, location)
+                if urlparse(url).scheme not in ('http', 'https'):
+                    # e.g. a redirect into an app or mailto: link, the request itself was accepted
+                    break
+                outcome['redirects'] += 1
             
             # Log more details about the response
-            logger.info(f"Unsubscribe request to {link}: Status {response.status_code}")
+            logger.info(f"Unsubscribe request to {link}: Status {response.status_code} "
+                        f"after {outcome['redirects']} redirects, {outcome['bytes_received']} bytes read")
             
-            return response.status_code < 400  # Anything below 400 is considered successful
+            outcome['success'] = response.status_code < 400  # Anything below 400 is considered successful
+            if not outcome['success']:
+                outcome['error'] = f"HTTP {response.status_code}"
+            return outcome
+        except CircuitOpenError:
+            logger.info(f"Skipping {link}, host temporarily unavailable")
+            outcome.update(error='Host temporarily unavailable', circuit_open=True)
+            return outcome
         except requests.exceptions.Timeout:
             logger.error(f"Timeout when accessing {link}")
-            return False
+            outcome['error'] = 'Timeout'
+            return outcome
         except requests.exceptions.ConnectionError:
             logger.error(f"Connection error when accessing {link}")
-            return False
+            outcome['error'] = 'Connection error'
+            return outcome
         except Exception as e:
             logger.error(f"Failed to unsubscribe: {str(e)}")
+            outcome['error'] = str(e)
+            return outcome
+    
+    def _read_response_prefix(self, response) -> int:
+        """
+        Read at most RESPONSE_PREFIX_BYTES of a streamed response body and release it
+        Small pages are read completely so their connection goes back to the pool
+        Returns the number of body bytes transferred
+        """
+        received = 0
+        drained = False
+        try:
+            while received < RESPONSE_PREFIX_BYTES:
+                chunk = response.raw.read(min(8192, RESPONSE_PREFIX_BYTES - received), decode_content=False)
+                if not chunk:
+                    drained = True
+                    break
+                received += len(chunk)
+            return received
+        finally:
+            if drained:
+                response.raw.release_conn()
+            else:
+                # Large page or failed read: drop the connection rather than download the rest
+                response.close()
+    
+    def _one_click_unsubscribe(self, link: str) -> bool:
+        """
+        Send an RFC 8058 one-click unsubscribe POST
+        Redirects are not followed and the response body is not downloaded
+        Returns True if the sender accepted the request
+        """
+        try:
+            response = self.http_pool.post(
+                link,
+                data=ONE_CLICK_BODY,
+                headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                allow_redirects=False,
+                stream=True
+            )
+            self._read_response_prefix(response)
+            logger.info(f"One-click unsubscribe POST to {link}: Status {response.status_code}")
+            return response.status_code < 400
+        except Exception as e:
+            logger.warning(f"One-click unsubscribe failed for {link}, falling back to GET: {str(e)}")
             return False
             
     def bulk_unsubscribe(self, links: List[str]) -> Dict[str, bool]:
         """
         Attempt to unsubscribe from multiple links
+        Links to different hosts are processed concurrently, rate limited per host
         Returns a dictionary with results for each link
         """
-        results = {}
-        for link in links:
-            success = self.unsubscribe(link)
-            results[link] = success
-            # Add delay between requests
-            time.sleep(2)
-        return results
\ No newline at end of file
+        results = self.bulk_unsubscribe_detailed(links)
+        return {result['link']: result['success'] for result in results}
+    
+    def bulk_unsubscribe_detailed(self, links: List[str], one_click_links=None, on_result=None,
+                                  cancel_event=None, mailto_links=None) -> List[Dict]:
+        """
+        Attempt to unsubscribe from multiple links
+        one_click_links are the links whose sender supports RFC 8058 one-click unsubscribe
+        on_result is called with the position and result of each link as it completes,
+        and links not yet started when cancel_event is set are skipped
+        mailto: links are sent as one batch over a single SMTP connection, but only those in
+        mailto_links (from List-Unsubscribe headers or confirmed by the user); the others fail
+        Returns a list of result dictionaries with success, error and timing for each link
+        """
+        if self.unsubscribe_executor:
+            return self._run_bulk_unsubscribe(self.unsubscribe_executor, links, one_click_links, on_result,
+                                              cancel_event, mailto_links)
+        
+        # No shared executor, use a pool for this run only
+        executor = UnsubscribeExecutor(circuit_breaker=self.http_pool.circuit_breaker)
+        try:
+            return self._run_bulk_unsubscribe(executor, links, one_click_links, on_result, cancel_event,
+                                              mailto_links)
+        finally:
+            executor.shutdown()
+    
+    def _run_bulk_unsubscribe(self, executor, links, one_click_links, on_result, cancel_event,
+                              mailto_links) -> List[Dict]:
+        """Run the HTTP links on the executor while the mailto: links are sent alongside them"""
+        one_click_links = set(one_click_links or ())
+        mailto_links = set(mailto_links or ())
+        unsubscribe_fn = lambda link: self.unsubscribe_detailed(link, one_click=link in one_click_links)
+        mailto_positions = [position for position, link in enumerate(links) if link and link.startswith('mailto:')]
+        mailto_set = set(mailto_positions)
+        http_positions = [position for position in range(len(links)) if position not in mailto_set]
+        
+        # Resolve every host of the batch up front instead of one lookup per request
+        self.http_pool.prefetch_dns(links[position] for position in http_positions)
+        if not mailto_positions:
+            return executor.run(links, unsubscribe_fn, on_result, cancel_event)
+        
+        results = [None] * len(links)
+        
+        def report(positions):
+            """Map result positions within a part of the batch back to positions in links"""
+            def callback(index, result):
+                results[positions[index]] = result
+                if on_result:
+                    on_result(positions[index], result)
+            return callback
+        
+        # Links nobody vouched for fail without a message being sent
+        unsent_positions = [position for position in mailto_positions if links[position] not in mailto_links]
+        unsent_report = report(unsent_positions)
+        for index, position in enumerate(unsent_positions):
+            unsent_report(index, {'link': links[position], 'host': link_host(links[position]), 'method': 'mailto',
+                                  'success': False, 'error': MAILTO_NOT_ALLOWED, 'recipients': {},
+                                  'wait_time': 0.0, 'duration': 0.0})
+        mailto_positions = [position for position in mailto_positions if links[position] in mailto_links]
+        
+        mailto_future = executor.submit(self.send_mailto_unsubscribes, [links[p] for p in mailto_positions],
+                                        report(mailto_positions), cancel_event)
+        if http_positions:
+            executor.run([links[p] for p in http_positions], unsubscribe_fn, report(http_positions), cancel_event)
+        mailto_future.result()
+        return results
+    
+    def send_mailto_unsubscribes(self, links: List[str], on_result=None, cancel_event=None) -> List[Dict]:
+        """
+        Send the unsubscribe emails for a list of mailto: links over one SMTP connection
+        honouring the subject and body given in each link
+        Returns a list of result dictionaries with success, error and per-recipient errors for each link
+        """
+        return MailtoSender(self.email_address, self.connect_to_smtp).send_all(links, on_result, cancel_event)
@@ -0,0 +1,317 @@
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, EmptyPoolError, NameResolutionError, NewConnectionError
+from circuit_breaker import HostCircuitBreaker
+from dns_cache import DnsCache
+
+# Setup logging
+http_logger = logging.getLogger('HttpSessionPool')
+
+# Only requests that are safe to repeat are retried
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+RETRY_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit breaker is open"""
+
+
+class PoolTimeoutError(requests.exceptions.ConnectionError):
+    """Raised when no pooled connection to a host became free within the pool timeout"""
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class CachedDnsConnectionMixin:
+    """
+    urllib3 connection that opens its socket to addresses from a DnsCache instead of
+    resolving the host again for every new connection. TLS still verifies the host name.
+    Apart from the lookup, _new_conn behaves like urllib3's own.
+    """
+    dns_cache = None
+
+    def _new_conn(self):
+        try:
+            sock = self._connect_cached()
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        except socket.timeout as e:
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+            ) from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+        sys.audit("http.client.connect", self, self.host, self.port)
+        return sock
+
+    def _connect_cached(self):
+        """Try each cached address of the host in turn, like socket.create_connection"""
+        # _dns_host keeps the trailing dot of a fully qualified name, which host drops
+        host = self._dns_host.strip('[]')
+        error = None
+        for family, socktype, proto, _, sockaddr in self.dns_cache.resolve(host):
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                for option in self.socket_options or ():
+                    sock.setsockopt(*option)
+                if self.timeout is None or isinstance(self.timeout, (int, float)):
+                    # Otherwise urllib3 left it at its default, the socket module's default timeout
+                    sock.settimeout(self.timeout)
+                if self.source_address:
+                    sock.bind(self.source_address)
+                sock.connect((sockaddr[0], self.port) + tuple(sockaddr[2:]))
+                return sock
+            except OSError as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        # None of the addresses accepted a connection, the host may have moved
+        self.dns_cache.invalidate(host)
+        raise error
+
+
+class PoolTimeoutMixin:
+    """
+    urllib3 connection pool that waits at most `pool_timeout` seconds for a free connection
+    when it blocks at its size limit; requests never passes a pool timeout of its own
+    """
+    pool_timeout = None
+
+    def urlopen(self, *args, **kwargs):
+        kwargs.setdefault('pool_timeout', self.pool_timeout)
+        return super().urlopen(*args, **kwargs)
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools resolve hosts through a shared DnsCache"""
+    def __init__(self, dns_cache, pool_timeout=None, **kwargs):
+        self.dns_cache = dns_cache
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {'dns_cache': self.dns_cache}
+        http_connection = type('CachedDnsHTTPConnection', (CachedDnsConnectionMixin, HTTPConnection), attributes)
+        https_connection = type('CachedDnsHTTPSConnection', (CachedDnsConnectionMixin, HTTPSConnection), attributes)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('CachedDnsHTTPConnectionPool', (PoolTimeoutMixin, HTTPConnectionPool),
+                         {'ConnectionCls': http_connection, 'pool_timeout': self.pool_timeout}),
+            'https': type('CachedDnsHTTPSConnectionPool', (PoolTimeoutMixin, HTTPSConnectionPool),
+                          {'ConnectionCls': https_connection, 'pool_timeout': self.pool_timeout})
+        }
+
+
+class HttpSessionPool:
+    """
+    Shared keep-alive HTTP session for unsubscribe and OAuth requests.
+    Connections are pooled per host, so repeated requests to the same mailing list
+    provider reuse an open connection instead of paying for DNS, TCP and TLS each time.
+    The underlying urllib3 pools are thread-safe; cookies are never stored, so
+    responses for one user cannot leak into another user's requests.
+    Every request goes through a per-host circuit breaker: hosts that keep failing
+    are skipped immediately instead of costing a full timeout per request.
+    Host names are resolved through a DnsCache, which bulk runs fill up front with prefetch_dns().
+    """
+    def __init__(self, max_hosts=None, per_host=None, retries=None, backoff_factor=0.3, max_backoff=5,
+                 timeout=10, circuit_breaker=None, dns_cache=None, pool_timeout=None):
+        """
+        Initialize the session pool
+
+        Args:
+            max_hosts: Number of hosts to keep connection pools for
+            per_host: Maximum number of open connections per host
+            retries: Number of retries for connection errors and 502/503/504 responses on GET requests
+            backoff_factor: Base delay in seconds between retries, doubled for each retry and jittered
+            max_backoff: Maximum delay in seconds between retries
+            timeout: Default request timeout in seconds
+            circuit_breaker: HostCircuitBreaker shared by all requests
+            dns_cache: DnsCache used to resolve host names
+            pool_timeout: Seconds a request waits for one of the host's per_host connections to become free
+        """
+        self.max_hosts = max_hosts or int(os.environ.get('HTTP_POOL_HOSTS', 100))
+        self.per_host = per_host or int(os.environ.get('HTTP_POOL_PER_HOST', 4))
+        self.retries = retries if retries is not None else int(os.environ.get('HTTP_RETRIES', 2))
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout or float(os.environ.get('HTTP_POOL_TIMEOUT', 30))
+        self.circuit_breaker = circuit_breaker or HostCircuitBreaker()
+        self.dns_cache = dns_cache or DnsCache()
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.retry_count = 0
+
+        # Retries are done in request() so they can stop as soon as a host's circuit opens;
+        # pool_block makes extra threads wait for a connection instead of opening more than per_host,
+        # for at most pool_timeout so a connection that is never released cannot stall them for good
+        self.adapter = CachedDnsAdapter(self.dns_cache, pool_timeout=self.pool_timeout, pool_connections=self.max_hosts,
+                                        pool_maxsize=self.per_host, max_retries=0, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request over a pooled connection
+        Idempotent requests are retried with jittered exponential backoff on connection
+        errors, timeouts and 502/503/504 responses while the host's circuit stays closed.
+        The circuit breaker counts one failure per request that ends in a connection error,
+        timeout or 5xx response, once its retries are used up
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            **kwargs: Arguments for requests.Session.request
+
+        Returns:
+            requests.Response: Response
+
+        Raises:
+            CircuitOpenError: If the host's circuit breaker is open
+            PoolTimeoutError: If no connection to the host became free within the pool timeout
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = (urlparse(url).hostname or '').lower()
+        attempts = 1 + (self.retries if method.upper() in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            if not self.circuit_breaker.allow(host):
+                raise CircuitOpenError(f"Circuit open for {host}, not sending request")
+            with self.lock:
+                self.request_count += 1
+                self.retry_count += 1 if attempt else 0
+
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.SSLError:
+                # Certificate problems do not go away by retrying
+                self.circuit_breaker.release(host)
+                raise
+            except EmptyPoolError as e:
+                # All of this process's connections to the host are busy, not a failure of the host
+                self.circuit_breaker.release(host)
+                raise PoolTimeoutError(f"No connection to {host} became free within {self.pool_timeout}s") from e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == attempts - 1 or self.circuit_breaker.is_open(host):
+                    self.circuit_breaker.record_failure(host)
+                    raise
+                delay = self._backoff(attempt)
+                http_logger.info(f"{method} {host} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            except Exception:
+                self.circuit_breaker.release(host)
+                raise
+            else:
+                if response.status_code < 500:
+                    self.circuit_breaker.record_success(host)
+                    return response
+                # Every 5xx counts against the host, only 502/503/504 are worth retrying
+                if (response.status_code not in RETRY_STATUSES or attempt == attempts - 1
+                        or self.circuit_breaker.is_open(host)):
+                    self.circuit_breaker.record_failure(host)
+                    return response
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                response.close()
+                http_logger.info(f"{method} {host} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        """Delay before the next attempt: exponential with full jitter, or the server's Retry-After"""
+        if retry_after and retry_after.strip().isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** (attempt + 1)))
+
+    def get(self, url, **kwargs):
+        """Send a GET request over a pooled connection"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request over a pooled connection"""
+        return self.request('POST', url, **kwargs)
+
+    def prefetch_dns(self, urls, timeout=5):
+        """
+        Resolve the hosts of a batch of URLs concurrently before requesting them
+
+        Args:
+            urls: Iterable of URLs, non-HTTP links are ignored
+            timeout: Maximum number of seconds to wait for the lookups
+
+        Returns:
+            int: Number of hosts that needed a lookup
+        """
+        hosts = set()
+        for url in urls:
+            parsed = urlparse(url or '')
+            if parsed.scheme in ('http', 'https') and parsed.hostname:
+                hosts.add(parsed.hostname)
+        return self.dns_cache.prefetch(hosts, timeout)
+
+    def get_stats(self):
+        """
+        Get connection reuse statistics
+
+        Returns:
+            dict: Requests sent and retried, connections opened and reused, hosts with a pool,
+                  and circuit breaker and DNS cache statistics
+        """
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        pool_requests = 0
+        hosts = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts += 1
+            connections += pool.num_connections
+            pool_requests += pool.num_requests
+
+        with self.lock:
+            request_count = self.request_count
+            retry_count = self.retry_count
+        return {
+            'requests': request_count,
+            'retries': retry_count,
+            'connections_opened': connections,
+            'connections_reused': max(0, pool_requests - connections),
+            'hosts': hosts,
+            'per_host_limit': self.per_host,
+            'circuit_breaker': self.circuit_breaker.get_stats(),
+            'dns': self.dns_cache.get_stats()
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """Get the process-wide HttpSessionPool, creating it on first use"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HttpSessionPool()
+            http_logger.info(f"Created HTTP session pool ({_shared_pool.per_host} connections per host)")
+        return _shared_pool
@@ -0,0 +1,84 @@
+import re
+import logging
+
+# Setup logging
+matcher_logger = logging.getLogger('KeywordMatcher')
+
+
+class KeywordMatcher:
+    """
+    Scores categories by keyword occurrences in one pass over a text.
+    All keywords of all categories are compiled into a single regular expression
+    alternation, longest keywords first, and every match credits each category
+    listing the keyword, so a text is scanned once however many keywords there are.
+    Whole-word matching counts occurrences like a separate \\b-delimited search per
+    keyword. Substring matching tries the alternation at every position of the text,
+    so overlapping keywords are all found, as `keyword in text` would find them.
+    """
+    def __init__(self, category_keywords, whole_words=True):
+        """
+        Initialize the matcher
+
+        Args:
+            category_keywords: Dictionary of category -> list of keywords, in priority order
+            whole_words: Only match keywords as whole words; otherwise match them anywhere in a word
+        """
+        self.categories = list(category_keywords)
+        self.whole_words = whole_words
+        self.keyword_categories = {}  # keyword -> categories listing it, once per listing
+        for category, keywords in category_keywords.items():
+            for keyword in keywords:
+                self.keyword_categories.setdefault(keyword.lower(), []).append(category)
+
+        # Longest first, so a keyword is preferred over another keyword it starts with
+        keywords = sorted(self.keyword_categories, key=lambda keyword: (-len(keyword), keyword))
+        alternation = '|'.join(re.escape(keyword) for keyword in keywords)
+        if whole_words:
+            self.pattern = re.compile(r'\b(?:' + alternation + r')\b')
+        else:
+            # Zero-width, so a match at one position does not hide keywords starting inside it
+            self.pattern = re.compile(r'(?=(' + alternation + r'))')
+
+        # In substring mode only the longest keyword at a position is matched; the keywords it
+        # starts with are there as well
+        self.credited = {}  # matched keyword -> categories credited for one match
+        for keyword in keywords:
+            prefixes = [keyword] if whole_words else [other for other in keywords if keyword.startswith(other)]
+            self.credited[keyword] = [category for prefix in prefixes for category in self.keyword_categories[prefix]]
+        matcher_logger.debug(f"Compiled {len(keywords)} keywords of {len(self.categories)} categories")
+
+    def scores(self, text):
+        """
+        Count the keyword occurrences of each category in a text
+
+        Args:
+            text: Text to score
+
+        Returns:
+            dict: Category -> number of keyword occurrences, every category in priority order
+        """
+        scores = dict.fromkeys(self.categories, 0)
+        credited = self.credited
+        for keyword in self.pattern.findall(text.lower()):
+            for category in credited[keyword]:
+                scores[category] += 1
+        return scores
+
+    def first_match(self, *texts):
+        """
+        Find the first category, in priority order, with a keyword in any of the texts
+
+        Args:
+            *texts: Texts to search, such as the sender and the subject
+
+        Returns:
+            str: Matching category, or None if no keyword occurs
+        """
+        # Keywords never contain a newline, so no match spans two texts
+        found = set()
+        for keyword in self.pattern.findall('\n'.join(texts).lower()):
+            found.update(self.credited[keyword])
+        for category in self.categories:
+            if category in found:
+                return category
+        return None
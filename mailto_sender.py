@@ -0,0 +1,202 @@
+import time
+import logging
+import smtplib
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from urllib.parse import unquote
+from unsubscribe_executor import link_host
+
+# Setup logging
+mailto_logger = logging.getLogger('MailtoSender')
+
+# Used when a mailto: link does not specify a subject or body
+DEFAULT_SUBJECT = 'unsubscribe'
+DEFAULT_BODY = 'unsubscribe'
+
+
+class SmtpConnectError(ConnectionError):
+    """Connecting or authenticating to the SMTP server failed"""
+
+
+def parse_mailto(link):
+    """
+    Parse a mailto: unsubscribe link (RFC 6068)
+
+    Args:
+        link: mailto: link, e.g. mailto:leave@example.com?subject=unsubscribe%20123
+
+    Returns:
+        dict: 'to' (list of addresses), 'subject' and 'body'
+
+    Raises:
+        ValueError: If the link is not a mailto: link or has no valid recipient
+    """
+    if not link or not link.lower().startswith('mailto:'):
+        raise ValueError(f"Not a mailto: link: {link}")
+
+    address_part, _, query = link[len('mailto:'):].partition('?')
+    recipients = [unquote(address) for address in address_part.split(',')]
+    subject = None
+    body = None
+    for pair in query.split('&') if query else ():
+        name, _, value = pair.partition('=')
+        name = unquote(name).lower()
+        value = unquote(value)
+        if name == 'to':
+            recipients.extend(value.split(','))
+        elif name == 'subject':
+            subject = value
+        elif name == 'body':
+            body = value
+        # cc, bcc and other headers are ignored, the request only goes to the list address
+
+    recipients = [address.strip() for address in recipients if address.strip()]
+    for address in recipients:
+        if '@' not in address or any(char in address for char in '\r\n<>'):
+            raise ValueError(f"Invalid mailto: address: {address}")
+    if not recipients:
+        raise ValueError(f"No recipient in mailto: link: {link}")
+
+    return {
+        'to': recipients,
+        # Header values must stay on one line
+        'subject': ' '.join((subject or DEFAULT_SUBJECT).split()) or DEFAULT_SUBJECT,
+        'body': body.replace('\r\n', '\n') if body else DEFAULT_BODY
+    }
+
+
+class MailtoSender:
+    """
+    Sends mailto: unsubscribe requests for one account over a single SMTP connection.
+    The connection is opened once for the whole batch and reopened only if the server
+    drops it, so a bulk run pays for the TLS handshake and authentication once.
+    """
+    def __init__(self, from_address, connect_fn):
+        """
+        Initialize the sender
+
+        Args:
+            from_address: Email address the requests are sent from
+            connect_fn: Function returning a connected and authenticated smtplib.SMTP
+        """
+        self.from_address = from_address
+        self.connect_fn = connect_fn
+
+    def send_all(self, links, on_result=None, cancel_event=None):
+        """
+        Send an unsubscribe email for each mailto: link
+
+        Args:
+            links: List of mailto: links
+            on_result: Optional function called with the position and result of each link as it completes
+            cancel_event: Optional threading.Event; links not sent when it is set are skipped
+
+        Returns:
+            list: Result dictionaries in the order of the links, with 'link', 'host', 'success',
+                  'error', 'recipients' (address -> error or None), 'wait_time' and 'duration';
+                  skipped links have 'cancelled' set
+        """
+        results = []
+        conn = None
+        connect_error = None
+        try:
+            for position, link in enumerate(links):
+                start = time.monotonic()
+                result = {
+                    'link': link,
+                    'host': link_host(link),
+                    'method': 'mailto',
+                    'success': False,
+                    'error': None,
+                    'recipients': {},
+                    'wait_time': 0.0
+                }
+
+                if cancel_event is not None and cancel_event.is_set():
+                    result.update(cancelled=True, error='Cancelled')
+                elif connect_error:
+                    result['error'] = connect_error
+                else:
+                    try:
+                        mailto = parse_mailto(link)
+                        result['recipients'] = {address: None for address in mailto['to']}
+                        conn, refused = self._send(conn, mailto)
+                        for address, (code, message) in refused.items():
+                            result['recipients'][address] = f"SMTP {code}: {self._decode(message)}"
+                        result['success'] = not refused
+                        if refused:
+                            result['error'] = f"Refused by the mail server for {len(refused)} of {len(mailto['to'])} recipients"
+                    except ValueError as e:
+                        result['error'] = str(e)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        for address, (code, message) in e.recipients.items():
+                            result['recipients'][address] = f"SMTP {code}: {self._decode(message)}"
+                        result['error'] = 'All recipients refused by the mail server'
+                    except smtplib.SMTPResponseException as e:
+                        result['error'] = f"SMTP {e.smtp_code}: {self._decode(e.smtp_error)}"
+                    except SmtpConnectError as e:
+                        # Connecting or logging in failed, the remaining links would fail the same way
+                        connect_error = str(e)
+                        result['error'] = connect_error
+                    except (smtplib.SMTPException, OSError) as e:
+                        conn = self._close(conn)
+                        result['error'] = f"SMTP error: {str(e)}"
+
+                    if result['error'] and not result.get('cancelled'):
+                        mailto_logger.warning(f"Unsubscribe email for {link} failed: {result['error']}")
+
+                result['duration'] = round(time.monotonic() - start, 3)
+                results.append(result)
+                if on_result:
+                    on_result(position, result)
+        finally:
+            self._close(conn)
+
+        succeeded = sum(1 for result in results if result['success'])
+        mailto_logger.info(f"Sent {succeeded} of {len(links)} unsubscribe emails for {self.from_address}")
+        return results
+
+    def _send(self, conn, mailto):
+        """
+        Send one unsubscribe email, connecting first if needed and reconnecting once
+        if the server closed an idle connection
+
+        Returns:
+            tuple: The connection to reuse, and the refused recipients
+        """
+        message = EmailMessage()
+        message['From'] = self.from_address
+        message['To'] = ', '.join(mailto['to'])
+        message['Subject'] = mailto['subject']
+        message['Date'] = formatdate(localtime=True)
+        message['Message-ID'] = make_msgid(domain=self.from_address.split('@')[-1])
+        message['Auto-Submitted'] = 'auto-generated'  # RFC 3834, keeps auto-responders quiet
+        message.set_content(mailto['body'])
+
+        for attempt in range(2):
+            reused = conn is not None
+            if conn is None:
+                try:
+                    conn = self.connect_fn()
+                except (smtplib.SMTPException, OSError, ValueError) as e:
+                    raise SmtpConnectError(str(e)) from e
+            try:
+                return conn, conn.send_message(message, self.from_address, mailto['to'])
+            except smtplib.SMTPServerDisconnected:
+                conn = self._close(conn)
+                if not reused or attempt:
+                    raise
+                mailto_logger.info("SMTP connection closed by the server, reconnecting")
+
+    def _close(self, conn):
+        """Close an SMTP connection, ignoring errors; always returns None"""
+        if conn is not None:
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                conn.close()
+        return None
+
+    def _decode(self, message):
+        """Decode an SMTP server reply"""
+        return message.decode('utf-8', errors='replace') if isinstance(message, bytes) else str(message)
@@ -41,7 +41,9 @@ const ModernLogin = () => {
         email: formData.email,
         provider,
         num_emails: formData.num_emails,
-        use_oauth: isOAuth
+        use_oauth: isOAuth,
+        // Let the dashboard stream results instead of waiting for the full scan
+        stream: true
       };
       
       // Add password for non-OAuth authentication
@@ -67,8 +69,8 @@ const ModernLogin = () => {
       const data = await response.json();
       
       if (data.status === 'success') {
-        // Redirect to dashboard
-        window.location.href = '/dashboard';
+        // Redirect to dashboard, which streams the scan results
+        window.location.href = data.redirect || '/dashboard';
       } else if (data.status === 'oauth_redirect') {
         // Redirect to OAuth provider
         window.location.href = data.redirect_url;
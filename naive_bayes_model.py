@@ -0,0 +1,296 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+import numpy as np
+
+# Setup logging
+nb_logger = logging.getLogger('NaiveBayesModel')
+
+# Layout of a model directory: model.json names the version subdirectory holding the arrays
+MODEL_FORMAT = 2
+META_FILE = 'model.json'
+ARRAYS = ('feature_log_prob', 'class_log_prior', 'feature_count', 'class_count')
+KEEP_VERSIONS = 2  # Workers may still map the previous version while they switch
+
+# Tokenization of scikit-learn's HashingVectorizer with the settings the categorizer trains with:
+# lowercased words of two or more word characters, hashed with signed 32-bit MurmurHash3, seed 0
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+FEATURE_CACHE_SIZE = 2 ** 18  # Hashed words and word pairs remembered per model
+
+
+def murmurhash3_32(data, seed=0):
+    """
+    MurmurHash3 x86 32-bit, as sklearn.utils.murmurhash3_32 with positive=False
+
+    Args:
+        data: Bytes to hash
+        seed: Hash seed
+
+    Returns:
+        int: Signed 32-bit hash
+    """
+    length = len(data)
+    h = seed
+    rounded = length & ~3
+    for i in range(0, rounded, 4):
+        k = int.from_bytes(data[i:i + 4], 'little')
+        k = (k * 0xcc9e2d51) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        h ^= (k * 0x1b873593) & 0xffffffff
+        h = ((h << 13) | (h >> 19)) & 0xffffffff
+        h = (h * 5 + 0xe6546b64) & 0xffffffff
+
+    tail = length & 3
+    if tail:
+        k = int.from_bytes(data[rounded:], 'little')
+        k = (k * 0xcc9e2d51) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        h ^= (k * 0x1b873593) & 0xffffffff
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h - 0x100000000 if h & 0x80000000 else h
+
+
+def feature_index(feature, n_features):
+    """Hash bucket of a word or word pair, as FeatureHasher assigns it"""
+    h = murmurhash3_32(feature.encode('utf-8'))
+    if h == -0x80000000:
+        # scikit-learn defines abs() of the smallest int32 this way
+        return (0x7fffffff - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+def analyze(text, ngram_range):
+    """
+    Split a text into the words and word n-grams HashingVectorizer counts
+
+    Args:
+        text: Text to analyze
+        ngram_range: (min_n, max_n) tuple
+
+    Returns:
+        list: Words and space-joined n-grams
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    min_n, max_n = ngram_range
+    features = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+        features.extend(map(' '.join, zip(*(tokens[i:] for i in range(n)))))
+    return features
+
+
+class NaiveBayesModel:
+    """
+    Multinomial Naive Bayes over hashed word and word-pair counts, stored as plain NumPy arrays.
+    The arrays are memory-mapped read-only, so all worker processes serving the same model
+    share one copy through the page cache. Scoring a batch is one sparse dot product that
+    only reads the weight rows of the features present in the texts.
+    Inference needs NumPy only: texts are tokenized and hashed with the same rules as
+    scikit-learn's HashingVectorizer, and the probabilities are those of the pipeline the
+    model was exported from. scikit-learn is imported only to export or keep training.
+    """
+    def __init__(self, meta, arrays):
+        """
+        Initialize the model
+
+        Args:
+            meta: Model metadata from model.json
+            arrays: Dictionary of the model arrays, feature_log_prob as (features, classes)
+        """
+        self.meta = meta
+        self.version = meta['version']
+        self.classes_ = np.array(meta['classes'])
+        self.arrays = arrays
+        self.n_features = meta['n_features']
+        self.ngram_range = tuple(meta['ngram_range'])
+        self.feature_cache = {}  # word or word pair -> hash bucket
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map the current version of a model directory
+
+        Args:
+            path: Model directory written by save()
+
+        Returns:
+            NaiveBayesModel: Model backed by read-only memory maps
+
+        Raises:
+            ValueError: If the directory holds an unsupported format
+        """
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('format') != MODEL_FORMAT:
+            raise ValueError(f"Unsupported model format {meta.get('format')}")
+
+        version_path = os.path.join(path, meta['version'])
+        arrays = {name: np.load(os.path.join(version_path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+        return cls(meta, arrays)
+
+    @staticmethod
+    def save(path, pipeline):
+        """
+        Export a trained hashing vectorizer + MultinomialNB pipeline to a model directory
+        The arrays go to a new version subdirectory and model.json is replaced last, so
+        processes loading meanwhile see either the complete old or the complete new model
+
+        Args:
+            path: Model directory
+            pipeline: Trained scikit-learn pipeline
+
+        Returns:
+            str: Version of the saved model
+
+        Raises:
+            ValueError: If the pipeline does not hash its features
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        vectorizer = pipeline.steps[0][1]
+        classifier = pipeline.steps[-1][1]
+        if not isinstance(vectorizer, HashingVectorizer) or len(pipeline.steps) != 2:
+            raise ValueError("Only hashing vectorizer + Naive Bayes pipelines can be exported")
+
+        arrays = {
+            # Stored per feature, so the weights of one hashed feature are one contiguous row
+            'feature_log_prob': np.ascontiguousarray(classifier.feature_log_prob_.T),
+            'class_log_prior': np.ascontiguousarray(classifier.class_log_prior_),
+            'feature_count': np.ascontiguousarray(classifier.feature_count_),
+            'class_count': np.ascontiguousarray(classifier.class_count_)
+        }
+        digest = hashlib.sha256()
+        for name in ARRAYS:
+            digest.update(arrays[name].tobytes())
+        version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{digest.hexdigest()[:8]}"
+
+        # Files of a published version are never rewritten, workers may have them mapped
+        version_path = os.path.join(path, version)
+        if not os.path.isdir(version_path):
+            temp_path = f"{version_path}.tmp"
+            shutil.rmtree(temp_path, ignore_errors=True)
+            os.makedirs(temp_path)
+            for name in ARRAYS:
+                np.save(os.path.join(temp_path, f"{name}.npy"), arrays[name])
+            os.rename(temp_path, version_path)
+
+        meta = {
+            'format': MODEL_FORMAT,
+            'version': version,
+            'built_at': datetime.now().isoformat(),
+            'n_features': vectorizer.n_features,
+            'ngram_range': list(vectorizer.ngram_range),
+            'classes': [str(cls) for cls in classifier.classes_],
+            'alpha': classifier.alpha,
+            'fit_prior': classifier.fit_prior,
+            'force_alpha': classifier.force_alpha
+        }
+        temp_path = os.path.join(path, f"{META_FILE}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temp_path, os.path.join(path, META_FILE))
+
+        NaiveBayesModel._prune(path, version)
+        nb_logger.info(f"Saved model {version} to {path}")
+        return version
+
+    @staticmethod
+    def _prune(path, current):
+        """Delete all but the newest KEEP_VERSIONS version subdirectories, never the current one"""
+        versions = sorted(entry for entry in os.listdir(path)
+                          if entry != current and os.path.isdir(os.path.join(path, entry)))
+        for entry in versions[:max(0, len(versions) - (KEEP_VERSIONS - 1))]:
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+    def predict_proba(self, texts):
+        """
+        Get the probability of each class for a batch of texts
+
+        Args:
+            texts: List of texts
+
+        Returns:
+            numpy.ndarray: Probabilities, one row per text in the order of classes_
+        """
+        rows, columns, counts = self._hashed_counts(texts)
+        weights = self.arrays['feature_log_prob']
+        joint_log_likelihood = np.zeros((len(texts), weights.shape[1]))
+        # Weighted rows are added one at a time in feature order, as scipy's sparse product adds them,
+        # so the sums round exactly the same way
+        np.add.at(joint_log_likelihood, rows, counts[:, np.newaxis] * weights[columns])
+        joint_log_likelihood += self.arrays['class_log_prior']
+        return np.exp(joint_log_likelihood - self._logsumexp(joint_log_likelihood))
+
+    def _hashed_counts(self, texts):
+        """
+        Count the hashed features of a batch of texts, like HashingVectorizer.transform
+
+        Returns:
+            tuple: Row, feature index and count arrays of the non-zero entries, sorted by row and feature
+        """
+        rows = []
+        columns = []
+        cache = self.feature_cache
+        for row, text in enumerate(texts):
+            features = analyze(text, self.ngram_range)
+            indices = list(map(cache.get, features))
+            if None in indices:
+                if len(cache) > FEATURE_CACHE_SIZE:
+                    cache.clear()
+                for position, index in enumerate(indices):
+                    if index is None:
+                        indices[position] = cache[features[position]] = feature_index(features[position],
+                                                                                      self.n_features)
+            rows.extend([row] * len(indices))
+            columns.extend(indices)
+
+        keys, counts = np.unique(np.array(rows, dtype=np.int64) * self.n_features + np.array(columns, dtype=np.int64),
+                                 return_counts=True)
+        return keys // self.n_features, keys % self.n_features, counts.astype(np.float64)
+
+    def _logsumexp(self, values):
+        """
+        Log of the summed exponentials of each row, computed as scipy.special.logsumexp does:
+        the maximum terms are taken out of the sum for precision
+        """
+        maximum = values.max(axis=1, keepdims=True)
+        is_maximum = values == maximum
+        count = is_maximum.sum(axis=1, keepdims=True, dtype=values.dtype)
+        rest = np.exp(np.where(is_maximum, -np.inf, values) - maximum).sum(axis=1, keepdims=True)
+        rest = np.where(rest == 0, rest, rest / count)
+        return np.log1p(rest) + np.log(count) + maximum
+
+    def to_pipeline(self):
+        """
+        Rebuild the scikit-learn pipeline, with its own copy of the counts, to keep training it
+
+        Returns:
+            Pipeline: Hashing vectorizer + MultinomialNB equal to the exported one
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+
+        classifier = MultinomialNB(alpha=self.meta['alpha'], fit_prior=self.meta['fit_prior'],
+                                   force_alpha=self.meta['force_alpha'])
+        classifier.classes_ = self.classes_.copy()
+        classifier.class_count_ = np.array(self.arrays['class_count'])
+        classifier.feature_count_ = np.array(self.arrays['feature_count'])
+        classifier.feature_log_prob_ = np.array(self.arrays['feature_log_prob'].T, order='C')
+        classifier.class_log_prior_ = np.array(self.arrays['class_log_prior'])
+        classifier.n_features_in_ = self.meta['n_features']
+        return Pipeline([
+            ('vectorizer', HashingVectorizer(ngram_range=tuple(self.meta['ngram_range']),
+                                             n_features=self.meta['n_features'],
+                                             alternate_sign=False, norm=None)),
+            ('classifier', classifier)
+        ])
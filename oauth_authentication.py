@@ -1,12 +1,12 @@
 import os
 import json
-import requests
 import base64
 import secrets
 from flask import redirect, request, url_for, session
 import logging
 from oauthlib.oauth2 import WebApplicationClient
 from urllib.parse import urlencode
+from http_session_pool import get_shared_pool
 
 # Setup logging
 auth_logger = logging.getLogger('OAuthHandler')
@@ -15,8 +15,9 @@ class OAuthHandler:
     """
     Class to handle OAuth 2.0 authentication with various email providers
     """
-    def __init__(self, app):
+    def __init__(self, app, http_pool=None):
         self.app = app
+        self.http_pool = http_pool or get_shared_pool()  # Keep-alive connections to the token endpoints
         self.clients = {}
         self.provider_configs = {
             'gmail': {
@@ -30,7 +31,8 @@ class OAuthHandler:
                 'auth_uri': 'https://login.microsoftonline.com/common/oauth2/v2.0/authorize',
                 'token_uri': 'https://login.microsoftonline.com/common/oauth2/v2.0/token',
                 'userinfo_uri': 'https://graph.microsoft.com/v1.0/me',
-                'scopes': ['https://outlook.office.com/IMAP.AccessAsUser.All', 'offline_access', 'user.read'],
+                'scopes': ['https://outlook.office.com/IMAP.AccessAsUser.All', 'https://outlook.office.com/SMTP.Send',
+                           'offline_access', 'user.read'],
                 'required_config': ['client_id', 'client_secret', 'redirect_uri']
             }
         }
@@ -167,7 +169,7 @@ class OAuthHandler:
             headers['Authorization'] = f'Basic {basic_auth}'
             
             # Exchange authorization code for tokens
-            token_response = requests.post(
+            token_response = self.http_pool.post(
                 token_url,
                 headers=headers,
                 data=body,
@@ -180,7 +182,7 @@ class OAuthHandler:
             # Get user info
             userinfo_uri = provider_config['userinfo_uri']
             uri, headers, body = client.add_token(userinfo_uri)
-            userinfo_response = requests.get(uri, headers=headers, data=body)
+            userinfo_response = self.http_pool.get(uri, headers=headers, data=body)
             userinfo = userinfo_response.json()
             
             # Store tokens in session
@@ -251,7 +253,7 @@ class OAuthHandler:
             )
             
             # Make refresh token request
-            response = requests.post(
+            response = self.http_pool.post(
                 refresh_url,
                 headers=headers,
                 data=body,
@@ -308,7 +310,7 @@ class OAuthHandler:
         
         try:
             # Revoke the token
-            response = requests.post(
+            response = self.http_pool.post(
                 revocation_endpoints[provider],
                 params={'token': tokens['access_token']},
                 timeout=10
@@ -0,0 +1,183 @@
+import json
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+
+# Setup logging
+response_logger = logging.getLogger('ResponseCache')
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def _default(obj):
+    """Serialize values the standard json module does not handle (numpy scalars, dates)"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(payload):
+    """
+    Serialize a payload to compact JSON bytes, using orjson when it is installed
+
+    Args:
+        payload: JSON-serializable object
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(payload, default=_default,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # orjson rejects a few inputs json accepts (e.g. integers over 64 bits)
+            pass
+    return json.dumps(payload, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+class CachedBody:
+    """
+    Serialized JSON body of one response, with its compressed variants created on first request
+    """
+    def __init__(self, data, min_compress_size=1024, gzip_level=6, brotli_quality=5):
+        """
+        Initialize the body
+
+        Args:
+            data: Uncompressed JSON bytes
+            min_compress_size: Bodies smaller than this are always sent uncompressed
+            gzip_level: gzip compression level
+            brotli_quality: Brotli compression quality
+        """
+        self.variants = {'identity': data}
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.lock = threading.Lock()
+
+        if len(data) < min_compress_size:
+            self.encodings = ()
+        elif BROTLI_AVAILABLE:
+            self.encodings = ('br', 'gzip')
+        else:
+            self.encodings = ('gzip',)
+
+    @property
+    def size(self):
+        """Total size of the cached variants in bytes"""
+        return sum(len(data) for data in self.variants.values())
+
+    def encoded(self, encoding):
+        """
+        Get the body in a content encoding, compressing it the first time it is requested
+
+        Args:
+            encoding: 'br', 'gzip' or 'identity'
+
+        Returns:
+            bytes: Encoded body
+        """
+        if encoding not in self.encodings:
+            encoding = 'identity'
+        with self.lock:
+            if encoding not in self.variants:
+                data = self.variants['identity']
+                if encoding == 'br':
+                    self.variants[encoding] = brotli.compress(data, quality=self.brotli_quality)
+                else:
+                    self.variants[encoding] = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+            return self.variants[encoding]
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized and compressed JSON response bodies.
+    Keys include the version of the stored results a response was built from,
+    so repeated requests for unchanged results skip serialization and compression.
+    """
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, min_compress_size=1024,
+                 gzip_level=6, brotli_quality=5):
+        """
+        Initialize the response cache
+
+        Args:
+            max_entries: Maximum number of cached bodies
+            max_bytes: Maximum total size of the cached bodies and their compressed variants
+            min_compress_size: Bodies smaller than this are always sent uncompressed
+            gzip_level: gzip compression level
+            brotli_quality: Brotli compression quality
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.min_compress_size = min_compress_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.entries = OrderedDict()  # Least recently used bodies first
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, build_payload):
+        """
+        Get the cached body for a key, building and serializing the payload on a miss
+
+        Args:
+            key: Hashable cache key, which must change whenever the payload would
+            build_payload: Function returning the payload to serialize
+
+        Returns:
+            CachedBody: Serialized body
+        """
+        with self.lock:
+            body = self.entries.get(key)
+            if body:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return body
+            self.stats['misses'] += 1
+
+        body = CachedBody(dumps(build_payload()), self.min_compress_size, self.gzip_level, self.brotli_quality)
+
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            self._evict()
+        return body
+
+    def invalidate(self, match):
+        """
+        Remove cached bodies whose key matches a predicate
+
+        Args:
+            match: Function called with each key, returning True to remove it
+        """
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                del self.entries[key]
+
+    def get_stats(self):
+        """Get cache usage statistics"""
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries),
+                        total_bytes=sum(body.size for body in self.entries.values()),
+                        orjson=ORJSON_AVAILABLE, brotli=BROTLI_AVAILABLE)
+
+    def _evict(self):
+        """Evict least recently used bodies until within limits (caller holds the lock)"""
+        total_bytes = sum(body.size for body in self.entries.values())
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, body = self.entries.popitem(last=False)
+            total_bytes -= body.size
+            self.stats['evictions'] += 1
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from subscription_index import SubscriptionIndex
+
+# Setup logging
+data_store_logger = logging.getLogger('ScanDataStore')
+
+
+class ScanDataStore:
+    """
+    Server-side store for processed scan results, keyed by user.
+    Results are kept zlib-compressed in SQLite with a TTL and eviction of the oldest
+    results, so the session only needs to carry the ID of the user's current results.
+    Every web worker process sharing the database sees the same results and versions.
+
+    Every put gets a new version number, unique across processes, and row fingerprints
+    of the last few versions are kept per user so clients can fetch only what changed.
+    Decompressed indexes are cached in the memory of each process.
+    """
+    def __init__(self, db_path=None, max_entries=500, max_bytes=64 * 1024 * 1024, ttl=1800,
+                 compression_level=6, max_indexes=50, max_versions=5):
+        """
+        Initialize the data store
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_entries: Maximum number of users to keep results for
+            max_bytes: Maximum total size of the compressed results
+            ttl: Seconds after which stored results expire
+            compression_level: zlib compression level
+            max_indexes: Maximum number of users to keep decompressed indexes for in this process
+            max_versions: Number of previous versions per user that deltas can be computed from
+        """
+        self.db_path = db_path or os.environ.get('SCAN_DATA_DB', 'scan_data.db')
+        self.max_entries = max_entries
+        self.max_indexes = max_indexes
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compression_level = compression_level
+        self.indexes = OrderedDict()  # user -> (data_id, version, SubscriptionIndex), least recently used first
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self._create_tables()
+
+    def _get_connection(self):
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        """Create the result tables if they do not exist"""
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_data (
+                    user TEXT PRIMARY KEY,
+                    data_id TEXT NOT NULL,
+                    blob BLOB NOT NULL,
+                    count INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            ''')
+            # The row ID is the version, so versions never repeat across processes
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_data_versions (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user TEXT NOT NULL,
+                    fingerprints BLOB NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS scan_data_versions_user ON scan_data_versions (user, version)')
+
+    def new_id(self):
+        """Generate an ID for results that will be stored later"""
+        return uuid.uuid4().hex
+
+    def put(self, user, data, data_id=None):
+        """
+        Store the processed scan results for a user, replacing previous results
+
+        Args:
+            user: User's email address
+            data: List of processed subscription dictionaries
+            data_id: ID to store the results under (generated if not given)
+
+        Returns:
+            str: ID of the stored results, to be kept in the session
+        """
+        user = user.lower()
+        data_id = data_id or self.new_id()
+        blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), self.compression_level)
+        fingerprints = zlib.compress(json.dumps(self._fingerprint(data), separators=(',', ':')).encode('utf-8'))
+
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            version = conn.execute('INSERT INTO scan_data_versions (user, fingerprints) VALUES (?, ?)',
+                                   (user, fingerprints)).lastrowid
+            conn.execute('''
+                DELETE FROM scan_data_versions WHERE user = ? AND version NOT IN
+                (SELECT version FROM scan_data_versions WHERE user = ? ORDER BY version DESC LIMIT ?)
+            ''', (user, user, self.max_versions))
+            conn.execute('''
+                INSERT OR REPLACE INTO scan_data (user, data_id, blob, count, version, stored_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user, data_id, blob, len(data), version, time.time()))
+            self._evict(conn)
+
+        data_store_logger.info(f"Stored {len(data)} subscriptions for {user} as version {version} "
+                               f"({len(blob)} bytes compressed)")
+        return data_id
+
+    def get(self, user, data_id):
+        """
+        Get the stored results for a user
+
+        Args:
+            user: User's email address
+            data_id: Results ID from the user's session
+
+        Returns:
+            dict: Entry with 'data_id', 'data', 'version' and 'stored_at', or None if missing or expired
+        """
+        row = self._get_entry(user.lower(), data_id, 'blob, version, stored_at')
+        if not row:
+            return None
+        return {
+            'data_id': data_id,
+            'data': json.loads(zlib.decompress(row['blob']).decode('utf-8')),
+            'version': row['version'],
+            'stored_at': row['stored_at']
+        }
+
+    def get_version(self, user, data_id):
+        """
+        Get the version of a user's stored results without decompressing them
+
+        Args:
+            user: User's email address
+            data_id: Results ID from the user's session
+
+        Returns:
+            int: Version number, or None if missing or expired
+        """
+        row = self._get_connection().execute(
+            'SELECT data_id, version, stored_at FROM scan_data WHERE user = ?', (user.lower(),)
+        ).fetchone()
+        if not row or row['data_id'] != data_id or time.time() - row['stored_at'] > self.ttl:
+            return None
+        return row['version']
+
+    def get_changes(self, user, data_id, since):
+        """
+        Get the subscriptions added, updated and removed since an earlier version
+
+        Args:
+            user: User's email address
+            data_id: Results ID from the user's session
+            since: Version the client already has
+
+        Returns:
+            dict: 'version', 'added' and 'updated' rows and 'removed' email IDs,
+                  or None if the earlier version is no longer known and the client needs the full list
+        """
+        user = user.lower()
+        stored = self.get(user, data_id)
+        if not stored:
+            return None
+        history = {
+            row['version']: json.loads(zlib.decompress(row['fingerprints']).decode('utf-8'))
+            for row in self._get_connection().execute(
+                'SELECT version, fingerprints FROM scan_data_versions WHERE user = ? AND version IN (?, ?)',
+                (user, since, stored['version'])
+            )
+        }
+        if since not in history:
+            return None
+        old = history[since]
+        current = history.get(stored['version']) or self._fingerprint(stored['data'])
+
+        added, updated = [], []
+        for position, row in enumerate(stored['data']):
+            key = str(row.get('email_id', position))
+            if key not in old:
+                added.append(row)
+            elif old[key] != current[key]:
+                updated.append(row)
+        removed = [key for key in old if key not in current]
+
+        return {'version': stored['version'], 'added': added, 'updated': updated, 'removed': removed}
+
+    def get_index(self, user, data_id):
+        """
+        Get the SubscriptionIndex over a user's stored results, building it on first use in this process
+
+        Args:
+            user: User's email address
+            data_id: Results ID from the user's session
+
+        Returns:
+            SubscriptionIndex: Index over the results, or None if missing or expired
+        """
+        user = user.lower()
+        version = self.get_version(user, data_id)
+        if version is None:
+            with self.lock:
+                self.indexes.pop(user, None)
+                self.stats['misses'] += 1
+            return None
+
+        with self.lock:
+            cached = self.indexes.get(user)
+            if cached and cached[:2] == (data_id, version):
+                self.indexes.move_to_end(user)
+                self.stats['hits'] += 1
+                return cached[2]
+
+        stored = self.get(user, data_id)
+        if not stored:
+            return None
+        index = SubscriptionIndex(stored['data'])
+
+        with self.lock:
+            self.indexes[user] = (data_id, stored['version'], index)
+            self.indexes.move_to_end(user)
+            # Only the most recently used users keep a decompressed index
+            while len(self.indexes) > self.max_indexes:
+                self.indexes.popitem(last=False)
+        return index
+
+    def _get_entry(self, user, data_id, columns):
+        """Read the given columns of a user's current entry, counting hits and dropping expired entries"""
+        conn = self._get_connection()
+        row = conn.execute(f'SELECT data_id, {columns} FROM scan_data WHERE user = ?', (user,)).fetchone()
+        if not row or row['data_id'] != data_id:
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+
+        if time.time() - row['stored_at'] > self.ttl:
+            with self.write_lock, conn:
+                conn.execute('DELETE FROM scan_data WHERE user = ? AND data_id = ?', (user, data_id))
+            with self.lock:
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+            return None
+
+        with self.lock:
+            self.stats['hits'] += 1
+        return row
+
+    def _fingerprint(self, data):
+        """Map each row's email ID to a checksum of its contents, in row order"""
+        return {
+            str(row.get('email_id', position)): zlib.crc32(json.dumps(row, sort_keys=True).encode('utf-8'))
+            for position, row in enumerate(data)
+        }
+
+    def delete(self, user):
+        """Remove the stored results for a user"""
+        user = user.lower()
+        with self.lock:
+            self.indexes.pop(user, None)
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute('DELETE FROM scan_data WHERE user = ?', (user,))
+            conn.execute('DELETE FROM scan_data_versions WHERE user = ?', (user,))
+        return cursor.rowcount > 0
+
+    def get_stats(self):
+        """Get store usage statistics; hits, misses and evictions are counted by this process"""
+        row = self._get_connection().execute(
+            'SELECT COUNT(*) AS entries, COALESCE(SUM(LENGTH(blob)), 0) AS total_bytes FROM scan_data'
+        ).fetchone()
+        with self.lock:
+            return dict(self.stats, entries=row['entries'], total_bytes=row['total_bytes'],
+                        indexes=len(self.indexes))
+
+    def _evict(self, conn):
+        """Remove expired results, then the oldest results until within limits (caller holds the write lock)"""
+        now = time.time()
+        expired = conn.execute('DELETE FROM scan_data WHERE stored_at < ?', (now - self.ttl,)).rowcount
+
+        entries, total_bytes, evicted = 0, 0, []
+        for row in conn.execute('SELECT user, LENGTH(blob) AS size FROM scan_data ORDER BY stored_at DESC'):
+            entries += 1
+            total_bytes += row['size']
+            if entries > self.max_entries or total_bytes > self.max_bytes:
+                evicted.append(row['user'])
+        for user in evicted:
+            conn.execute('DELETE FROM scan_data WHERE user = ?', (user,))
+            data_store_logger.info(f"Evicted stored results for {user}")
+        conn.execute('DELETE FROM scan_data_versions WHERE user NOT IN (SELECT user FROM scan_data)')
+
+        with self.lock:
+            self.stats['expired'] += expired
+            self.stats['evictions'] += len(evicted)
@@ -0,0 +1,271 @@
+import os
+import uuid
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from scan_job_store import (ScanJobStore, ACTIVE_STATES, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETE, JOB_FAILED,
+                            JOB_HEARTBEAT_SECONDS)
+
+# Setup logging
+jobs_logger = logging.getLogger('ScanJobManager')
+
+# Maximum number of raw results converted to dashboard rows in one process_fn call;
+# pending results are also converted at every progress event
+PROCESS_BATCH_SIZE = 50
+
+# Seconds between checks for changes of scans running in another process
+REMOTE_POLL_SECONDS = 0.5
+
+
+class ScanJobManager:
+    """
+    Runs inbox scans on a bounded pool of background workers.
+    Submitting a scan returns a job ID immediately; the job's progress,
+    partial results and final result can then be polled, or followed with
+    wait_for_change. Results are converted to dashboard rows in batches.
+    Every change is also written to the ScanJobStore, so web worker processes other
+    than the one running a scan can poll and stream it, and a second process does not
+    start a scan of a mailbox that is already being scanned. Each process keeps the
+    heartbeat of its scans, and scans of a process that died are failed.
+    """
+    def __init__(self, max_workers=None, process_fn=None, job_ttl=3600, max_pending=50, store=None):
+        """
+        Initialize the job manager
+
+        Args:
+            max_workers: Number of scans that may run at the same time in this process
+            process_fn: Function converting a list of raw scan results and the account to dashboard rows
+            job_ttl: Seconds to keep finished jobs around for polling
+            max_pending: Maximum number of queued and running jobs in this process
+            store: ScanJobStore shared with the other web worker processes
+        """
+        self.store = store or ScanJobStore()
+        self.max_workers = max_workers or int(os.environ.get('SCAN_WORKERS', 4))
+        self.process_fn = process_fn
+        self.job_ttl = job_ttl
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scan-job')
+        self.jobs = {}  # Dictionary of jobs by job ID
+        self.active_jobs = {}  # Job ID of the active scan per (account, folder)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # Notified whenever a job changes
+
+        # Scans of a process that died cannot be resumed
+        self.instance_id = uuid.uuid4().hex
+        self.store.mark_interrupted()
+        self.stopped = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self._run_heartbeat, name='scan-job-heartbeat')
+        self.heartbeat_thread.daemon = True
+        self.heartbeat_thread.start()
+
+    def submit(self, account, client, num_emails=50, folder='INBOX', time_budget=None, resume_token=None):
+        """
+        Queue a scan, or return the scan already running for this mailbox
+
+        Args:
+            account: Email address being scanned
+            client: Authenticated SecureEmailClient for the account
+            num_emails: Number of recent emails to process
+            folder: Email folder to scan
+            time_budget: Maximum number of seconds the scan may spend fetching emails
+            resume_token: Continuation token of an interrupted scan to resume
+
+        Returns:
+            tuple: (job ID, True if a new job was created)
+
+        Raises:
+            RuntimeError: If too many scans are already pending
+        """
+        dedup_key = (account.lower(), folder)
+
+        with self.lock:
+            self._prune_jobs()
+
+            # Double-clicking "Scan" should not start a second scan of the same mailbox
+            existing_id = self.active_jobs.get(dedup_key)
+            if existing_id and self.jobs[existing_id]['status'] in ACTIVE_STATES:
+                jobs_logger.info(f"Reusing active scan job {existing_id} for {account}")
+                return existing_id, False
+
+            pending = sum(1 for job in self.jobs.values() if job['status'] in ACTIVE_STATES)
+            if pending >= self.max_pending:
+                raise RuntimeError("Too many scans in progress, please try again shortly")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'account': account.lower(),
+                'folder': folder,
+                'status': JOB_QUEUED,
+                'progress': {'processed': 0, 'total': 0, 'found': 0},
+                'results': [],
+                'complete': False,
+                'continuation_token': None,
+                'error': None,
+                'version': 0,
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'finished_time': None
+            }
+            # Another process may be scanning the mailbox already
+            existing_id = self.store.create_job(job, self.instance_id, self.job_ttl)
+            if existing_id:
+                jobs_logger.info(f"Reusing scan job {existing_id} of another process for {account}")
+                return existing_id, False
+            self.jobs[job_id] = job
+            self.active_jobs[dedup_key] = job_id
+
+        self.executor.submit(self._run_job, job, client, num_emails, folder, time_budget, resume_token)
+        jobs_logger.info(f"Queued scan job {job_id} for {account}")
+        return job_id, True
+
+    def _run_job(self, job, client, num_emails, folder, time_budget, resume_token):
+        """Execute a scan job on a worker thread"""
+        with self.lock:
+            job['status'] = JOB_RUNNING
+            job['started_at'] = datetime.now().isoformat()
+            self._touch(job)
+        self.store.update_job(job)
+
+        pending = []  # Raw results not converted to rows yet
+        try:
+            for event in client.iter_unsubscribe_links(num_emails=num_emails, folder=folder,
+                                                       time_budget=time_budget, resume_token=resume_token):
+                if event['type'] == 'result':
+                    pending.append(event['data'])
+                    if len(pending) >= PROCESS_BATCH_SIZE:
+                        self._add_results(job, pending)
+                        pending = []
+                    continue
+
+                if pending:
+                    self._add_results(job, pending)
+                    pending = []
+                with self.lock:
+                    job['progress']['processed'] = event['processed']
+                    job['progress']['total'] = event['total']
+                    if event['type'] == 'done':
+                        job['complete'] = event['complete']
+                        job['continuation_token'] = event['continuation_token']
+                    self._touch(job)
+                self.store.update_job(job)
+            if pending:
+                self._add_results(job, pending)
+
+            with self.lock:
+                job['status'] = JOB_COMPLETE
+            jobs_logger.info(f"Scan job {job['job_id']} completed: {len(job['results'])} subscriptions found")
+        except Exception as e:
+            jobs_logger.error(f"Scan job {job['job_id']} failed: {str(e)}")
+            with self.lock:
+                job['status'] = JOB_FAILED
+                job['error'] = str(e)
+        finally:
+            with self.lock:
+                job['finished_at'] = datetime.now().isoformat()
+                job['finished_time'] = time.time()
+                self._touch(job)
+            self.store.update_job(job)
+
+    def _add_results(self, job, items):
+        """Convert a batch of raw scan results to dashboard rows and append them to the job"""
+        rows = self.process_fn(items, job['account']) if self.process_fn else items
+        with self.lock:
+            first_position = len(job['results'])
+            job['results'].extend(rows)
+            job['progress']['found'] = len(job['results'])
+            self._touch(job)
+        self.store.update_job(job, rows, first_position)
+
+    def get_job(self, job_id, offset=0):
+        """
+        Get the status of a job
+
+        Args:
+            job_id: Job ID returned by submit
+            offset: Only include results from this index on, for incremental polling
+
+        Returns:
+            dict: Snapshot of the job, or None if the job is unknown
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job:
+                # Started by another process, or finished and pruned here
+                return self.store.get_job(job_id, offset)
+
+            return {
+                'job_id': job['job_id'],
+                'account': job['account'],
+                'folder': job['folder'],
+                'status': job['status'],
+                'progress': dict(job['progress']),
+                'results': job['results'][offset:],
+                'offset': offset,
+                'complete': job['complete'],
+                'continuation_token': job['continuation_token'],
+                'error': job['error'],
+                'version': job['version'],
+                'created_at': job['created_at'],
+                'started_at': job['started_at'],
+                'finished_at': job['finished_at']
+            }
+
+    def wait_for_change(self, job_id, version, timeout=15):
+        """
+        Block until a job changes past the given version or the timeout expires
+
+        Args:
+            job_id: Job ID returned by submit
+            version: Version of the last snapshot the caller has seen
+            timeout: Maximum number of seconds to wait
+        """
+        with self.lock:
+            if job_id in self.jobs:
+                self.changed.wait_for(
+                    lambda: job_id not in self.jobs or self.jobs[job_id]['version'] > version,
+                    timeout=timeout
+                )
+                return
+
+        # The scan runs in another process, which writes its changes to the store
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            current = self.store.get_version(job_id)
+            if current is None or current > version:
+                return
+            time.sleep(min(REMOTE_POLL_SECONDS, max(0, deadline - time.monotonic())))
+
+    def _touch(self, job):
+        """Bump a job's version and wake up waiting streams (caller holds the lock)"""
+        job['version'] += 1
+        self.changed.notify_all()
+
+    def _prune_jobs(self):
+        """Remove finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['finished_time'] and job['finished_time'] < cutoff]
+        for job_id in expired:
+            job = self.jobs.pop(job_id)
+            dedup_key = (job['account'], job['folder'])
+            if self.active_jobs.get(dedup_key) == job_id:
+                del self.active_jobs[dedup_key]
+
+    def _run_heartbeat(self):
+        """Main loop of the heartbeat thread: keep this instance's scans alive, fail those of dead ones"""
+        while not self.stopped.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                self.store.heartbeat(self.instance_id)
+                self.store.mark_interrupted()
+            except sqlite3.Error as e:
+                jobs_logger.error(f"Failed to update scan job heartbeats: {str(e)}")
+
+    def shutdown(self, wait=False):
+        """Stop accepting jobs and shut down the worker pool"""
+        self.stopped.set()
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,250 @@
+import os
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Setup logging
+scan_job_store_logger = logging.getLogger('ScanJobStore')
+
+# Processes running scans refresh their heartbeat this often; active scans whose owner
+# missed several heartbeats are taken to have died with it
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 120
+
+# Job states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETE = 'complete'
+JOB_FAILED = 'failed'
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# Error of scans whose process stopped before they finished
+JOB_INTERRUPTED_ERROR = 'Scan was interrupted, please scan again'
+
+
+class ScanJobStore:
+    """
+    Shared store for the status, progress and results of background scans.
+    A scan runs in the process that started it, which writes every change here,
+    so requests reaching any web worker process can poll and stream it.
+    """
+    def __init__(self, db_path: str = None):
+        """
+        Initialize the scan job store
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path or os.environ.get('SCAN_JOB_DB', 'scan_jobs.db')
+        self.write_lock = threading.Lock()
+        self._local = threading.local()
+        self._create_tables()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        """Create the job tables if they do not exist"""
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    found INTEGER NOT NULL DEFAULT 0,
+                    complete INTEGER NOT NULL DEFAULT 0,
+                    continuation_token TEXT,
+                    error TEXT,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    owner TEXT,
+                    heartbeat_at TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS scan_jobs_mailbox ON scan_jobs (account, folder, status)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_job_results (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    row TEXT NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                )
+            ''')
+
+    def create_job(self, job: Dict, owner: str, job_ttl: float) -> Optional[str]:
+        """
+        Record a new scan, unless a live process is already scanning the same mailbox
+
+        Args:
+            job: Job dictionary with 'job_id', 'account', 'folder' and 'created_at'
+            owner: ID of the job manager instance running the job, which keeps its heartbeat
+            job_ttl: Seconds to keep finished jobs for polling
+
+        Returns:
+            str: ID of the active scan of the mailbox if there is one (the job is not recorded then), else None
+        """
+        now = datetime.now()
+        stale = (now - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+        active = ','.join('?' * len(ACTIVE_STATES))
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            # Drop finished jobs past their TTL
+            cutoff = (now - timedelta(seconds=job_ttl)).isoformat()
+            conn.execute('DELETE FROM scan_job_results WHERE job_id IN '
+                         '(SELECT job_id FROM scan_jobs WHERE finished_at < ?)', (cutoff,))
+            conn.execute('DELETE FROM scan_jobs WHERE finished_at < ?', (cutoff,))
+
+            # One statement, so two processes starting the same scan cannot both insert
+            cursor = conn.execute(f'''
+                INSERT INTO scan_jobs (job_id, account, folder, status, owner, heartbeat_at, created_at)
+                SELECT ?, ?, ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM scan_jobs WHERE account = ? AND folder = ?
+                                  AND status IN ({active}) AND heartbeat_at >= ?)
+            ''', (job['job_id'], job['account'], job['folder'], job['status'], owner, now.isoformat(),
+                  job['created_at'], job['account'], job['folder']) + ACTIVE_STATES + (stale,))
+            if cursor.rowcount:
+                return None
+            row = conn.execute(f'''
+                SELECT job_id FROM scan_jobs WHERE account = ? AND folder = ? AND status IN ({active})
+                AND heartbeat_at >= ? ORDER BY created_at DESC LIMIT 1
+            ''', (job['account'], job['folder']) + ACTIVE_STATES + (stale,)).fetchone()
+        return row['job_id'] if row else None
+
+    def update_job(self, job: Dict, rows: List[Dict] = (), first_position: int = 0):
+        """
+        Record the status and progress of a job, and results it found
+
+        Args:
+            job: Job dictionary of the job manager
+            rows: New result rows
+            first_position: Position of the first new row in the job's results
+        """
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                if rows:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO scan_job_results (job_id, position, row) VALUES (?, ?, ?)',
+                        [(job['job_id'], position, json.dumps(row))
+                         for position, row in enumerate(rows, first_position)]
+                    )
+                conn.execute('''
+                    UPDATE scan_jobs SET status = ?, processed = ?, total = ?, found = ?, complete = ?,
+                    continuation_token = ?, error = ?, version = ?, started_at = ?, finished_at = ?
+                    WHERE job_id = ?
+                ''', (job['status'], job['progress']['processed'], job['progress']['total'],
+                      job['progress']['found'], int(job['complete']), job['continuation_token'], job['error'],
+                      job['version'], job['started_at'], job['finished_at'], job['job_id']))
+        except sqlite3.Error as e:
+            scan_job_store_logger.error(f"Failed to update scan job {job['job_id']}: {str(e)}")
+
+    def get_version(self, job_id: str) -> Optional[int]:
+        """
+        Get the version of a job without reading its results
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            int: Version, or None if the job is unknown
+        """
+        row = self._get_connection().execute('SELECT version FROM scan_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row['version'] if row else None
+
+    def get_job(self, job_id: str, offset: int = 0) -> Optional[Dict]:
+        """
+        Get a snapshot of a job in the format of ScanJobManager.get_job
+
+        Args:
+            job_id: Job ID
+            offset: Only include results from this index on
+
+        Returns:
+            dict: Job snapshot, or None if the job is unknown
+        """
+        conn = self._get_connection()
+        row = conn.execute('SELECT * FROM scan_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+        results = conn.execute(
+            'SELECT row FROM scan_job_results WHERE job_id = ? AND position >= ? ORDER BY position',
+            (job_id, offset)
+        ).fetchall()
+        return {
+            'job_id': row['job_id'],
+            'account': row['account'],
+            'folder': row['folder'],
+            'status': row['status'],
+            'progress': {'processed': row['processed'], 'total': row['total'], 'found': row['found']},
+            'results': [json.loads(result['row']) for result in results],
+            'offset': offset,
+            'complete': bool(row['complete']),
+            'continuation_token': row['continuation_token'],
+            'error': row['error'],
+            'version': row['version'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+    def heartbeat(self, owner: str) -> int:
+        """
+        Record that the process owning some jobs is still running them
+
+        Args:
+            owner: ID of the job manager instance
+
+        Returns:
+            int: Number of active jobs of the owner
+        """
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute(
+                f'UPDATE scan_jobs SET heartbeat_at = ? '
+                f'WHERE owner = ? AND status IN ({",".join("?" * len(ACTIVE_STATES))})',
+                (datetime.now().isoformat(), owner) + ACTIVE_STATES
+            )
+        return cursor.rowcount
+
+    def mark_interrupted(self, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+        """
+        Fail queued or running jobs whose owner stopped sending heartbeats.
+        Jobs of other live processes sharing the database are left alone
+
+        Args:
+            stale_seconds: Seconds without a heartbeat after which the owner is taken to be gone
+
+        Returns:
+            int: Number of jobs marked
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(seconds=stale_seconds)).isoformat()
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute(
+                f'UPDATE scan_jobs SET status = ?, error = ?, version = version + 1, finished_at = ? '
+                f'WHERE status IN ({",".join("?" * len(ACTIVE_STATES))}) '
+                f'AND (heartbeat_at IS NULL OR heartbeat_at < ?)',
+                (JOB_FAILED, JOB_INTERRUPTED_ERROR, now.isoformat()) + ACTIVE_STATES + (cutoff,)
+            )
+        if cursor.rowcount:
+            scan_job_store_logger.info(f"Marked {cursor.rowcount} unfinished scan jobs as interrupted")
+        return cursor.rowcount
@@ -0,0 +1,335 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+# Setup logging
+store_logger = logging.getLogger('ScanResultStore')
+
+# SQLite limits the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+
+# Checkpoints of abandoned scans are removed after this many days
+CHECKPOINT_MAX_AGE_DAYS = 7
+
+
+class ScanResultStore:
+    """
+    Persistent per-message store for scan results.
+    Results are keyed by account, folder and IMAP UID so that incremental scans
+    can serve previously processed messages without fetching them again.
+    """
+    def __init__(self, db_path: str = None):
+        """
+        Initialize the result store
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path or os.environ.get('SCAN_RESULT_DB', 'scan_results.db')
+        self.write_lock = threading.Lock()
+        self._local = threading.local()
+        self._create_tables()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers proceed while request threads and scheduler jobs write
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        """Create the result tables if they do not exist"""
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_results (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uid TEXT NOT NULL,
+                    sender TEXT,
+                    email TEXT,
+                    unsubscribe_link TEXT,
+                    method TEXT,
+                    provider TEXT,
+                    category TEXT,
+                    last_received TEXT,
+                    one_click INTEGER NOT NULL DEFAULT 0,
+                    list_id TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (account, folder, uid)
+                )
+            ''')
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(scan_results)')]
+            if 'one_click' not in columns:
+                # Databases created before one-click unsubscribe support
+                conn.execute('ALTER TABLE scan_results ADD COLUMN one_click INTEGER NOT NULL DEFAULT 0')
+            if 'list_id' not in columns:
+                # Databases created before List-Id tracking
+                conn.execute('ALTER TABLE scan_results ADD COLUMN list_id TEXT')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS folder_state (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity TEXT,
+                    PRIMARY KEY (account, folder)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scan_checkpoints (
+                    scan_id TEXT PRIMARY KEY,
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uids TEXT NOT NULL,
+                    last_uid TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    uidvalidity TEXT
+                )
+            ''')
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(scan_checkpoints)')]
+            if 'uidvalidity' not in columns:
+                # Databases created before checkpoints recorded the folder's UIDVALIDITY
+                conn.execute('ALTER TABLE scan_checkpoints ADD COLUMN uidvalidity TEXT')
+
+    def _row_to_result(self, row: sqlite3.Row) -> Optional[Dict]:
+        """Convert a stored row back to the scan result format"""
+        if not row['unsubscribe_link']:
+            # Message was processed but had no unsubscribe link
+            return None
+        return {
+            'sender': row['sender'],
+            'email': row['email'],
+            'unsubscribe_link': row['unsubscribe_link'],
+            'method': row['method'],
+            'provider': row['provider'],
+            'category': row['category'],
+            'last_received': row['last_received'],
+            'one_click': bool(row['one_click']),
+            'list_id': row['list_id'],
+            'email_id': row['uid']
+        }
+
+    def check_uidvalidity(self, account: str, folder: str, uidvalidity: str) -> bool:
+        """
+        Record the folder's UIDVALIDITY and drop stale results if it changed
+
+        Args:
+            account: Email address the folder belongs to
+            folder: IMAP folder name
+            uidvalidity: UIDVALIDITY value reported by the server
+
+        Returns:
+            bool: True if the stored results are still valid
+        """
+        if not uidvalidity:
+            return True
+
+        account = account.lower()
+        conn = self._get_connection()
+        row = conn.execute(
+            'SELECT uidvalidity FROM folder_state WHERE account = ? AND folder = ?',
+            (account, folder)
+        ).fetchone()
+        if row and row['uidvalidity'] == uidvalidity:
+            return True
+
+        with self.write_lock, conn:
+            if row:
+                # UIDs were reassigned by the server, cached results no longer apply
+                conn.execute('DELETE FROM scan_results WHERE account = ? AND folder = ?', (account, folder))
+                store_logger.info(f"UIDVALIDITY changed for {account}/{folder}, cleared cached results")
+            conn.execute(
+                'INSERT OR REPLACE INTO folder_state (account, folder, uidvalidity) VALUES (?, ?, ?)',
+                (account, folder, uidvalidity)
+            )
+        return row is None
+
+    def get_results(self, account: str, folder: str, uids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Look up stored results for the given UIDs
+
+        Args:
+            account: Email address the messages belong to
+            folder: IMAP folder name
+            uids: UIDs to look up
+
+        Returns:
+            dict: Mapping of known UIDs to their result (None if the message had no unsubscribe link)
+        """
+        account = account.lower()
+        uids = list(uids)
+        conn = self._get_connection()
+        results = {}
+
+        for i in range(0, len(uids), QUERY_CHUNK_SIZE):
+            chunk = uids[i:i + QUERY_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT * FROM scan_results WHERE account = ? AND folder = ? AND uid IN ({placeholders})',
+                [account, folder] + chunk
+            ).fetchall()
+            for row in rows:
+                results[row['uid']] = self._row_to_result(row)
+
+        return results
+
+    def save_result(self, account: str, folder: str, uid: str, result: Optional[Dict]):
+        """
+        Store the result for a single message
+
+        Args:
+            account: Email address the message belongs to
+            folder: IMAP folder name
+            uid: IMAP UID of the message
+            result: Scan result dictionary, or None if no unsubscribe link was found
+        """
+        self.save_results(account, folder, [(uid, result)])
+
+    def save_results(self, account: str, folder: str, items: List[tuple]):
+        """
+        Store results for several messages in one transaction
+
+        Args:
+            account: Email address the messages belong to
+            folder: IMAP folder name
+            items: List of (uid, result) tuples, result may be None
+        """
+        if not items:
+            return
+
+        account = account.lower()
+        now = datetime.now().isoformat()
+        rows = []
+        for uid, result in items:
+            result = result or {}
+            rows.append((
+                account, folder, uid,
+                result.get('sender'),
+                result.get('email'),
+                result.get('unsubscribe_link'),
+                result.get('method'),
+                result.get('provider'),
+                result.get('category'),
+                result.get('last_received'),
+                1 if result.get('one_click') else 0,
+                result.get('list_id'),
+                now
+            ))
+
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO scan_results
+                    (account, folder, uid, sender, email, unsubscribe_link, method,
+                     provider, category, last_received, one_click, list_id, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+        except sqlite3.Error as e:
+            store_logger.error(f"Failed to save scan results: {str(e)}")
+
+    def create_checkpoint(self, account: str, folder: str, uids: List[str],
+                          uidvalidity: Optional[str] = None) -> str:
+        """
+        Start tracking the progress of a scan
+
+        Args:
+            account: Email address being scanned
+            folder: IMAP folder name
+            uids: UIDs of all emails the scan will process, in order
+            uidvalidity: UIDVALIDITY of the folder the UIDs belong to
+
+        Returns:
+            str: Scan ID that can be used to resume the scan
+        """
+        scan_id = uuid.uuid4().hex
+        now = datetime.now()
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.execute(
+                'DELETE FROM scan_checkpoints WHERE updated_at < ?',
+                ((now - timedelta(days=CHECKPOINT_MAX_AGE_DAYS)).isoformat(),)
+            )
+            conn.execute('''
+                INSERT INTO scan_checkpoints
+                (scan_id, account, folder, uids, last_uid, status, created_at, updated_at, uidvalidity)
+                VALUES (?, ?, ?, ?, NULL, 'running', ?, ?, ?)
+            ''', (scan_id, account.lower(), folder, json.dumps(uids), now.isoformat(), now.isoformat(),
+                  uidvalidity))
+        return scan_id
+
+    def update_checkpoint(self, scan_id: str, last_uid: Optional[str], status: str = 'running'):
+        """
+        Move the cursor of a scan forward
+
+        Args:
+            scan_id: Scan ID returned by create_checkpoint
+            last_uid: UID up to which every email of the scan has been handled
+            status: 'running' or 'complete'
+        """
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                conn.execute(
+                    'UPDATE scan_checkpoints SET last_uid = ?, status = ?, updated_at = ? WHERE scan_id = ?',
+                    (last_uid, status, datetime.now().isoformat(), scan_id)
+                )
+        except sqlite3.Error as e:
+            store_logger.error(f"Failed to update checkpoint {scan_id}: {str(e)}")
+
+    def get_checkpoint(self, scan_id: str) -> Optional[Dict]:
+        """
+        Get the saved progress of a scan
+
+        Args:
+            scan_id: Scan ID returned by create_checkpoint
+
+        Returns:
+            dict: Checkpoint data, or None if the scan is unknown
+        """
+        row = self._get_connection().execute(
+            'SELECT * FROM scan_checkpoints WHERE scan_id = ?', (scan_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'scan_id': row['scan_id'],
+            'account': row['account'],
+            'folder': row['folder'],
+            'uids': json.loads(row['uids']),
+            'last_uid': row['last_uid'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'uidvalidity': row['uidvalidity']
+        }
+
+    def clear_account(self, account: str) -> int:
+        """
+        Remove all stored results for an account
+
+        Args:
+            account: Email address to clear
+
+        Returns:
+            int: Number of rows removed
+        """
+        account = account.lower()
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute('DELETE FROM scan_results WHERE account = ?', (account,))
+            conn.execute('DELETE FROM folder_state WHERE account = ?', (account,))
+            conn.execute('DELETE FROM scan_checkpoints WHERE account = ?', (account,))
+        return cursor.rowcount
@@ -1,4 +1,5 @@
 import imaplib
+import smtplib
 import ssl
 import logging
 import base64
@@ -12,7 +13,7 @@ class SecureEmailClient:
     Enhanced email client that supports both password and OAuth authentication.
     This class serves as a wrapper around EmailUnsubscriber with improved security features.
     """
-    def __init__(self, email, provider, oauth_handler=None):
+    def __init__(self, email, provider, oauth_handler=None, result_store=None, unsubscribe_executor=None):
         """
         Initialize the secure email client
         
@@ -20,15 +21,21 @@ class SecureEmailClient:
             email: User's email address
             provider: Email provider (gmail, outlook, etc.)
             oauth_handler: OAuthHandler instance for token-based authentication
+            result_store: ScanResultStore for serving previously scanned messages
+            unsubscribe_executor: UnsubscribeExecutor shared by bulk unsubscribe runs
         """
         self.email = email
         self.provider = provider
         self.oauth_handler = oauth_handler
+        self.result_store = result_store
+        self.unsubscribe_executor = unsubscribe_executor
         self.password = None
         self.unsubscriber = None
         self.is_oauth = False
         self.custom_server = None
         self.custom_port = None
+        self.custom_smtp_server = None
+        self.custom_smtp_port = None
     
     def set_password(self, password):
         """Set password for password-based authentication"""
@@ -40,6 +47,11 @@ class SecureEmailClient:
         self.custom_server = server
         self.custom_port = port
     
+    def set_custom_smtp(self, server, port):
+        """Set custom SMTP server details, used to unsubscribe from mailto: links"""
+        self.custom_smtp_server = server
+        self.custom_smtp_port = port
+    
     def authenticate(self):
         """
         Authenticate with the email provider
@@ -56,9 +68,13 @@ class SecureEmailClient:
                     return False
                 
                 # Create unsubscriber with email only
-                self.unsubscriber = EmailUnsubscriber(self.email, None)
+                self.unsubscriber = EmailUnsubscriber(self.email, None, result_store=self.result_store,
+                                                      unsubscribe_executor=self.unsubscribe_executor)
+                
+                if self.custom_smtp_server and self.custom_smtp_port:
+                    self.unsubscriber.set_custom_smtp(self.custom_smtp_server, self.custom_smtp_port)
                 
-                # Override the connect_to_email method to use OAuth
+                # Override the connect_to_email and connect_to_smtp methods to use OAuth
                 self._setup_oauth_connection(access_token)
             else:
                 # For password auth, use the standard EmailUnsubscriber
@@ -66,11 +82,14 @@ class SecureEmailClient:
                     client_logger.error("No password provided for password authentication")
                     return False
                 
-                self.unsubscriber = EmailUnsubscriber(self.email, self.password)
+                self.unsubscriber = EmailUnsubscriber(self.email, self.password, result_store=self.result_store,
+                                                      unsubscribe_executor=self.unsubscribe_executor)
                 
                 # Set custom IMAP if provided
                 if self.custom_server and self.custom_port:
                     self.unsubscriber.set_custom_imap(self.custom_server, self.custom_port)
+                if self.custom_smtp_server and self.custom_smtp_port:
+                    self.unsubscriber.set_custom_smtp(self.custom_smtp_server, self.custom_smtp_port)
             
             # Test connection by connecting to the email server
             mail = self.unsubscriber.connect_to_email()
@@ -111,7 +130,7 @@ class SecureEmailClient:
     
     def _setup_oauth_connection(self, access_token):
         """
-        Override the connect_to_email method in EmailUnsubscriber to use OAuth
+        Override the connect_to_email and connect_to_smtp methods in EmailUnsubscriber to use OAuth
         
         Args:
             access_token: OAuth access token
@@ -153,22 +172,75 @@ class SecureEmailClient:
                 client_logger.error(f"Unexpected error during OAuth connection: {str(e)}")
                 raise ConnectionError(f"Unexpected error connecting with OAuth: {str(e)}")
         
-        # Replace the connect method
+        original_connect_smtp = self.unsubscriber.connect_to_smtp
+        
+        def oauth_connect_smtp():
+            domain = self.email.split('@')[-1].lower()
+            
+            if domain == 'gmail.com':
+                server = "smtp.gmail.com"
+                port = 465
+            elif domain in ['outlook.com', 'hotmail.com', 'live.com', 'msn.com']:
+                server = "smtp.office365.com"
+                port = 587
+            elif self.custom_smtp_server and self.custom_smtp_port:
+                server = self.custom_smtp_server
+                port = self.custom_smtp_port
+            else:
+                # Fall back to original connection method for other providers
+                return original_connect_smtp()
+            
+            try:
+                smtp = self.unsubscriber.open_smtp(server, port)
+                
+                # Authenticate with OAuth2, smtplib base64-encodes the response itself
+                auth_string = f'user={self.email}\1auth=Bearer {access_token}\1\1'
+                smtp.auth('XOAUTH2', lambda challenge=None: auth_string)
+                
+                return smtp
+            except smtplib.SMTPException as e:
+                client_logger.error(f"SMTP error during OAuth connection: {str(e)}")
+                raise ConnectionError(f"Failed to connect to SMTP with OAuth: {str(e)}")
+            except Exception as e:
+                client_logger.error(f"Unexpected error during OAuth SMTP connection: {str(e)}")
+                raise ConnectionError(f"Unexpected error connecting to SMTP with OAuth: {str(e)}")
+        
+        # Replace the connect methods
         self.unsubscriber.connect_to_email = oauth_connect
+        self.unsubscriber.connect_to_smtp = oauth_connect_smtp
     
-    def find_unsubscribe_links(self, num_emails=50, folder="INBOX"):
+    def find_unsubscribe_links(self, num_emails=50, folder="INBOX", time_budget=None, resume_token=None):
         """Find unsubscribe links in emails"""
         if not self.unsubscriber:
             raise ValueError("Not authenticated. Call authenticate() first.")
         
-        return self.unsubscriber.find_unsubscribe_links(num_emails, folder)
+        return self.unsubscriber.find_unsubscribe_links(num_emails, folder, time_budget, resume_token)
+    
+    def iter_unsubscribe_links(self, num_emails=50, folder="INBOX", time_budget=None, resume_token=None):
+        """Find unsubscribe links in emails, yielding result and progress events as they happen"""
+        if not self.unsubscriber:
+            raise ValueError("Not authenticated. Call authenticate() first.")
+        
+        return self.unsubscriber.iter_unsubscribe_links(num_emails, folder, time_budget, resume_token)
+    
+    @property
+    def continuation_token(self):
+        """Token to resume the last scan if it stopped on its time budget"""
+        return self.unsubscriber.continuation_token if self.unsubscriber else None
+    
+    def unsubscribe(self, link, one_click=False, send_mailto=False):
+        """Attempt to unsubscribe using provided link (one_click: sender supports RFC 8058)"""
+        if not self.unsubscriber:
+            raise ValueError("Not authenticated. Call authenticate() first.")
+        
+        return self.unsubscriber.unsubscribe(link, one_click, send_mailto)
     
-    def unsubscribe(self, link):
-        """Attempt to unsubscribe using provided link"""
+    def unsubscribe_detailed(self, link, one_click=False, send_mailto=False):
+        """Attempt to unsubscribe using provided link, returning success, error and status_code"""
         if not self.unsubscriber:
             raise ValueError("Not authenticated. Call authenticate() first.")
         
-        return self.unsubscriber.unsubscribe(link)
+        return self.unsubscriber.unsubscribe_detailed(link, one_click, send_mailto)
     
     def bulk_unsubscribe(self, links):
         """Attempt to unsubscribe from multiple links"""
@@ -177,6 +249,15 @@ class SecureEmailClient:
         
         return self.unsubscriber.bulk_unsubscribe(links)
     
+    def bulk_unsubscribe_detailed(self, links, one_click_links=None, on_result=None, cancel_event=None,
+                                  mailto_links=None):
+        """Attempt to unsubscribe from multiple links, with per-link errors and timing"""
+        if not self.unsubscriber:
+            raise ValueError("Not authenticated. Call authenticate() first.")
+        
+        return self.unsubscriber.bulk_unsubscribe_detailed(links, one_click_links, on_result, cancel_event,
+                                                           mailto_links)
+    
     def get_subscription_stats(self):
         """Get statistics about subscriptions"""
         if not self.unsubscriber:
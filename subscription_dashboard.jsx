@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { LineChart, BarChart, Bar, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 
 const SubscriptionDashboard = () => {
@@ -15,12 +15,22 @@ const SubscriptionDashboard = () => {
   const [selectedCategory, setSelectedCategory] = useState('all');
   const [bulkSelection, setBulkSelection] = useState([]);
   const [bulkUnsubscribing, setBulkUnsubscribing] = useState(false);
+  const [unsubscribeJob, setUnsubscribeJob] = useState(null);
+  const [linkStatus, setLinkStatus] = useState({});
   const [scheduledScan, setScheduledScan] = useState(null);
   const [scheduleScanOpen, setScheduleScanOpen] = useState(false);
   const [scheduleForm, setScheduleForm] = useState({
     frequency: 'weekly',
     num_emails: 100
   });
+  const [scanning, setScanning] = useState(false);
+  const [scanProgress, setScanProgress] = useState({ processed: 0, total: 0, found: 0 });
+  const [subscriptionPage, setSubscriptionPage] = useState({ rows: null, nextCursor: null, total: 0 });
+  const [loadingPage, setLoadingPage] = useState(false);
+  // Version and ETag of the last full or delta response, so refreshes only fetch changes
+  const syncState = useRef({ version: null, etag: null });
+  // Current category filter, for fetches that finish after the filter changed
+  const selectedCategoryRef = useRef('all');
 
   // CHART COLORS
   const COLORS = [
@@ -31,21 +41,95 @@ const SubscriptionDashboard = () => {
 
   // Load subscription data on component mount
   useEffect(() => {
-    fetchSubscriptionData();
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('stream')) {
+      // Coming from the login form: stream the scan instead of waiting for it
+      streamScan(params.get('num_emails') || 100);
+    } else {
+      fetchSubscriptionData();
+    }
     fetchScheduledScans();
   }, []);
 
-  const fetchSubscriptionData = async () => {
-    setLoading(true);
+  const streamScan = (numEmails) => {
+    setLoading(false);
+    setScanning(true);
+    syncState.current = { version: null, etag: null };
+    setScanProgress({ processed: 0, total: 0, found: 0 });
+    setData(prev => ({ ...prev, subscriptions: [], stats: { total_found: 0, categories: {} } }));
+
+    const source = new EventSource(`/api/scan_stream?num_emails=${numEmails}`);
+
+    // Render each subscription as soon as the server finds it
+    source.addEventListener('subscription', (event) => {
+      const subscription = JSON.parse(event.data);
+      setData(prev => {
+        const categories = { ...prev.stats.categories };
+        categories[subscription.category] = (categories[subscription.category] || 0) + 1;
+        return {
+          ...prev,
+          subscriptions: [...prev.subscriptions, subscription],
+          stats: { ...prev.stats, total_found: prev.subscriptions.length + 1, categories }
+        };
+      });
+    });
+
+    source.addEventListener('progress', (event) => {
+      setScanProgress(JSON.parse(event.data));
+    });
+
+    source.addEventListener('done', (event) => {
+      const summary = JSON.parse(event.data);
+      source.close();
+      setScanProgress(summary);
+      setScanning(false);
+      window.history.replaceState(null, '', '/dashboard');
+      // Pick up analytics for the completed scan without hiding the rendered results
+      fetchSubscriptionData(false);
+    });
+
+    source.addEventListener('error', (event) => {
+      source.close();
+      setScanning(false);
+      if (event.data) {
+        setError(JSON.parse(event.data).message || 'Scan failed');
+      }
+    });
+  };
+
+  const fetchSubscriptionData = async (showSpinner = true) => {
+    if (showSpinner) {
+      setLoading(true);
+    }
     try {
-      const response = await fetch('/api/subscription_data');
+      const { version, etag } = syncState.current;
+      const response = await fetch(version ? `/api/subscription_data?since=${version}` : '/api/subscription_data', {
+        headers: etag ? { 'If-None-Match': etag } : {}
+      });
+      if (response.status === 304) {
+        // Nothing changed since the last load
+        return;
+      }
       if (!response.ok) {
         throw new Error(`HTTP error ${response.status}`);
       }
       const jsonData = await response.json();
       
+      if (jsonData.status === 'pending') {
+        // A background scan is running: show its partial results, then reload
+        setLoading(false);
+        await waitForScanJob(jsonData.job_id);
+        return fetchSubscriptionData(false);
+      }
+      
       if (jsonData.status === 'success') {
-        setData(jsonData);
+        syncState.current = { version: jsonData.version || null, etag: response.headers.get('ETag') };
+        if (jsonData.mode === 'delta') {
+          setData(prev => applyDelta(prev, jsonData));
+        } else {
+          setData(jsonData);
+        }
+        fetchSubscriptionPage(selectedCategoryRef.current);
       } else {
         setError(jsonData.message || 'Failed to load subscription data');
       }
@@ -56,6 +140,90 @@ const SubscriptionDashboard = () => {
     }
   };
 
+  // Merge the added, updated and removed subscriptions of a delta response into the current data
+  const applyDelta = (prev, delta) => {
+    const changed = {};
+    delta.updated.forEach(sub => { changed[sub.email_id] = sub; });
+    const removed = new Set(delta.removed);
+    const subscriptions = prev.subscriptions
+      .filter(sub => !removed.has(String(sub.email_id)))
+      .map(sub => changed[sub.email_id] || sub);
+    const { added, updated, removed: _removed, mode, since, ...rest } = delta;
+    return { ...prev, ...rest, subscriptions: [...subscriptions, ...added] };
+  };
+
+  // Load a page of the subscriptions table, filtered and sorted on the server
+  const fetchSubscriptionPage = async (category, cursor = null) => {
+    setLoadingPage(true);
+    try {
+      const params = new URLSearchParams({ page_size: 100, sort: 'date' });
+      if (category && category !== 'all') {
+        params.set('category', category);
+      }
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const response = await fetch(`/api/subscriptions?${params}`);
+      if (!response.ok) {
+        // Fall back to filtering the full list in the browser
+        setSubscriptionPage({ rows: null, nextCursor: null, total: 0 });
+        return;
+      }
+      const jsonData = await response.json();
+      if (category !== selectedCategoryRef.current) {
+        // The filter changed while this page loaded, its own request fills the table
+        return;
+      }
+      setSubscriptionPage(prev => ({
+        rows: cursor && prev.rows ? [...prev.rows, ...jsonData.subscriptions] : jsonData.subscriptions,
+        nextCursor: jsonData.page.next_cursor,
+        total: jsonData.page.total
+      }));
+    } catch (err) {
+      setSubscriptionPage({ rows: null, nextCursor: null, total: 0 });
+    } finally {
+      setLoadingPage(false);
+    }
+  };
+
+  const waitForScanJob = async (jobId) => {
+    setScanning(true);
+    syncState.current = { version: null, etag: null };
+    let received = 0;
+    try {
+      while (true) {
+        const response = await fetch(`/api/scan_jobs/${jobId}?offset=${received}`);
+        if (!response.ok) {
+          throw new Error(`HTTP error ${response.status}`);
+        }
+        const { job } = await response.json();
+        received += job.results.length;
+        setScanProgress({ ...job.progress });
+
+        if (job.results.length > 0) {
+          setData(prev => {
+            const subscriptions = received === job.results.length ? job.results : [...prev.subscriptions, ...job.results];
+            const categories = {};
+            subscriptions.forEach(sub => {
+              categories[sub.category] = (categories[sub.category] || 0) + 1;
+            });
+            return { ...prev, subscriptions, stats: { ...prev.stats, total_found: subscriptions.length, categories } };
+          });
+        }
+
+        if (job.status === 'failed') {
+          throw new Error(job.error || 'Scan failed');
+        }
+        if (job.status === 'complete') {
+          return;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+      }
+    } finally {
+      setScanning(false);
+    }
+  };
+
   const fetchScheduledScans = async () => {
     try {
       const response = await fetch('/api/get_scheduled_scans');
@@ -86,17 +254,24 @@ const SubscriptionDashboard = () => {
   };
 
   const handleSelectAll = () => {
-    if (bulkSelection.length === filteredSubscriptions.length) {
+    if (bulkSelection.length === selectableSubscriptions.length) {
       // Deselect all if all are selected
       setBulkSelection([]);
     } else {
       // Select all if some or none are selected
-      setBulkSelection(filteredSubscriptions.map(sub => sub.email_id));
+      setBulkSelection(selectableSubscriptions.map(sub => sub.email_id));
     }
   };
 
   const handleCategoryFilter = (category) => {
     setSelectedCategory(category);
+    selectedCategoryRef.current = category;
+    setBulkSelection([]);
+    fetchSubscriptionPage(category);
+  };
+
+  const handleLoadMore = () => {
+    fetchSubscriptionPage(selectedCategory, subscriptionPage.nextCursor);
   };
 
   const handleRefresh = () => {
@@ -107,18 +282,23 @@ const SubscriptionDashboard = () => {
     window.location.href = '/api/export_csv';
   };
 
-  const handleUnsubscribe = async (link, sender) => {
+  const handleUnsubscribe = async (link, sender, oneClick = false, listId = null, confirmMailto = false) => {
     try {
       const response = await fetch('/unsubscribe', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ link, sender }),
+        body: JSON.stringify({ link, sender, one_click: oneClick, list_id: listId, confirm_mailto: confirmMailto }),
       });
       
       const result = await response.json();
       
+      if (result.confirm_required) {
+        // An unsubscribe email from the message body is only sent once the user agrees to it
+        return window.confirm(result.message) ? handleUnsubscribe(link, sender, oneClick, listId, true) : false;
+      }
+      
       if (result.status === 'success') {
         // Update local state to reflect the unsubscription
         fetchSubscriptionData();
@@ -144,6 +324,8 @@ const SubscriptionDashboard = () => {
       return {
         link: subscription.unsubscribe_link,
         sender: subscription.sender,
+        one_click: subscription.one_click,
+        list_id: subscription.list_id,
         email_id: id
       };
     });
@@ -159,24 +341,76 @@ const SubscriptionDashboard = () => {
       
       const result = await response.json();
       
-      if (result.status === 'success') {
-        // Show success/failure summary
-        const { succeeded, failed } = result.summary;
-        alert(`Unsubscribe summary:\n- Successfully unsubscribed: ${succeeded}\n- Failed: ${failed}`);
-        
-        // Clear selection and refresh data
-        setBulkSelection([]);
-        fetchSubscriptionData();
+      if (result.status === 'pending') {
+        // The links are processed in the background, follow the job's progress
+        setUnsubscribeJob({ ...result, processed: 0, succeeded: 0, failed: 0 });
+        followUnsubscribeJob(result);
       } else {
         alert(`Bulk unsubscribe failed: ${result.message}`);
+        setBulkUnsubscribing(false);
       }
     } catch (error) {
       alert(`Error: ${error.message}`);
-    } finally {
       setBulkUnsubscribing(false);
     }
   };
 
+  const followUnsubscribeJob = (job) => {
+    const source = new EventSource(job.streamUrl);
+
+    source.addEventListener('link', (event) => {
+      const link = JSON.parse(event.data);
+      setLinkStatus(prev => ({ ...prev, [link.email_id]: link.status }));
+    });
+
+    source.addEventListener('progress', (event) => {
+      const progress = JSON.parse(event.data);
+      setUnsubscribeJob(prev => prev && { ...prev, ...progress });
+    });
+
+    source.addEventListener('done', async (event) => {
+      source.close();
+      const { status, succeeded, failed } = JSON.parse(event.data);
+      try {
+        // Polling the finished job adds its unsubscribes to the session total
+        await fetch(job.statusUrl);
+      } finally {
+        setUnsubscribeJob(null);
+        setBulkUnsubscribing(false);
+        setBulkSelection([]);
+        fetchSubscriptionData();
+      }
+      alert(`Unsubscribe summary${status === 'cancelled' ? ' (cancelled)' : ''}:\n- Successfully unsubscribed: ${succeeded}\n- Failed: ${failed}`);
+    });
+
+    source.addEventListener('error', (event) => {
+      // Sent by the server when the job disappears; connection errors carry no data
+      if (event.data) {
+        source.close();
+        setUnsubscribeJob(null);
+        setBulkUnsubscribing(false);
+        fetchSubscriptionData();
+        alert(JSON.parse(event.data).message || 'Unsubscribe job failed');
+      }
+    });
+
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        setUnsubscribeJob(null);
+        setBulkUnsubscribing(false);
+      }
+    };
+  };
+
+  const handleCancelUnsubscribe = async () => {
+    if (!unsubscribeJob) return;
+    try {
+      await fetch(unsubscribeJob.cancelUrl, { method: 'POST' });
+    } catch (error) {
+      alert(`Error: ${error.message}`);
+    }
+  };
+
   const handleScheduleScan = async () => {
     try {
       const response = await fetch('/api/schedule_scan', {
@@ -223,11 +457,14 @@ const SubscriptionDashboard = () => {
     }
   };
 
-  // Filter subscriptions based on selected category
-  const filteredSubscriptions = data.subscriptions.filter(sub => 
+  // Use the server-side page once loaded, filter in the browser while a scan is still streaming in
+  const filteredSubscriptions = (!scanning && subscriptionPage.rows) || data.subscriptions.filter(sub => 
     selectedCategory === 'all' || sub.category === selectedCategory
   );
 
+  // Subscriptions the account already unsubscribed from are left out of bulk runs
+  const selectableSubscriptions = filteredSubscriptions.filter(sub => !sub.unsubscribed);
+
   // Prepare data for category chart
   const categoryData = Object.entries(data.stats.categories || {}).map(([name, count]) => ({
     name,
@@ -267,6 +504,21 @@ const SubscriptionDashboard = () => {
 
   return (
     <div className="container mx-auto p-4">
+      {/* LIVE SCAN PROGRESS */}
+      {scanning && (
+        <div className="mb-4 bg-blue-50 border border-blue-200 text-blue-800 px-4 py-3 rounded">
+          <p className="text-sm font-medium">
+            Scanning inbox... {scanProgress.processed} of {scanProgress.total || '?'} emails checked, {data.subscriptions.length} subscriptions found
+          </p>
+          <div className="w-full bg-blue-100 rounded-full h-2 mt-2">
+            <div
+              className="bg-blue-500 h-2 rounded-full"
+              style={{ width: `${scanProgress.total ? Math.round(100 * scanProgress.processed / scanProgress.total) : 0}%` }}
+            ></div>
+          </div>
+        </div>
+      )}
+
       {/* DASHBOARD TABS */}
       <div className="mb-6">
         <div className="border-b border-gray-200">
@@ -443,7 +695,7 @@ const SubscriptionDashboard = () => {
                           <td className="px-6 py-4 whitespace-nowrap text-sm">
                             {subscription && subscription.unsubscribe_link ? (
                               <button
-                                onClick={() => handleUnsubscribe(subscription.unsubscribe_link, subscription.sender)}
+                                onClick={() => handleUnsubscribe(subscription.unsubscribe_link, subscription.sender, subscription.one_click, subscription.list_id)}
                                 className="text-red-600 hover:text-red-900"
                               >
                                 Unsubscribe
@@ -512,7 +764,7 @@ const SubscriptionDashboard = () => {
                         <circle className="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" strokeWidth="4"></circle>
                         <path className="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
                       </svg>
-                      Processing...
+                      {unsubscribeJob ? `Processing ${unsubscribeJob.processed} of ${unsubscribeJob.total}...` : 'Processing...'}
                     </>
                   ) : (
                     <>
@@ -524,6 +776,14 @@ const SubscriptionDashboard = () => {
                   )}
                 </button>
               )}
+              {unsubscribeJob && (
+                <button
+                  onClick={handleCancelUnsubscribe}
+                  className="flex items-center px-4 py-2 bg-gray-200 text-gray-700 rounded hover:bg-gray-300"
+                >
+                  Cancel
+                </button>
+              )}
               <button
                 onClick={handleExportCSV}
                 className="flex items-center px-4 py-2 bg-green-600 text-white rounded hover:bg-green-700"
@@ -544,7 +804,7 @@ const SubscriptionDashboard = () => {
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase">
                       <input
                         type="checkbox"
-                        checked={bulkSelection.length === filteredSubscriptions.length && filteredSubscriptions.length > 0}
+                        checked={bulkSelection.length === selectableSubscriptions.length && selectableSubscriptions.length > 0}
                         onChange={handleSelectAll}
                         className="h-4 w-4 text-blue-600 focus:ring-blue-500 border-gray-300 rounded"
                       />
@@ -569,6 +829,7 @@ const SubscriptionDashboard = () => {
                           <input
                             type="checkbox"
                             checked={bulkSelection.includes(subscription.email_id)}
+                            disabled={subscription.unsubscribed}
                             onChange={() => handleBulkSelection(subscription.email_id)}
                             className="h-4 w-4 text-blue-600 focus:ring-blue-500 border-gray-300 rounded"
                           />
@@ -588,9 +849,15 @@ const SubscriptionDashboard = () => {
                           {subscription.last_received}
                         </td>
                         <td className="px-6 py-4 whitespace-nowrap text-sm">
-                          {subscription.unsubscribe_link ? (
+                          {linkStatus[subscription.email_id] && linkStatus[subscription.email_id] !== 'pending' ? (
+                            <span className={['succeeded', 'skipped'].includes(linkStatus[subscription.email_id]) ? 'text-green-600' : 'text-gray-500'}>
+                              {linkStatus[subscription.email_id] === 'succeeded' ? 'Unsubscribed' : linkStatus[subscription.email_id] === 'skipped' ? 'Already unsubscribed' : linkStatus[subscription.email_id] === 'failed' ? 'Failed' : 'Cancelled'}
+                            </span>
+                          ) : subscription.unsubscribed ? (
+                            <span className="text-green-600">Already unsubscribed</span>
+                          ) : subscription.unsubscribe_link ? (
                             <button
-                              onClick={() => handleUnsubscribe(subscription.unsubscribe_link, subscription.sender)}
+                              onClick={() => handleUnsubscribe(subscription.unsubscribe_link, subscription.sender, subscription.one_click, subscription.list_id)}
                               className="text-red-600 hover:text-red-900"
                             >
                               Unsubscribe
@@ -605,6 +872,22 @@ const SubscriptionDashboard = () => {
                 </tbody>
               </table>
             </div>
+            {!scanning && subscriptionPage.nextCursor && (
+              <div className="px-6 py-4 border-t border-gray-200 flex justify-between items-center">
+                <span className="text-sm text-gray-500">
+                  Showing {filteredSubscriptions.length} of {subscriptionPage.total} subscriptions
+                </span>
+                <button
+                  onClick={handleLoadMore}
+                  disabled={loadingPage}
+                  className={`px-4 py-2 bg-gray-200 text-gray-700 rounded ${
+                    loadingPage ? 'opacity-50 cursor-not-allowed' : 'hover:bg-gray-300'
+                  }`}
+                >
+                  {loadingPage ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
       )}
@@ -891,7 +1174,7 @@ const SubscriptionDashboard = () => {
             <h3 className="text-lg font-semibold text-gray-800 mb-4">About CleanInbox</h3>
             <div className="text-gray-600">
               <p className="mb-2">Version: 2.0.0</p>
-              <p className="mb-2">Last Scan: {data.cached ? `${data.cache_age} minutes ago` : 'Just now'}</p>
+              <p className="mb-2">Last Scan: {data.cached && data.last_scan_time ? `${Math.round((Date.now() - new Date(data.last_scan_time)) / 60000)} minutes ago` : 'Just now'}</p>
               <p>
                 CleanInbox helps you take control of your inbox by finding and managing your subscriptions.
                 For support or feedback, please visit our GitHub repository.
@@ -0,0 +1,161 @@
+import re
+import base64
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+SORT_KEYS = ('sender', 'date', 'volume')
+DEFAULT_ORDER = {'sender': 'asc', 'date': 'desc', 'volume': 'desc'}
+
+# Number of recent filtered queries kept per index
+QUERY_CACHE_SIZE = 32
+
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def encode_cursor(data_id, offset):
+    """Encode a pagination cursor for the given results ID and offset"""
+    return base64.urlsafe_b64encode(f"{data_id}:{offset}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, data_id):
+    """
+    Decode a pagination cursor
+
+    Args:
+        cursor: Cursor returned with a previous page
+        data_id: ID of the results currently being paginated
+
+    Returns:
+        int: Offset of the next page
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to different results
+    """
+    try:
+        cursor_data_id, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit(':', 1)
+        offset = int(offset)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_data_id != data_id:
+        raise ValueError("Cursor belongs to older scan results")
+    return max(0, offset)
+
+
+class SubscriptionIndex:
+    """
+    Precomputed sort orders, filters and counts over one user's stored subscriptions.
+    Built once per stored result set so paginated queries do not rescan the whole list.
+    """
+    def __init__(self, subscriptions):
+        """
+        Build the indexes
+
+        Args:
+            subscriptions: List of processed subscription dictionaries
+        """
+        self.subscriptions = subscriptions
+        self.category_positions = defaultdict(list)
+        self.method_positions = defaultdict(list)
+        self.search_text = []
+        sender_keys = []
+
+        for position, sub in enumerate(subscriptions):
+            self.category_positions[sub.get('category') or 'Unknown'].append(position)
+            self.method_positions[sub.get('method') or 'unknown'].append(position)
+            sender_keys.append(str(sub.get('sender') or '').lower())
+            self.search_text.append(' '.join(
+                str(sub.get(field) or '') for field in ('sender', 'email', 'category', 'unsubscribe_link')
+            ).lower())
+
+        self.category_counts = {category: len(positions) for category, positions in self.category_positions.items()}
+        self.method_counts = {method: len(positions) for method, positions in self.method_positions.items()}
+
+        # Volume is the number of scanned emails from the same sender
+        sender_volume = Counter(sender_keys)
+        self.volumes = [sender_volume[key] for key in sender_keys]
+
+        positions = range(len(subscriptions))
+        by_sender = sorted(positions, key=lambda p: sender_keys[p])
+        by_volume = sorted(positions, key=lambda p: (self.volumes[p], sender_keys[p]))
+        dated = [p for p in positions if DATE_PATTERN.match(str(subscriptions[p].get('last_received') or ''))]
+        undated = [p for p in by_sender if not DATE_PATTERN.match(str(subscriptions[p].get('last_received') or ''))]
+        by_date = sorted(dated, key=lambda p: (subscriptions[p]['last_received'], sender_keys[p]))
+
+        # Emails without a parseable date go last in both directions
+        self.sort_orders = {
+            ('sender', 'asc'): by_sender,
+            ('sender', 'desc'): by_sender[::-1],
+            ('volume', 'asc'): by_volume,
+            ('volume', 'desc'): by_volume[::-1],
+            ('date', 'asc'): by_date + undated,
+            ('date', 'desc'): by_date[::-1] + undated
+        }
+        self._query_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def query(self, sort='date', order=None, category=None, method=None, text=None):
+        """
+        Get the positions of the subscriptions matching a query, in sorted order
+
+        Args:
+            sort: Sort key ('sender', 'date' or 'volume')
+            order: 'asc' or 'desc' (defaults depend on the sort key)
+            category: Only include this category
+            method: Only include this unsubscribe method
+            text: Only include subscriptions whose sender, email, category or link contains this text
+
+        Returns:
+            list: Positions into self.subscriptions
+
+        Raises:
+            ValueError: If the sort key or order is not supported
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort}")
+        order = order or DEFAULT_ORDER[sort]
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Unsupported sort order: {order}")
+        text = text.strip().lower() if text else None
+
+        cache_key = (sort, order, category, method, text)
+        with self._cache_lock:
+            if cache_key in self._query_cache:
+                self._query_cache.move_to_end(cache_key)
+                return self._query_cache[cache_key]
+
+        ordered = self.sort_orders[(sort, order)]
+        if category or method or text:
+            allowed = None
+            if category:
+                allowed = set(self.category_positions.get(category, ()))
+            if method:
+                method_set = set(self.method_positions.get(method, ()))
+                allowed = method_set if allowed is None else allowed & method_set
+            ordered = [p for p in ordered
+                       if (allowed is None or p in allowed) and (not text or text in self.search_text[p])]
+
+        with self._cache_lock:
+            self._query_cache[cache_key] = ordered
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return ordered
+
+    def page(self, offset=0, page_size=50, **query):
+        """
+        Get one page of subscriptions matching a query
+
+        Args:
+            offset: Index of the first subscription of the page
+            page_size: Number of subscriptions per page
+            **query: Arguments for query()
+
+        Returns:
+            tuple: (list of subscriptions on the page, total number of matches)
+        """
+        positions = self.query(**query)
+        rows = []
+        for position in positions[offset:offset + page_size]:
+            row = dict(self.subscriptions[position])
+            row['volume'] = self.volumes[position]
+            rows.append(row)
+        return rows, len(positions)
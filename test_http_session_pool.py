@@ -0,0 +1,156 @@
+"""
+Offline tests of the DNS cache and circuit breaker in the shared HTTP session pool.
+
+Host names are resolved by a stub resolver pointing them at a local HTTP server,
+so no request reaches the network or the system resolver.
+
+Usage:
+    python -m unittest test_http_session_pool
+"""
+import sys
+import time
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from circuit_breaker import HostCircuitBreaker
+from dns_cache import DnsCache
+from http_session_pool import CircuitOpenError, HttpSessionPool, PoolTimeoutError
+
+
+class UnsubscribeHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the Host header it received, with 200 or the status of a /status/<code> path"""
+    def do_GET(self):
+        body = self.headers['Host'].encode('utf-8')
+        status = int(self.path.split('/')[2]) if self.path.startswith('/status/') else 200
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubResolver:
+    """Resolver for DnsCache mapping known host names to the local server, counting lookups"""
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.lookups = []
+        self.lock = threading.Lock()
+
+    def __call__(self, host):
+        with self.lock:
+            self.lookups.append(host)
+        if host not in self.hosts:
+            raise socket.gaierror(socket.EAI_NONAME, f"Unknown host {host}")
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (self.hosts[host], 0))]
+
+
+class CachedDnsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), UnsubscribeHandler)
+        cls.port = cls.server.server_address[1]
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def make_pool(self, ttl=300, negative_ttl=30, failure_threshold=100, **options):
+        hosts = {f"list{i}.example": '127.0.0.1' for i in range(5)}
+        hosts['fqdn.example.'] = '127.0.0.1'
+        self.resolver = StubResolver(hosts)
+        self.dns_cache = DnsCache(ttl=ttl, negative_ttl=negative_ttl, resolver=self.resolver)
+        pool = HttpSessionPool(retries=0, timeout=5, dns_cache=self.dns_cache,
+                               circuit_breaker=HostCircuitBreaker(failure_threshold=failure_threshold), **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def url(self, host, path='/unsubscribe'):
+        return f"http://{host}:{self.port}{path}"
+
+    def test_requests_use_stub_addresses_and_keep_the_host_name(self):
+        pool = self.make_pool()
+        response = pool.get(self.url('list0.example'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, f"list0.example:{self.port}")
+        self.assertEqual(self.resolver.lookups, ['list0.example'])
+
+    def test_resolved_host_is_cached(self):
+        pool = self.make_pool()
+        for _ in range(3):
+            pool.get(self.url('list1.example'))
+        self.assertEqual(self.resolver.lookups, ['list1.example'])
+        self.assertEqual(self.dns_cache.get_stats()['lookups'], 1)
+
+    def test_prefetch_resolves_each_host_of_a_batch_once(self):
+        pool = self.make_pool()
+        urls = [self.url(f"list{i % 5}.example", f"/u/{i}") for i in range(20)] + ['mailto:leave@list0.example']
+        self.assertEqual(pool.prefetch_dns(urls), 5)
+        self.assertEqual(sorted(self.resolver.lookups), [f"list{i}.example" for i in range(5)])
+
+        for url in urls[:20]:
+            self.assertEqual(pool.get(url).status_code, 200)
+        self.assertEqual(len(self.resolver.lookups), 5)
+        self.assertEqual(pool.prefetch_dns(urls), 0)
+
+    def test_failed_lookup_is_cached_for_the_negative_ttl(self):
+        pool = self.make_pool()
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                pool.get(self.url('gone.example'))
+        self.assertEqual(self.resolver.lookups, ['gone.example'])
+
+    def test_expired_host_is_resolved_again(self):
+        pool = self.make_pool(ttl=0.05)
+        pool.get(self.url('list2.example'))
+        time.sleep(0.1)
+        pool.get(self.url('list2.example'))
+        self.assertEqual(self.resolver.lookups, ['list2.example', 'list2.example'])
+
+    def test_fully_qualified_host_is_resolved_with_its_trailing_dot(self):
+        pool = self.make_pool()
+        self.assertEqual(pool.get(self.url('fqdn.example.')).status_code, 200)
+        self.assertEqual(self.resolver.lookups, ['fqdn.example.'])
+
+    def test_new_connection_raises_the_connect_audit_event(self):
+        pool = self.make_pool()
+        events = []
+        recording = [True]
+        self.addCleanup(recording.clear)
+        sys.addaudithook(lambda event, args: recording and event == 'http.client.connect'
+                         and events.append(args[1:]))
+        pool.get(self.url('list0.example'))
+        self.assertEqual(events, [('list0.example', self.port)])
+
+    def test_any_5xx_response_trips_the_circuit(self):
+        pool = self.make_pool(failure_threshold=2)
+        for _ in range(2):
+            self.assertEqual(pool.get(self.url('list3.example', '/status/500')).status_code, 500)
+        with self.assertRaises(CircuitOpenError):
+            pool.get(self.url('list3.example'))
+
+    def test_4xx_response_does_not_count_against_the_host(self):
+        pool = self.make_pool(failure_threshold=2)
+        for _ in range(3):
+            self.assertEqual(pool.get(self.url('list4.example', '/status/404')).status_code, 404)
+        self.assertEqual(pool.get(self.url('list4.example')).status_code, 200)
+
+    def test_unreleased_connection_only_blocks_for_the_pool_timeout(self):
+        pool = self.make_pool(per_host=1, pool_timeout=0.2)
+        leaked = pool.get(self.url('list0.example'), stream=True)
+        self.addCleanup(leaked.close)
+        start = time.monotonic()
+        with self.assertRaises(PoolTimeoutError):
+            pool.get(self.url('list0.example'))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertFalse(pool.circuit_breaker.is_open('list0.example'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+"""
+Offline tests of mailto: unsubscribe requests.
+
+Most tests hand MailtoSender a stand-in SMTP connection through its connect_fn hook.
+SmtpSessionTest drives the real connect path (STARTTLS, password and XOAUTH2 login,
+reconnecting) against a local aiosmtpd server, and is skipped without aiosmtpd or openssl.
+No message leaves the machine.
+
+Usage:
+    python -m unittest test_mailto_sender
+"""
+import ssl
+import base64
+import shutil
+import socket
+import smtplib
+import asyncio
+import tempfile
+import threading
+import unittest
+import subprocess
+from email_unsubscriber import EmailUnsubscriber, MAILTO_NOT_ALLOWED
+from mailto_sender import MailtoSender
+from secure_email_client import SecureEmailClient
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+ACCOUNT = 'me@example.com'
+PASSWORD = 'app-password'
+ACCESS_TOKEN = 'access-token'
+
+
+class StubSmtp:
+    """Stand-in for an authenticated smtplib.SMTP connection that keeps the messages sent"""
+    def __init__(self, refused=None, disconnect_after=None):
+        self.refused = refused or {}
+        self.disconnect_after = disconnect_after
+        self.messages = []
+        self.closed = False
+
+    def send_message(self, message, from_addr, to_addrs):
+        if self.disconnect_after is not None and len(self.messages) >= self.disconnect_after:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.messages.append((message, from_addr, list(to_addrs)))
+        return {address: self.refused[address] for address in to_addrs if address in self.refused}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class StubSmtpServer:
+    """connect_fn for MailtoSender, handing out new StubSmtp connections and counting them"""
+    def __init__(self, **options):
+        self.options = options
+        self.connections = []
+
+    def __call__(self):
+        connection = StubSmtp(**self.options)
+        self.connections.append(connection)
+        return connection
+
+    @property
+    def messages(self):
+        return [message for connection in self.connections for message in connection.messages]
+
+
+class MailtoSenderTest(unittest.TestCase):
+    def test_sends_subject_and_body_of_each_link_over_one_connection(self):
+        server = StubSmtpServer()
+        results = MailtoSender('me@example.com', server).send_all([
+            'mailto:leave@list.example?subject=Unsubscribe%20123&body=Remove%20me',
+            'mailto:off@news.example?cc=boss@example.com'
+        ])
+
+        self.assertEqual([result['success'] for result in results], [True, True])
+        self.assertEqual(len(server.connections), 1)
+        self.assertTrue(server.connections[0].closed)
+        (first, from_addr, to_addrs), (second, _, second_to) = server.messages
+        self.assertEqual((from_addr, to_addrs), ('me@example.com', ['leave@list.example']))
+        self.assertEqual(first['Subject'], 'Unsubscribe 123')
+        self.assertEqual(first.get_content().strip(), 'Remove me')
+        self.assertEqual(second['Subject'], 'unsubscribe')
+        self.assertEqual(second_to, ['off@news.example'])
+
+    def test_refused_recipient_is_reported(self):
+        server = StubSmtpServer(refused={'gone@list.example': (550, b'No such user')})
+        result = MailtoSender('me@example.com', server).send_all(['mailto:gone@list.example'])[0]
+        self.assertFalse(result['success'])
+        self.assertEqual(result['recipients'], {'gone@list.example': 'SMTP 550: No such user'})
+
+    def test_reconnects_when_the_server_drops_the_connection(self):
+        server = StubSmtpServer(disconnect_after=1)
+        results = MailtoSender('me@example.com', server).send_all(
+            ['mailto:a@list.example', 'mailto:b@list.example'])
+        self.assertEqual([result['success'] for result in results], [True, True])
+        self.assertEqual(len(server.connections), 2)
+
+
+class MailtoConfirmationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubSmtpServer()
+        self.unsubscriber = EmailUnsubscriber('me@example.com', 'app-password')
+        self.unsubscriber.connect_to_smtp = self.server
+
+    def test_unconfirmed_link_is_not_sent(self):
+        result = self.unsubscriber.unsubscribe_detailed('mailto:attacker@evil.example?body=Wire%20money')
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], MAILTO_NOT_ALLOWED)
+        self.assertEqual(self.server.connections, [])
+
+    def test_confirmed_link_is_sent(self):
+        result = self.unsubscriber.unsubscribe_detailed('mailto:leave@list.example', send_mailto=True)
+        self.assertTrue(result['success'])
+        self.assertEqual(len(self.server.messages), 1)
+
+    def test_bulk_run_only_sends_vouched_links(self):
+        header_link = 'mailto:leave@list.example?subject=unsubscribe'
+        body_link = 'mailto:attacker@evil.example?subject=Invoice'
+        reported = {}
+        results = self.unsubscriber.bulk_unsubscribe_detailed(
+            [header_link, body_link], mailto_links=[header_link],
+            on_result=lambda position, result: reported.update({position: result['success']}))
+
+        self.assertEqual([result['success'] for result in results], [True, False])
+        self.assertEqual(results[1]['error'], MAILTO_NOT_ALLOWED)
+        self.assertEqual(reported, {0: True, 1: False})
+        self.assertEqual([to_addrs for _, _, to_addrs in self.server.messages], [['leave@list.example']])
+
+
+
+class RecordingHandler:
+    """aiosmtpd handler keeping the messages it accepts, and checking password and XOAUTH2 logins"""
+    def __init__(self):
+        self.messages = []
+        self.logins = []
+        self.drop_after = None
+        self.dropped = threading.Event()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((session.authenticated, envelope.mail_from, list(envelope.rcpt_tos)))
+        if len(self.messages) == self.drop_after:
+            # Close the session once the reply is sent, like a server dropping an idle connection
+            asyncio.get_running_loop().call_soon(self._drop, server)
+        return '250 OK'
+
+    def _drop(self, server):
+        server.transport.close()
+        self.dropped.set()
+
+    async def auth_XOAUTH2(self, server, args):
+        expected = f"user={ACCOUNT}\1auth=Bearer {ACCESS_TOKEN}\1\1"
+        accepted = len(args) == 2 and base64.b64decode(args[1]).decode('utf-8') == expected
+        if accepted:
+            self.logins.append('XOAUTH2')
+        return AuthResult(success=accepted, handled=False, auth_data=ACCOUNT if accepted else None)
+
+    def authenticate(self, server, session, envelope, mechanism, auth_data):
+        accepted = auth_data.login.decode('utf-8') == ACCOUNT and auth_data.password.decode('utf-8') == PASSWORD
+        if accepted:
+            self.logins.append(mechanism)
+        return AuthResult(success=accepted, handled=False, auth_data=auth_data.login if accepted else None)
+
+
+@unittest.skipUnless(AIOSMTPD_AVAILABLE and shutil.which('openssl'), 'needs aiosmtpd and openssl')
+class SmtpSessionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cert_dir = tempfile.TemporaryDirectory()
+        cert, key = f"{cls.cert_dir.name}/cert.pem", f"{cls.cert_dir.name}/key.pem"
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                       check=True, capture_output=True)
+        cls.tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        cls.tls_context.load_cert_chain(cert, key)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cert_dir.cleanup()
+
+    def start_server(self, tls=True):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.handler = RecordingHandler()
+        controller = Controller(self.handler, hostname='127.0.0.1', port=port,
+                                tls_context=self.tls_context if tls else None, require_starttls=tls,
+                                authenticator=self.handler.authenticate, auth_require_tls=tls)
+        controller.start()
+        self.addCleanup(controller.stop)
+        return port
+
+    def make_unsubscriber(self, port, password=PASSWORD):
+        unsubscriber = EmailUnsubscriber(ACCOUNT, password)
+        unsubscriber.set_custom_smtp('127.0.0.1', port)
+        return unsubscriber
+
+    def make_oauth_unsubscriber(self, port, access_token):
+        client = SecureEmailClient(ACCOUNT, 'custom')
+        client.set_custom_smtp('127.0.0.1', port)
+        client.unsubscriber = self.make_unsubscriber(port, password=None)
+        client._setup_oauth_connection(access_token)
+        return client.unsubscriber
+
+    def test_password_login_after_starttls_sends_the_request(self):
+        port = self.start_server()
+        result = self.make_unsubscriber(port).unsubscribe_detailed('mailto:leave@list.example', send_mailto=True)
+        self.assertTrue(result['success'], result['error'])
+        self.assertEqual(self.handler.logins, ['PLAIN'])
+        self.assertEqual(self.handler.messages, [(True, ACCOUNT, ['leave@list.example'])])
+
+    def test_refused_password_login_fails_without_sending(self):
+        port = self.start_server()
+        result = self.make_unsubscriber(port, password='wrong').unsubscribe_detailed(
+            'mailto:leave@list.example', send_mailto=True)
+        self.assertFalse(result['success'])
+        self.assertIn('SMTP login failed', result['error'])
+        self.assertEqual(self.handler.messages, [])
+
+    def test_xoauth2_login_sends_the_request(self):
+        port = self.start_server()
+        result = self.make_oauth_unsubscriber(port, ACCESS_TOKEN).unsubscribe_detailed(
+            'mailto:leave@list.example', send_mailto=True)
+        self.assertTrue(result['success'], result['error'])
+        self.assertEqual(self.handler.logins, ['XOAUTH2'])
+        self.assertEqual(len(self.handler.messages), 1)
+
+    def test_refused_xoauth2_login_fails_without_sending(self):
+        port = self.start_server()
+        result = self.make_oauth_unsubscriber(port, 'expired-token').unsubscribe_detailed(
+            'mailto:leave@list.example', send_mailto=True)
+        self.assertFalse(result['success'])
+        self.assertIn('535', result['error'])
+        self.assertEqual(self.handler.messages, [])
+
+    def test_credentials_are_not_sent_without_tls(self):
+        port = self.start_server(tls=False)
+        result = self.make_unsubscriber(port).unsubscribe_detailed('mailto:leave@list.example', send_mailto=True)
+        self.assertFalse(result['success'])
+        self.assertIn('offers no TLS', result['error'])
+        self.assertEqual(self.handler.logins, [])
+
+    def test_reconnects_when_the_server_drops_the_session(self):
+        port = self.start_server()
+        self.handler.drop_after = 1
+        links = ['mailto:a@list.example', 'mailto:b@list.example']
+        results = MailtoSender(ACCOUNT, self.make_unsubscriber(port).connect_to_smtp).send_all(
+            links, on_result=lambda position, result: self.handler.dropped.wait(5))
+        self.assertEqual([result['success'] for result in results], [True, True])
+        self.assertEqual(self.handler.logins, ['PLAIN', 'PLAIN'])
+        self.assertEqual([to_addrs for _, _, to_addrs in self.handler.messages],
+                         [['a@list.example'], ['b@list.example']])
+
+
+if __name__ == '__main__':
+    unittest.main()
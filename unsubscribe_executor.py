@@ -0,0 +1,316 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+# Setup logging
+executor_logger = logging.getLogger('UnsubscribeExecutor')
+
+# Longest time a link of a cancelled run stays deferred before it is reported cancelled
+CANCEL_CHECK_SECONDS = 0.5
+
+
+def link_host(link):
+    """Get the host an unsubscribe link points at, used as the rate limiting key"""
+    if not link:
+        return ''
+    if link.startswith('mailto:'):
+        return link.split('@', 1)[-1].split('?', 1)[0].lower()
+    return (urlparse(link).hostname or '').lower()
+
+
+class HostRateLimiter:
+    """
+    Token bucket per destination host.
+    Each host gets `rate` requests per second with bursts of up to `burst` requests,
+    independently of how busy other hosts are. Requests reserve their slot up front,
+    so callers can schedule them instead of waiting.
+    """
+    def __init__(self, rate=1.0, burst=1, max_hosts=1000):
+        """
+        Initialize the rate limiter
+
+        Args:
+            rate: Requests per second allowed per host
+            burst: Number of requests a host may receive back to back
+            max_hosts: Maximum number of host buckets to keep
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_hosts = max_hosts
+        self.buckets = OrderedDict()  # host -> [tokens, last refill time]
+        self.lock = threading.Lock()
+
+    def reserve(self, host):
+        """
+        Reserve the next request slot of a host without waiting for it
+
+        Args:
+            host: Destination host
+
+        Returns:
+            float: Seconds until the reserved request may be sent, 0 if it may be sent now
+        """
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = [float(self.burst), now]
+                self._prune()
+            self.buckets.move_to_end(host)
+
+            bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            # Tokens go negative while requests are queued, each reservation takes the next slot
+            bucket[0] -= 1
+            return 0.0 if bucket[0] >= 0 else -bucket[0] / self.rate
+
+    def _prune(self):
+        """Drop the least recently used buckets beyond max_hosts (caller holds the lock)"""
+        while len(self.buckets) > self.max_hosts:
+            self.buckets.popitem(last=False)
+
+
+class UnsubscribeExecutor:
+    """
+    Runs unsubscribe requests concurrently on a shared worker pool.
+    Requests to different hosts run in parallel, up to a global concurrency cap,
+    while each host is rate limited by its own token bucket.
+    Links to a host whose circuit breaker is open fail immediately instead of
+    waiting for their turn at the rate limiter.
+    A link whose host has no token yet does not hold a worker: it is deferred to a
+    scheduler thread and handed back to the pool once its slot comes up, so a run
+    with many links to one host cannot stall the links of other runs. Links still
+    deferred when the executor shuts down are reported cancelled.
+    """
+    def __init__(self, max_workers=None, per_host_rate=1.0, per_host_burst=1, circuit_breaker=None):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Maximum number of unsubscribe requests in flight across all runs
+            per_host_rate: Requests per second allowed per host
+            per_host_burst: Number of requests a host may receive back to back
+            circuit_breaker: Optional HostCircuitBreaker shared with the HTTP layer
+        """
+        self.max_workers = max_workers or int(os.environ.get('UNSUBSCRIBE_WORKERS', 8))
+        self.rate_limiter = HostRateLimiter(per_host_rate, per_host_burst)
+        self.circuit_breaker = circuit_breaker
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='unsubscribe')
+        self.deferred = []  # Heap of (time the slot comes up, sequence, task) waiting for their host
+        self.deferred_changed = threading.Condition()
+        self.sequence = itertools.count()
+        self.scheduler_thread = None
+        self.stopped = False
+
+    def run(self, links, unsubscribe_fn, on_result=None, cancel_event=None):
+        """
+        Unsubscribe from a list of links
+
+        Args:
+            links: List of unsubscribe links
+            unsubscribe_fn: Function taking a link and returning True on success, or a dictionary
+                            with 'success', 'error' and details to include in the result
+            on_result: Optional function called with the position and result of each link as it completes
+            cancel_event: Optional threading.Event; links not started when it is set are skipped
+
+        Returns:
+            list: Result dictionaries in the order of the links, with 'link', 'host', 'success',
+                  'error', 'wait_time' (rate limiting) and 'duration' (request) in seconds;
+                  skipped links have 'cancelled' set, links to tripped hosts 'circuit_open'
+        """
+        results = [None] * len(links)
+        futures = {}
+        for position in self._interleave_hosts(links):
+            task = {'link': links[position], 'host': link_host(links[position]), 'fn': unsubscribe_fn,
+                    'cancel_event': cancel_event, 'reserved_at': None, 'future': Future()}
+            self._dispatch(task)
+            futures[task['future']] = position
+
+        for future in as_completed(futures):
+            position = futures[future]
+            results[position] = future.result()
+            if on_result:
+                on_result(position, results[position])
+
+        succeeded = sum(1 for result in results if result['success'])
+        executor_logger.info(f"Processed {len(links)} unsubscribe links: {succeeded} succeeded")
+        return results
+
+    def submit(self, fn, *args):
+        """
+        Run a function on the worker pool alongside unsubscribe requests
+
+        Returns:
+            Future: Future for the function's result
+        """
+        return self.executor.submit(fn, *args)
+
+    def _interleave_hosts(self, links):
+        """
+        Order link positions round-robin across hosts, so the first slot of every
+        host is reserved before the second slot of any
+        """
+        by_host = defaultdict(list)
+        for position, link in enumerate(links):
+            by_host[link_host(link)].append(position)
+
+        queues = list(by_host.values())
+        order = []
+        for round_number in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[round_number] for queue in queues if round_number < len(queue))
+        return order
+
+    def _dispatch(self, task):
+        """Run a link's task on the worker pool"""
+        try:
+            self.executor.submit(self._attempt, task)
+        except RuntimeError as e:
+            # The executor was shut down
+            task['future'].set_exception(e)
+
+    def _attempt(self, task):
+        """Unsubscribe from a single link on a worker thread, or defer it until its host has a slot"""
+        try:
+            if task['reserved_at'] is None:
+                if self._cancelled(task):
+                    result = self._cancelled_result(task['link'], task['host'], 0)
+                elif self._circuit_open(task['host']):
+                    result = self._circuit_open_result(task['link'], task['host'], 0)
+                else:
+                    task['reserved_at'] = time.monotonic()
+                    delay = self.rate_limiter.reserve(task['host'])
+                    if delay > 0:
+                        self._defer(task, task['reserved_at'] + delay)
+                        return
+                    result = self._unsubscribe_one(task)
+            else:
+                result = self._unsubscribe_one(task)
+            task['future'].set_result(result)
+        except BaseException as e:
+            task['future'].set_exception(e)
+
+    def _unsubscribe_one(self, task):
+        """Send the request of a link whose slot has come up"""
+        link, host = task['link'], task['host']
+        wait_time = time.monotonic() - task['reserved_at']
+        if self._cancelled(task):
+            return self._cancelled_result(link, host, 0)
+        if self._circuit_open(host):
+            # The host was tripped by another link while this one waited
+            return self._circuit_open_result(link, host, wait_time)
+
+        start = time.monotonic()
+        details = {}
+        error = None
+        try:
+            outcome = task['fn'](link)
+            if isinstance(outcome, dict):
+                details = dict(outcome)
+                success = bool(details.pop('success', False))
+                error = details.pop('error', None)
+            else:
+                success = bool(outcome)
+            if not success and not error:
+                error = 'Failed to process unsubscribe request'
+        except Exception as e:
+            executor_logger.error(f"Unsubscribe from {link} failed: {str(e)}")
+            success = False
+            error = str(e)
+
+        return dict(details, **{
+            'link': link,
+            'host': host,
+            'success': success,
+            'error': error,
+            'wait_time': round(wait_time, 3),
+            'duration': round(time.monotonic() - start, 3)
+        })
+
+    def _defer(self, task, ready_at):
+        """Hand a link to the scheduler thread until its reserved slot comes up"""
+        with self.deferred_changed:
+            if self.stopped:
+                task['future'].set_result(self._cancelled_result(task['link'], task['host'], 0))
+                return
+            heapq.heappush(self.deferred, (ready_at, next(self.sequence), task))
+            if self.scheduler_thread is None:
+                self.scheduler_thread = threading.Thread(target=self._run_scheduler, name='unsubscribe-scheduler')
+                self.scheduler_thread.daemon = True
+                self.scheduler_thread.start()
+            self.deferred_changed.notify()
+
+    def _run_scheduler(self):
+        """Main loop of the scheduler thread: dispatch deferred links when their slot comes up or their run is cancelled"""
+        while True:
+            with self.deferred_changed:
+                if self.stopped:
+                    # Links still waiting for their slot are reported cancelled, so no run waits on them
+                    leftover = [entry[2] for entry in self.deferred]
+                    self.deferred = []
+                    break
+                now = time.monotonic()
+                due = []
+                while self.deferred and self.deferred[0][0] <= now:
+                    due.append(heapq.heappop(self.deferred)[2])
+                if any(self._cancelled(entry[2]) for entry in self.deferred):
+                    due.extend(entry[2] for entry in self.deferred if self._cancelled(entry[2]))
+                    self.deferred = [entry for entry in self.deferred if not self._cancelled(entry[2])]
+                    heapq.heapify(self.deferred)
+                if not due:
+                    timeout = min(CANCEL_CHECK_SECONDS, self.deferred[0][0] - now) if self.deferred else None
+                    self.deferred_changed.wait(timeout)
+                    continue
+            for task in due:
+                self._dispatch(task)
+
+        for task in leftover:
+            wait_time = time.monotonic() - task['reserved_at']
+            task['future'].set_result(self._cancelled_result(task['link'], task['host'], wait_time))
+
+    def _cancelled(self, task):
+        """Check whether the run of a link was cancelled"""
+        return task['cancel_event'] is not None and task['cancel_event'].is_set()
+
+    def _circuit_open(self, host):
+        """Check whether the host's circuit breaker is open"""
+        return self.circuit_breaker is not None and self.circuit_breaker.is_open(host)
+
+    def _circuit_open_result(self, link, host, wait_time):
+        """Result for a link failed fast because its host is tripped"""
+        return {
+            'link': link,
+            'host': host,
+            'success': False,
+            'circuit_open': True,
+            'error': 'Host temporarily unavailable',
+            'wait_time': round(wait_time, 3),
+            'duration': 0.0
+        }
+
+    def _cancelled_result(self, link, host, wait_time):
+        """Result for a link skipped because its run was cancelled"""
+        return {
+            'link': link,
+            'host': host,
+            'success': False,
+            'cancelled': True,
+            'error': 'Cancelled',
+            'wait_time': round(wait_time, 3),
+            'duration': 0.0
+        }
+
+    def shutdown(self, wait=False):
+        """Stop accepting work, stop the scheduler thread and shut down the worker pool"""
+        with self.deferred_changed:
+            self.stopped = True
+            self.deferred_changed.notify()
+            scheduler_thread = self.scheduler_thread
+        self.executor.shutdown(wait=wait)
+        if wait and scheduler_thread is not None:
+            scheduler_thread.join()
@@ -0,0 +1,303 @@
+import os
+import uuid
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unsubscribe_store import (UnsubscribeStore, ACTIVE_STATES, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETE,
+                               JOB_CANCELLED, JOB_FAILED, LINK_PENDING, LINK_SUCCEEDED, LINK_FAILED,
+                               LINK_CANCELLED, LINK_SKIPPED, JOB_HEARTBEAT_SECONDS)
+
+# Setup logging
+unsubscribe_jobs_logger = logging.getLogger('UnsubscribeJobManager')
+
+
+class UnsubscribeJobManager:
+    """
+    Runs bulk unsubscribe requests as background jobs.
+    Submitting returns a job ID immediately; the links are processed on the shared
+    UnsubscribeExecutor while per-link status is kept in memory for polling and
+    streaming, and written to the UnsubscribeStore as each link completes.
+    Links the account already unsubscribed from are skipped without a request.
+    Several processes may share the store: each marks its jobs with its instance ID and
+    keeps their heartbeat, and only jobs whose owner stopped beating are marked interrupted.
+    """
+    def __init__(self, store=None, max_jobs=None, job_ttl=3600, max_pending=20):
+        """
+        Initialize the job manager
+
+        Args:
+            store: UnsubscribeStore for persisting job and link status
+            max_jobs: Number of bulk unsubscribe jobs that may run at the same time
+            job_ttl: Seconds to keep finished jobs in memory for polling
+            max_pending: Maximum number of queued and running jobs
+        """
+        self.store = store or UnsubscribeStore()
+        self.max_jobs = max_jobs or int(os.environ.get('UNSUBSCRIBE_JOBS', 4))
+        self.job_ttl = job_ttl
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='unsubscribe-job')
+        self.jobs = {}  # Dictionary of jobs by job ID
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # Notified whenever a job changes
+
+        # Jobs of a process that died cannot be resumed
+        self.instance_id = uuid.uuid4().hex
+        self.store.mark_interrupted()
+        self.stopped = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self._run_heartbeat, name='unsubscribe-job-heartbeat')
+        self.heartbeat_thread.daemon = True
+        self.heartbeat_thread.start()
+
+    def submit(self, account, client, links):
+        """
+        Queue a bulk unsubscribe job
+
+        Args:
+            account: Email address the links belong to
+            client: Authenticated SecureEmailClient for the account
+            links: List of dictionaries with 'link', 'sender', 'email_id', 'one_click', 'list_id'
+                   and 'send_mailto' (a mailto: link the user may be unsubscribed by email from)
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            RuntimeError: If too many jobs are already pending
+        """
+        with self.lock:
+            self._prune_jobs()
+            pending = sum(1 for job in self.jobs.values() if job['status'] in ACTIVE_STATES)
+            if pending >= self.max_pending:
+                raise RuntimeError("Too many unsubscribe jobs in progress, please try again shortly")
+
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'account': account.lower(),
+                'status': JOB_QUEUED,
+                'links': [{
+                    'position': position,
+                    'link': info['link'],
+                    'sender': info.get('sender'),
+                    'email_id': info.get('email_id'),
+                    'one_click': bool(info.get('one_click')),
+                    'send_mailto': bool(info.get('send_mailto')),
+                    'list_id': info.get('list_id'),
+                    'status': LINK_PENDING,
+                    'error': None,
+                    'status_code': None,
+                    'bytes_received': None,
+                    'duration': None
+                } for position, info in enumerate(links)],
+                'completed': [],  # Link positions in completion order, for streaming
+                'succeeded': 0,
+                'failed': 0,
+                'skipped': 0,
+                'error': None,
+                'version': 0,
+                'cancel_event': threading.Event(),
+                'created_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'finished_time': None
+            }
+            self.jobs[job_id] = job
+
+        self.store.create_job(job_id, account, links, owner=self.instance_id)
+        self.executor.submit(self._run_job, job, client)
+        unsubscribe_jobs_logger.info(f"Queued unsubscribe job {job_id} for {account} with {len(links)} links")
+        return job_id
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; links already in flight finish, the remaining links are skipped
+
+        Args:
+            job_id: Job ID returned by submit
+
+        Returns:
+            bool: True if the job was active and is being cancelled
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['status'] not in ACTIVE_STATES:
+                return False
+            job['cancel_event'].set()
+            unsubscribe_jobs_logger.info(f"Cancelling unsubscribe job {job_id}")
+            return True
+
+    def _run_job(self, job, client):
+        """Execute a bulk unsubscribe job on a worker thread"""
+        with self.lock:
+            job['status'] = JOB_RUNNING
+            self._touch(job)
+        self.store.update_job(job['job_id'], JOB_RUNNING, 0, 0)
+
+        def on_result(position, result):
+            if result.get('skipped'):
+                status = LINK_SKIPPED
+            elif result.get('cancelled'):
+                status = LINK_CANCELLED
+            else:
+                status = LINK_SUCCEEDED if result['success'] else LINK_FAILED
+            with self.lock:
+                link = job['links'][position]
+                link.update(status=status, error=result['error'], status_code=result.get('status_code'),
+                            bytes_received=result.get('bytes_received'), duration=result['duration'])
+                job['completed'].append(position)
+                if status == LINK_SUCCEEDED:
+                    job['succeeded'] += 1
+                elif status == LINK_FAILED:
+                    job['failed'] += 1
+                elif status == LINK_SKIPPED:
+                    job['skipped'] += 1
+                succeeded, failed = job['succeeded'], job['failed']
+                self._touch(job)
+            self.store.update_link(job['job_id'], position, dict(result, status=status))
+            self.store.update_job(job['job_id'], JOB_RUNNING, succeeded, failed)
+            if status in (LINK_SUCCEEDED, LINK_FAILED) and not result.get('circuit_open'):
+                # Remember what the target answered; a tripped host says nothing about the target
+                self.store.record_outcome(job['account'], link['link'], link['list_id'], status == LINK_SUCCEEDED,
+                                          result.get('status_code'), result['error'])
+
+        status = JOB_FAILED
+        try:
+            # Targets that were already unsubscribed are not requested again
+            outcomes = self.store.get_outcomes(job['account'],
+                                               [(link['link'], link['list_id']) for link in job['links']])
+            run_positions = []
+            for position, outcome in enumerate(outcomes):
+                if outcome and outcome['status'] == LINK_SUCCEEDED:
+                    on_result(position, {'skipped': True, 'success': True, 'error': None,
+                                         'status_code': outcome['status_code'], 'duration': 0.0})
+                else:
+                    run_positions.append(position)
+
+            if run_positions:
+                run_links = [job['links'][position] for position in run_positions]
+                client.bulk_unsubscribe_detailed(
+                    [link['link'] for link in run_links],
+                    one_click_links=[link['link'] for link in run_links if link['one_click']],
+                    mailto_links=[link['link'] for link in run_links if link['send_mailto']],
+                    on_result=lambda index, result: on_result(run_positions[index], result),
+                    cancel_event=job['cancel_event']
+                )
+            status = JOB_CANCELLED if job['cancel_event'].is_set() else JOB_COMPLETE
+            unsubscribe_jobs_logger.info(f"Unsubscribe job {job['job_id']} {status}: "
+                                         f"{job['succeeded']} succeeded, {job['failed']} failed, "
+                                         f"{job['skipped']} already unsubscribed")
+        except Exception as e:
+            unsubscribe_jobs_logger.error(f"Unsubscribe job {job['job_id']} failed: {str(e)}")
+            with self.lock:
+                job['error'] = str(e)
+        finally:
+            with self.lock:
+                job['status'] = status
+                job['finished_at'] = datetime.now().isoformat()
+                job['finished_time'] = time.time()
+                self._touch(job)
+                final = (job['status'], job['succeeded'], job['failed'], job['error'])
+            self.store.update_job(job['job_id'], *final)
+
+    def get_job(self, job_id):
+        """
+        Get the status of a job, from memory or from the store for older jobs
+
+        Args:
+            job_id: Job ID returned by submit
+
+        Returns:
+            dict: Snapshot of the job, or None if the job is unknown
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return self._snapshot(job)
+
+        stored = self.store.get_job(job_id)
+        if not stored:
+            return None
+        processed = sum(1 for link in stored['links'] if link['status'] != LINK_PENDING)
+        skipped = sum(1 for link in stored['links'] if link['status'] == LINK_SKIPPED)
+        return {
+            'job_id': stored['job_id'],
+            'account': stored['account'],
+            'status': stored['status'],
+            'progress': {'processed': processed, 'total': stored['total'],
+                         'succeeded': stored['succeeded'], 'failed': stored['failed'], 'skipped': skipped},
+            'links': stored['links'],
+            'completed': [],
+            'error': stored['error'],
+            'version': 0,
+            'created_at': stored['created_at'],
+            'finished_at': None if stored['status'] in ACTIVE_STATES else stored['updated_at']
+        }
+
+    def wait_for_change(self, job_id, version, timeout=15):
+        """
+        Block until a job changes past the given version or the timeout expires
+
+        Args:
+            job_id: Job ID returned by submit
+            version: Version of the last snapshot the caller has seen
+            timeout: Maximum number of seconds to wait
+        """
+        with self.lock:
+            if job_id not in self.jobs:
+                # Job only known to the store, nothing will notify about it
+                self.changed.wait(timeout=min(timeout, 1))
+                return
+            self.changed.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id]['version'] > version,
+                timeout=timeout
+            )
+
+    def _snapshot(self, job):
+        """Copy a job for callers outside the lock (caller holds the lock)"""
+        return {
+            'job_id': job['job_id'],
+            'account': job['account'],
+            'status': job['status'],
+            'progress': {
+                'processed': len(job['completed']),
+                'total': len(job['links']),
+                'succeeded': job['succeeded'],
+                'failed': job['failed'],
+                'skipped': job['skipped']
+            },
+            'links': [dict(link) for link in job['links']],
+            'completed': list(job['completed']),
+            'error': job['error'],
+            'version': job['version'],
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at']
+        }
+
+    def _touch(self, job):
+        """Bump a job's version and wake up waiting streams (caller holds the lock)"""
+        job['version'] += 1
+        self.changed.notify_all()
+
+    def _prune_jobs(self):
+        """Remove finished jobs older than the TTL from memory (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job['finished_time'] and job['finished_time'] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _run_heartbeat(self):
+        """Main loop of the heartbeat thread: keep this instance's jobs alive, interrupt those of dead ones"""
+        while not self.stopped.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                self.store.heartbeat(self.instance_id)
+                self.store.mark_interrupted()
+            except sqlite3.Error as e:
+                unsubscribe_jobs_logger.error(f"Failed to update unsubscribe job heartbeats: {str(e)}")
+
+    def shutdown(self, wait=False):
+        """Stop accepting jobs and shut down the worker pool"""
+        self.stopped.set()
+        self.executor.shutdown(wait=wait)
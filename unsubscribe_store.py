@@ -0,0 +1,410 @@
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+# Setup logging
+unsubscribe_store_logger = logging.getLogger('UnsubscribeStore')
+
+# Finished bulk unsubscribe jobs are removed after this many days
+JOB_MAX_AGE_DAYS = 7
+
+# Unsubscribe outcomes are remembered for this many days
+OUTCOME_MAX_AGE_DAYS = 180
+
+# Number of outcome keys looked up per query
+OUTCOME_LOOKUP_BATCH = 500
+
+# Processes running jobs refresh their heartbeat this often; active jobs whose owner
+# missed several heartbeats are taken to have died with it
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 120
+
+# Job and link states
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETE = 'complete'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+JOB_INTERRUPTED = 'interrupted'
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+LINK_PENDING = 'pending'
+LINK_SUCCEEDED = 'succeeded'
+LINK_FAILED = 'failed'
+LINK_CANCELLED = 'cancelled'
+LINK_SKIPPED = 'skipped'  # Already unsubscribed by an earlier request
+
+
+def normalize_unsubscribe_link(link: str) -> Optional[str]:
+    """
+    Normalize an unsubscribe link so the same target is recognised across scans:
+    lower-case scheme and host, no default port or fragment, no utm_ tracking
+    parameters, and query parameters in a fixed order
+
+    Args:
+        link: Unsubscribe URL or mailto: link
+
+    Returns:
+        str: Normalized link, or None if the link cannot be parsed
+    """
+    if not link:
+        return None
+    link = link.strip()
+    if link.lower().startswith('mailto:'):
+        address, _, query = link[len('mailto:'):].partition('?')
+        params = sorted((name.lower(), value) for name, value in parse_qsl(query, keep_blank_values=True))
+        return 'mailto:' + address.lower() + ('?' + urlencode(params) if params else '')
+
+    try:
+        parsed = urlparse(link)
+        host = (parsed.hostname or '').lower()
+        port = parsed.port
+    except ValueError:
+        return None
+    if not parsed.scheme or not host:
+        return None
+    scheme = parsed.scheme.lower()
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{port}"
+    params = sorted((name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+                    if not name.lower().startswith('utm_'))
+    return urlunparse((scheme, host, parsed.path or '/', '', urlencode(params), ''))
+
+
+def outcome_keys(link: str, list_id: Optional[str] = None) -> List[str]:
+    """
+    Get the keys an unsubscribe outcome is stored under: the mailing list's List-Id
+    (stable across emails that carry per-recipient tokens) and the normalized link
+
+    Args:
+        link: Unsubscribe link
+        list_id: List-Id of the mailing list, if known
+
+    Returns:
+        list: Outcome keys, most specific first
+    """
+    keys = []
+    if list_id:
+        keys.append(f"list:{list_id.lower()}")
+    normalized = normalize_unsubscribe_link(link)
+    if normalized:
+        keys.append(f"url:{normalized}")
+    return keys
+
+
+class UnsubscribeStore:
+    """
+    Persistent store for bulk unsubscribe jobs and the status of each of their links,
+    so progress survives the request that started the job and can be inspected later.
+    It also remembers the outcome of each unsubscribe target per account, so targets
+    that were already unsubscribed are not requested again.
+    """
+    def __init__(self, db_path: str = None):
+        """
+        Initialize the unsubscribe store
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path or os.environ.get('UNSUBSCRIBE_DB', 'unsubscribe.db')
+        self.write_lock = threading.Lock()
+        self._local = threading.local()
+        self._create_tables()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        """Create the job tables if they do not exist"""
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS unsubscribe_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    account TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    succeeded INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    owner TEXT,
+                    heartbeat_at TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(unsubscribe_jobs)')]
+            if 'owner' not in columns:
+                # Databases created before jobs recorded the process running them
+                conn.execute('ALTER TABLE unsubscribe_jobs ADD COLUMN owner TEXT')
+                conn.execute('ALTER TABLE unsubscribe_jobs ADD COLUMN heartbeat_at TEXT')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS unsubscribe_job_links (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    link TEXT NOT NULL,
+                    sender TEXT,
+                    email_id TEXT,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    status_code INTEGER,
+                    bytes_received INTEGER,
+                    duration REAL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS unsubscribe_outcomes (
+                    account TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    status_code INTEGER,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (account, target)
+                )
+            ''')
+
+    def create_job(self, job_id: str, account: str, links: List[Dict], owner: Optional[str] = None):
+        """
+        Record a new bulk unsubscribe job and its links
+
+        Args:
+            job_id: Job ID
+            account: Email address the job runs for
+            links: List of dictionaries with 'link', 'sender' and 'email_id'
+            owner: ID of the job manager instance running the job, which keeps its heartbeat
+        """
+        now = datetime.now()
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            # Drop old finished jobs
+            cutoff = (now - timedelta(days=JOB_MAX_AGE_DAYS)).isoformat()
+            conn.execute('DELETE FROM unsubscribe_job_links WHERE job_id IN '
+                         '(SELECT job_id FROM unsubscribe_jobs WHERE updated_at < ?)', (cutoff,))
+            conn.execute('DELETE FROM unsubscribe_jobs WHERE updated_at < ?', (cutoff,))
+            outcome_cutoff = (now - timedelta(days=OUTCOME_MAX_AGE_DAYS)).isoformat()
+            conn.execute('DELETE FROM unsubscribe_outcomes WHERE updated_at < ?', (outcome_cutoff,))
+
+            conn.execute('''
+                INSERT INTO unsubscribe_jobs (job_id, account, status, total, owner, heartbeat_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, account.lower(), JOB_QUEUED, len(links), owner, now.isoformat(), now.isoformat(),
+                  now.isoformat()))
+            conn.executemany('''
+                INSERT INTO unsubscribe_job_links (job_id, position, link, sender, email_id, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(job_id, position, info['link'], info.get('sender'), info.get('email_id'), LINK_PENDING,
+                   now.isoformat()) for position, info in enumerate(links)])
+
+    def update_link(self, job_id: str, position: int, result: Dict):
+        """
+        Record the outcome of one link
+
+        Args:
+            job_id: Job ID
+            position: Position of the link in the job
+            result: Link result with 'status', 'error', 'status_code', 'bytes_received' and 'duration'
+        """
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                conn.execute('''
+                    UPDATE unsubscribe_job_links
+                    SET status = ?, error = ?, status_code = ?, bytes_received = ?, duration = ?, updated_at = ?
+                    WHERE job_id = ? AND position = ?
+                ''', (result['status'], result.get('error'), result.get('status_code'), result.get('bytes_received'),
+                      result.get('duration'), datetime.now().isoformat(), job_id, position))
+        except sqlite3.Error as e:
+            unsubscribe_store_logger.error(f"Failed to update link {position} of job {job_id}: {str(e)}")
+
+    def update_job(self, job_id: str, status: str, succeeded: int, failed: int, error: Optional[str] = None):
+        """
+        Record the status and counts of a job
+
+        Args:
+            job_id: Job ID
+            status: Job status
+            succeeded: Number of links unsubscribed so far
+            failed: Number of links that failed so far
+            error: Error message if the job failed
+        """
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                conn.execute('''
+                    UPDATE unsubscribe_jobs SET status = ?, succeeded = ?, failed = ?, error = ?, updated_at = ?
+                    WHERE job_id = ?
+                ''', (status, succeeded, failed, error, datetime.now().isoformat(), job_id))
+        except sqlite3.Error as e:
+            unsubscribe_store_logger.error(f"Failed to update job {job_id}: {str(e)}")
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Get a job and the status of its links
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            dict: Job data with a 'links' list, or None if the job is unknown
+        """
+        conn = self._get_connection()
+        row = conn.execute('SELECT * FROM unsubscribe_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if not row:
+            return None
+        links = conn.execute(
+            'SELECT * FROM unsubscribe_job_links WHERE job_id = ? ORDER BY position', (job_id,)
+        ).fetchall()
+        return {
+            'job_id': row['job_id'],
+            'account': row['account'],
+            'status': row['status'],
+            'total': row['total'],
+            'succeeded': row['succeeded'],
+            'failed': row['failed'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'links': [{
+                'position': link['position'],
+                'link': link['link'],
+                'sender': link['sender'],
+                'email_id': link['email_id'],
+                'status': link['status'],
+                'error': link['error'],
+                'status_code': link['status_code'],
+                'bytes_received': link['bytes_received'],
+                'duration': link['duration']
+            } for link in links]
+        }
+
+    def heartbeat(self, owner: str) -> int:
+        """
+        Record that the process owning some jobs is still running them
+
+        Args:
+            owner: ID of the job manager instance
+
+        Returns:
+            int: Number of active jobs of the owner
+        """
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute(
+                f'UPDATE unsubscribe_jobs SET heartbeat_at = ? '
+                f'WHERE owner = ? AND status IN ({",".join("?" * len(ACTIVE_STATES))})',
+                (datetime.now().isoformat(), owner) + ACTIVE_STATES
+            )
+        return cursor.rowcount
+
+    def mark_interrupted(self, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+        """
+        Mark queued or running jobs whose owner stopped sending heartbeats as interrupted.
+        Jobs of other live processes sharing the database are left alone
+
+        Args:
+            stale_seconds: Seconds without a heartbeat after which the owner is taken to be gone
+
+        Returns:
+            int: Number of jobs marked
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(seconds=stale_seconds)).isoformat()
+        conn = self._get_connection()
+        with self.write_lock, conn:
+            cursor = conn.execute(
+                f'UPDATE unsubscribe_jobs SET status = ?, updated_at = ? '
+                f'WHERE status IN ({",".join("?" * len(ACTIVE_STATES))}) '
+                f'AND (heartbeat_at IS NULL OR heartbeat_at < ?)',
+                (JOB_INTERRUPTED, now.isoformat()) + ACTIVE_STATES + (cutoff,)
+            )
+        if cursor.rowcount:
+            unsubscribe_store_logger.info(f"Marked {cursor.rowcount} unfinished unsubscribe jobs as interrupted")
+        return cursor.rowcount
+
+    def record_outcome(self, account: str, link: str, list_id: Optional[str], success: bool,
+                       status_code: Optional[int] = None, error: Optional[str] = None):
+        """
+        Remember the outcome of unsubscribing from a target
+        A failure never replaces an earlier success for the same target
+
+        Args:
+            account: Email address the link belongs to
+            link: Unsubscribe link
+            list_id: List-Id of the mailing list, if known
+            success: Whether the unsubscribe request succeeded
+            status_code: HTTP status code of the final response
+            error: Error message if the request failed
+        """
+        keys = outcome_keys(link, list_id)
+        if not keys:
+            return
+        status = LINK_SUCCEEDED if success else LINK_FAILED
+        now = datetime.now().isoformat()
+        conn = self._get_connection()
+        try:
+            with self.write_lock, conn:
+                conn.executemany('''
+                    INSERT INTO unsubscribe_outcomes (account, target, link, status, status_code, error, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (account, target) DO UPDATE SET
+                        link = excluded.link, status = excluded.status, status_code = excluded.status_code,
+                        error = excluded.error, updated_at = excluded.updated_at
+                    WHERE excluded.status = ? OR unsubscribe_outcomes.status != ?
+                ''', [(account.lower(), key, link, status, status_code, error, now, LINK_SUCCEEDED, LINK_SUCCEEDED)
+                      for key in keys])
+        except sqlite3.Error as e:
+            unsubscribe_store_logger.error(f"Failed to record unsubscribe outcome for {link}: {str(e)}")
+
+    def get_outcomes(self, account: str, targets: List[Tuple[str, Optional[str]]]) -> List[Optional[Dict]]:
+        """
+        Look up the remembered outcomes of unsubscribe targets
+
+        Args:
+            account: Email address the links belong to
+            targets: List of (link, list_id) tuples, list_id may be None
+
+        Returns:
+            list: For each target the outcome with 'status', 'status_code', 'error' and 'updated_at',
+                  or None if it was never requested; a success under any key wins
+        """
+        target_keys = [outcome_keys(link, list_id) for link, list_id in targets]
+        all_keys = list({key for keys in target_keys for key in keys})
+        found = {}
+        conn = self._get_connection()
+        for batch_start in range(0, len(all_keys), OUTCOME_LOOKUP_BATCH):
+            batch = all_keys[batch_start:batch_start + OUTCOME_LOOKUP_BATCH]
+            rows = conn.execute(
+                f'SELECT * FROM unsubscribe_outcomes WHERE account = ? AND target IN ({",".join("?" * len(batch))})',
+                [account.lower()] + batch
+            ).fetchall()
+            for row in rows:
+                found[row['target']] = {
+                    'status': row['status'],
+                    'status_code': row['status_code'],
+                    'error': row['error'],
+                    'updated_at': row['updated_at']
+                }
+
+        outcomes = []
+        for keys in target_keys:
+            matches = [found[key] for key in keys if key in found]
+            succeeded = [match for match in matches if match['status'] == LINK_SUCCEEDED]
+            outcomes.append((succeeded or matches or [None])[0])
+        return outcomes